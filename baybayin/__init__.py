@@ -0,0 +1 @@
+"""Headless tools for the Baybayin classifier that run without Streamlit."""
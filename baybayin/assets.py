@@ -0,0 +1,161 @@
+"""
+Display-sized derivatives of the app's static images.
+
+The pages show screenshots, charts and example images at a few hundred
+pixels wide, but the files are up to 1920 px. Given a path, Streamlit reads,
+decodes, resizes and re-encodes such an image on every rerun and sends the
+result again. get_derivative() does that work once per (path, modification
+time, width). It keeps an encoded image that is no wider than it is shown
+and already in the format Streamlit serves, so Streamlit passes the bytes
+through unchanged. Editing an asset file invalidates its derivatives.
+"""
+import io
+import logging
+import os
+import threading
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+from config.settings import ASSET_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# (path, width) -> (mtime_ns, Derivative); a changed file replaces its entry
+_derivatives = {}
+_derivatives_lock = threading.Lock()
+
+_prerender_started = False
+
+
+class Derivative(NamedTuple):
+    """An encoded, display-sized copy of an asset."""
+
+    data: bytes
+    format: str
+    size: tuple
+
+
+def get_derivative(path, width=None):
+    """
+    Get the derivative of an asset for a display width, rendering it on first use.
+
+    Args:
+        path: Image file path
+        width: Widest the image is displayed, in pixels (default
+            ASSET_CONFIG['max_width'])
+
+    Returns:
+        Derivative: The encoded image with its format ('PNG' or 'JPEG')
+            and (width, height)
+
+    Raises:
+        OSError: If the file cannot be read or decoded
+    """
+    width = min(width or ASSET_CONFIG['max_width'], ASSET_CONFIG['max_width'])
+    key = (path, width)
+    mtime = os.stat(path).st_mtime_ns
+    entry = _derivatives.get(key)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    derivative = render_derivative(path, width)
+    with _derivatives_lock:
+        _derivatives[key] = (mtime, derivative)
+    return derivative
+
+
+def render_derivative(path, width, config=ASSET_CONFIG):
+    """
+    Downscale and re-encode an image for display (uncached).
+
+    JPEG files stay JPEG. Everything else becomes PNG, reduced to a palette
+    when config['png_colors'] is set. If the original file already fits
+    the width and is smaller, it is kept as is.
+
+    Args:
+        path: Image file path
+        width: Widest the image is displayed, in pixels
+        config: Encoding parameters (default ASSET_CONFIG)
+
+    Returns:
+        Derivative: The encoded image
+
+    Raises:
+        OSError: If the file cannot be read or decoded
+    """
+    with Image.open(path) as source:
+        image_format = 'JPEG' if source.format == 'JPEG' else 'PNG'
+        upright = source.getexif().get(0x0112, 1) == 1
+        fits = source.width <= width and source.format == image_format and upright
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    if image.mode == 'RGBA' and image.getextrema()[3][0] == 255:
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=config['jpeg_quality'], optimize=True, progressive=True)
+    else:
+        if config['png_colors']:
+            method = Image.FASTOCTREE if image.mode == 'RGBA' else Image.MEDIANCUT
+            image = image.quantize(config['png_colors'], method=method)
+        image.save(buffer, 'PNG', optimize=True)
+    data = buffer.getvalue()
+
+    if fits and os.path.getsize(path) <= len(data):
+        with open(path, 'rb') as f:
+            data = f.read()
+    return Derivative(data, image_format, image.size)
+
+
+def prerender(assets):
+    """
+    Render derivatives ahead of their first use.
+
+    Args:
+        assets: Iterable of (path, width) pairs, as passed to get_derivative
+
+    Returns:
+        int: Number of derivatives available; missing or broken files are
+            logged and skipped
+    """
+    rendered = 0
+    for path, width in assets:
+        try:
+            get_derivative(path, width)
+            rendered += 1
+        except OSError as e:
+            logger.warning("Could not pre-render %s: %s", path, e)
+    return rendered
+
+
+def start_prerender(assets):
+    """
+    Pre-render derivatives on a background thread (once per process).
+
+    Args:
+        assets: Iterable of (path, width) pairs
+
+    Returns:
+        bool: True if this call started the thread
+    """
+    global _prerender_started
+    with _derivatives_lock:
+        if _prerender_started:
+            return False
+        _prerender_started = True
+
+    threading.Thread(
+        target=prerender, args=(list(assets),), name='baybayin-assets', daemon=True
+    ).start()
+    return True
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
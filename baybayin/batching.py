@@ -0,0 +1,271 @@
+"""
+In-process micro-batching in front of an inference engine.
+
+Callers from any thread (e.g. concurrent Streamlit sessions) submit
+preprocessed tensors; a single worker thread coalesces them into one model
+call per batch, bounded by a maximum batch size and a maximum wait, and
+resolves each caller's future with its own rows.
+"""
+import collections
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.model import get_model
+from config.settings import BATCHING_CONFIG, IMAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Number of recent batches kept for the batch size and wait time metrics
+_METRICS_WINDOW = 1024
+
+
+class _Request:
+    __slots__ = ('batch', 'future', 'enqueued')
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class BatchScheduler:
+    """
+    Coalesces predict calls from many threads into batched engine calls.
+
+    Exposes the same predict method as the engines, so it can be handed to
+    code that expects a model.
+    """
+
+    def __init__(self, engine, max_batch_size=None, max_wait_ms=None, input_shape=None):
+        """
+        Args:
+            engine: Object with a predict(batch) method returning (N, C) probabilities
+            max_batch_size: Maximum rows per engine call (default from BATCHING_CONFIG)
+            max_wait_ms: Longest time the first queued request waits for
+                others to join its batch (default from BATCHING_CONFIG)
+            input_shape: Shape of one image, (height, width, channels)
+                (default: IMAGE_SIZE with one channel)
+        """
+        self.engine = engine
+        target_w, target_h = IMAGE_SIZE
+        self.input_shape = tuple(input_shape or (target_h, target_w, 1))
+        self.model_version = getattr(engine, 'model_version', None)
+        self.max_batch_size = max_batch_size or BATCHING_CONFIG['max_batch_size']
+        wait_ms = BATCHING_CONFIG['max_wait_ms'] if max_wait_ms is None else max_wait_ms
+        self.max_wait = wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._pending = None
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._rows = 0
+        self._batch_sizes = collections.deque(maxlen=_METRICS_WINDOW)
+        self._wait_times = collections.deque(maxlen=_METRICS_WINDOW)
+
+        self._worker = threading.Thread(target=self._run, name="baybayin-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, batch):
+        """
+        Queue a batch of preprocessed images for prediction.
+
+        Args:
+            batch: float32 array of shape (N, height, width, 1); a single
+                image of shape (height, width, 1) is also accepted
+
+        Returns:
+            concurrent.futures.Future: Resolves to the (N, C) probabilities
+                for exactly these rows, or to the engine's exception
+
+        Raises:
+            ValueError: If the batch is empty or its images do not have
+                input_shape; such a batch would fail every request it
+                was coalesced with
+        """
+        if self._closed:
+            raise RuntimeError("BatchScheduler is closed")
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.ndim == 3:
+            batch = batch[np.newaxis]
+        if batch.ndim != 4 or batch.shape[1:] != self.input_shape or not len(batch):
+            raise ValueError(f"Expected a non-empty batch of shape (N, {', '.join(map(str, self.input_shape))}), "
+                             f"got {batch.shape}")
+        request = _Request(batch)
+        self._queue.put(request)
+        return request.future
+
+    def predict(self, batch, timeout=None, **kwargs):
+        """
+        Predict a batch through the scheduler and wait for the result.
+
+        Args:
+            batch: float32 array of shape (N, height, width, 1)
+            timeout: Seconds to wait for the result (default: no limit)
+            **kwargs: Ignored; accepted for Keras predict compatibility
+
+        Returns:
+            numpy.ndarray: Probabilities of shape (N, C)
+        """
+        return self.submit(batch).result(timeout=timeout)
+
+    def predict_on_batch(self, batch):
+        """Alias of predict, matching the Keras model API."""
+        return self.predict(batch)
+
+    def metrics(self):
+        """
+        Snapshot of scheduler metrics.
+
+        Returns:
+            dict: queue_depth, batches, requests, rows, mean_batch_size and
+                wait_ms percentiles (p50, p95, max) over recent batches
+        """
+        with self._stats_lock:
+            sizes = np.asarray(self._batch_sizes, dtype=np.float64)
+            waits = np.asarray(self._wait_times, dtype=np.float64) * 1000.0
+            result = {
+                'queue_depth': self._queue.qsize() + (self._pending is not None),
+                'batches': self._batches,
+                'requests': self._requests,
+                'rows': self._rows,
+                'mean_batch_size': float(sizes.mean()) if sizes.size else 0.0,
+                'max_batch_size': self.max_batch_size,
+            }
+        if waits.size:
+            p50, p95 = np.percentile(waits, [50, 95])
+            result['wait_ms'] = {'p50': float(p50), 'p95': float(p95), 'max': float(waits.max())}
+        else:
+            result['wait_ms'] = {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        return result
+
+    def close(self):
+        """Stop accepting requests and let the worker exit once the queue drains."""
+        self._closed = True
+        self._queue.put(None)
+
+    def _run(self):
+        """Worker loop: collect a batch, run it, resolve futures"""
+        while True:
+            requests = self._collect()
+            if requests is None:
+                return
+            if not requests:
+                continue
+            try:
+                self._execute(requests)
+            except Exception:
+                # One bad batch must not leave every later caller waiting forever
+                logger.exception("Batch scheduler failed to run a batch")
+                for request in requests:
+                    _resolve(request.future, exception=RuntimeError("Batch scheduler failed"))
+
+    def _collect(self):
+        """
+        Block for the first request, then gather more until full or the deadline passes.
+
+        Requests whose futures were cancelled while queued are dropped; the
+        rest are marked running, so they can no longer be cancelled.
+        """
+        first = self._pending or self._queue.get()
+        self._pending = None
+        if first is None:
+            return None
+        if not first.future.set_running_or_notify_cancel():
+            return []
+
+        requests = [first]
+        rows = len(first.batch)
+        deadline = first.enqueued + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            if rows + len(request.batch) > self.max_batch_size:
+                # Start the next batch with it rather than exceeding the limit
+                self._pending = request
+                break
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            requests.append(request)
+            rows += len(request.batch)
+
+        return requests
+
+    def _execute(self, requests):
+        """Run one engine call for the collected requests and split the output"""
+        started = time.perf_counter()
+        rows = sum(len(r.batch) for r in requests)
+
+        try:
+            batch = requests[0].batch if len(requests) == 1 else np.concatenate([r.batch for r in requests])
+            with instrumentation.span('engine_predict', batch.shape):
+                output = np.asarray(self.engine.predict(batch))
+        except Exception as e:
+            for request in requests:
+                _resolve(request.future, exception=e)
+        else:
+            offset = 0
+            for request in requests:
+                n = len(request.batch)
+                _resolve(request.future, output[offset:offset + n])
+                offset += n
+
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(requests)
+            self._rows += rows
+            self._batch_sizes.append(rows)
+            self._wait_times.extend(started - r.enqueued for r in requests)
+
+
+def _resolve(future, result=None, exception=None):
+    """Settle a future unless it is already done"""
+    if future.done():
+        return
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        # Settled concurrently between the check and the call
+        pass
+
+
+# Process-wide scheduler, created on first use
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Get the process-wide scheduler in front of the shared engine.
+
+    Returns:
+        BatchScheduler: Scheduler wrapping baybayin.model.get_model()
+
+    Raises:
+        ModelLoadError: If the model cannot be loaded
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BatchScheduler(get_model())
+    return _scheduler
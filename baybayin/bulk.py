@@ -0,0 +1,140 @@
+"""
+Streaming classification of many uploaded image files.
+
+Files are decoded and preprocessed on a shared thread pool (OpenCV releases
+the GIL) one batch at a time, with the next batch already being prepared
+while the model runs on the current one. Results come back batch by batch,
+in input order, so callers can show progress and only ever hold two batches
+of decoded images, however many files there are.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.exceptions import PreprocessingError
+from baybayin.image_io import open_image
+from baybayin.preprocessing import preprocess_image
+from baybayin.quality import check_quality
+from baybayin.results import decode_top_k
+from baybayin.tta import predict_with_tta
+from config.settings import BULK_CONFIG, IMAGE_SIZE
+
+
+class BulkResult(NamedTuple):
+    """The outcome for one file."""
+
+    index: int
+    name: str
+    labels: tuple
+    probabilities: tuple
+    error: Optional[str]
+
+
+def classify_files(files, model, batch_size=None, top_k=5, executor=None):
+    """
+    Classify image files in batches, yielding each batch's results.
+
+    Args:
+        files: Iterable of (name, encoded image bytes) pairs; consumed lazily
+        model: Object with a predict(batch) method (engine or BatchScheduler)
+        batch_size: Files per model call (default from BULK_CONFIG)
+        top_k: Number of predictions per file
+        executor: Pool for decoding and preprocessing (default: a shared pool
+            of BULK_CONFIG['workers'] threads)
+
+    Yields:
+        list: BulkResult for each file of the batch, in input order; files
+            that cannot be decoded or preprocessed carry an error instead of
+            predictions
+    """
+    batch_size = batch_size or BULK_CONFIG['batch_size']
+    executor = executor or _get_executor()
+    chunks = _chunked(enumerate(files), batch_size)
+
+    pending = _submit(executor, next(chunks, None))
+    while pending is not None:
+        chunk, futures = pending
+        # Prepare the next batch while the model runs on this one
+        pending = _submit(executor, next(chunks, None))
+        yield _classify_chunk(model, chunk, futures, top_k)
+
+
+def _submit(executor, chunk):
+    if chunk is None:
+        return None
+    return chunk, [executor.submit(_prepare, data) for _, (_, data) in chunk]
+
+
+def _classify_chunk(model, chunk, futures, top_k):
+    """Collect a chunk's preprocessed images and classify them in one call"""
+    target_w, target_h = IMAGE_SIZE
+    batch = np.ones((len(chunk), target_h, target_w, 1), dtype=np.float32)
+    errors = {}
+    for row, future in enumerate(futures):
+        try:
+            batch[row] = future.result()[0]
+        except PreprocessingError as e:
+            errors[row] = str(e)
+
+    ok = [row for row in range(len(chunk)) if row not in errors]
+    predictions = {}
+    if ok:
+        selected = batch[ok]
+        with instrumentation.span('predict', selected.shape):
+            probabilities = model.predict(selected)
+        probabilities = predict_with_tta(model, selected, probabilities).probabilities
+        top = decode_top_k(probabilities, k=top_k)
+        for position, row in enumerate(ok):
+            predictions[row] = (tuple(top.labels[position].tolist()),
+                                tuple(top.probabilities[position].tolist()))
+
+    results = []
+    for row, (index, (name, _)) in enumerate(chunk):
+        if row in errors:
+            results.append(BulkResult(index, name, (), (), errors[row]))
+        else:
+            results.append(BulkResult(index, name, *predictions[row], None))
+    return results
+
+
+def _prepare(data):
+    """Decode encoded image bytes once, check and preprocess them; runs on the pool"""
+    try:
+        with instrumentation.span('decode'):
+            image = open_image(data)
+    except Exception as e:
+        raise PreprocessingError("not a readable image file") from e
+    check_quality(image)
+    return preprocess_image(image)
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Process-wide pool shared by all sessions, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is not None:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=BULK_CONFIG['workers'], thread_name_prefix='baybayin-bulk'
+            )
+    return _executor
@@ -0,0 +1,191 @@
+"""
+Content-addressed cache of preprocessing and prediction results.
+
+Entries are keyed by a hash of the input content together with the
+preprocessing configuration and the model version, so a repeated request
+for the same input skips both preprocessing and inference, while a config
+or model change never serves stale results.
+"""
+import collections
+import hashlib
+import json
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from config.settings import CACHE_CONFIG, PROCESSING_CONFIG
+
+
+class CachedPrediction(NamedTuple):
+    """A cached result: the model-ready processed image and its probabilities."""
+
+    processed: np.ndarray
+    probabilities: np.ndarray
+
+
+def config_fingerprint(config=PROCESSING_CONFIG):
+    """
+    Stable hash of a preprocessing configuration.
+
+    Args:
+        config: Preprocessing configuration dict
+
+    Returns:
+        str: Hex digest that changes whenever any parameter changes
+    """
+    encoded = json.dumps(config, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def make_cache_key(content, model_version, namespace='', config=PROCESSING_CONFIG):
+    """
+    Build a cache key for an input.
+
+    Args:
+        content: Input pixels as a numpy array, or the raw bytes of an
+            encoded image file (cheaper to hash than the decoded pixels)
+        model_version: Version string of the model producing predictions
+        namespace: Distinguishes inputs that go through different
+            processing paths (e.g. 'upload' and 'canvas')
+        config: Preprocessing configuration the result depends on
+
+    Returns:
+        str: Hex digest identifying the input, config and model
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{namespace}|{model_version}|{config_fingerprint(config)}|".encode('utf-8'))
+    if isinstance(content, np.ndarray):
+        content = np.ascontiguousarray(content)
+        digest.update(f"{content.dtype.str}{content.shape}".encode('utf-8'))
+        digest.update(memoryview(content).cast('B'))
+    else:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with a time-to-live and entry and byte budgets.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl_seconds=None):
+        """
+        Args:
+            max_entries: Maximum number of entries (default from CACHE_CONFIG)
+            max_bytes: Maximum total array bytes held (default from CACHE_CONFIG)
+            ttl_seconds: Entry lifetime in seconds (default from CACHE_CONFIG)
+        """
+        self.max_entries = max_entries or CACHE_CONFIG['max_entries']
+        self.max_bytes = max_bytes or CACHE_CONFIG['max_bytes']
+        self.ttl = ttl_seconds or CACHE_CONFIG['ttl_seconds']
+
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Look up a cached result and mark it as recently used.
+
+        Args:
+            key: Key from make_cache_key
+
+        Returns:
+            CachedPrediction or None: The cached result, or None if absent or expired
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, processed, probabilities):
+        """
+        Store a result, evicting least recently used entries to stay in budget.
+
+        Args:
+            key: Key from make_cache_key
+            processed: Processed image array
+            probabilities: Prediction probabilities
+
+        Returns:
+            CachedPrediction: The stored, read-only entry
+        """
+        processed = np.array(processed, copy=True)
+        probabilities = np.array(probabilities, copy=True)
+        processed.setflags(write=False)
+        probabilities.setflags(write=False)
+        entry = CachedPrediction(processed, probabilities)
+
+        size = _entry_bytes(entry)
+        if size > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Snapshot of cache usage.
+
+        Returns:
+            dict: entries, bytes, hits, misses and evictions
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key):
+        """Remove an entry; the caller holds the lock"""
+        _, entry = self._entries.pop(key)
+        self._bytes -= _entry_bytes(entry)
+
+
+def _entry_bytes(entry):
+    """Array bytes held by a cache entry"""
+    return entry.processed.nbytes + entry.probabilities.nbytes
+
+
+# Process-wide cache shared by all sessions
+_prediction_cache = PredictionCache()
+
+
+def get_prediction_cache():
+    """
+    Get the process-wide prediction cache.
+
+    Returns:
+        PredictionCache: Cache shared by all sessions in this process
+    """
+    return _prediction_cache
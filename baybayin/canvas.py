@@ -0,0 +1,327 @@
+"""
+Vector fast path for drawings from the drawing canvas.
+
+The canvas reports its strokes as Fabric.js JSON alongside the RGBA raster.
+Free-drawn strokes are already clean ink, so instead of running the
+photo-oriented filter chain on the 500x500 raster, the stroke paths are
+drawn straight into a small working raster framed on their bounding box,
+then resized and thinned like any other input. A StrokeRasterizer keeps its
+raster between calls and only draws the new strokes when the drawing has
+just grown inside the same frame.
+
+Drawings this path cannot reproduce faithfully (shapes other than free-drawn
+paths, skewed or translucent objects, dark backgrounds) are left to
+process_canvas_drawing.
+"""
+import re
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.exceptions import PreprocessingError
+from baybayin.preprocessing import process_canvas_drawing, resize_with_padding, thin_strokes
+from config.settings import CANVAS_CONFIG, IMAGE_SIZE, PROCESSING_CONFIG
+
+# Fixed-point bits for sub-pixel stroke coordinates in cv2.polylines
+_SHIFT = 4
+
+# Where each Fabric.js origin sits within the object's box
+_ORIGINS = {'left': 0.0, 'top': 0.0, 'center': 0.5, 'right': 1.0, 'bottom': 1.0}
+
+
+class _Unsupported(Exception):
+    """The drawing needs the raster path"""
+
+
+class _Stroke(NamedTuple):
+    polylines: list
+    thickness: float
+    value: int
+    bbox: tuple
+
+
+class StrokeRasterizer:
+    """
+    Rasterizes canvas strokes into a model-sized image, reusing its raster.
+
+    One rasterizer belongs to one canvas (e.g. one Streamlit session) and is
+    not thread-safe.
+    """
+
+    def __init__(self, target_size=IMAGE_SIZE, canvas_size=None, config=CANVAS_CONFIG):
+        """
+        Args:
+            target_size: Target size for the processed image (width, height)
+            canvas_size: Canvas (width, height); strokes outside it are clipped
+            config: Vector path parameters (default CANVAS_CONFIG)
+        """
+        self.target_size = tuple(target_size)
+        self.canvas_size = canvas_size
+        self.config = config
+        self.working_size = max(self.target_size) * config['working_scale']
+
+        self._objects = []
+        self._strokes = []
+        self._frame = None
+        self._working = None
+        self._drawn = 0
+
+    def render(self, json_data, background_color='#FFFFFF'):
+        """
+        Rasterize the canvas strokes.
+
+        Args:
+            json_data: Canvas JSON with an 'objects' list
+            background_color: Canvas background colour
+
+        Returns:
+            numpy.ndarray or None: uint8 image of shape (height, width) with
+                black ink on white, or None if the drawing needs the raster path
+
+        Raises:
+            Exception: If the JSON is malformed
+        """
+        objects = (json_data or {}).get('objects') or []
+        try:
+            if _gray_level(background_color) <= 127:
+                return None
+            strokes, reused = self._parse(objects)
+        except _Unsupported:
+            return None
+
+        ink = [stroke.bbox for stroke in strokes if stroke.value == 0]
+        if not ink:
+            target_w, target_h = self.target_size
+            return np.full((target_h, target_w), 255, dtype=np.uint8)
+
+        x0, y0, x1, y1 = self._content_box(np.asarray(ink))
+        scale = self.working_size / max(x1 - x0, y1 - y0)
+        shape = (max(1, round((y1 - y0) * scale)), max(1, round((x1 - x0) * scale)))
+        frame = (x0, y0, scale, shape)
+
+        # Strokes appended within the same frame are drawn onto the last raster
+        if frame != self._frame or reused < self._drawn:
+            self._frame = None
+            self._working = np.full(shape, 255, dtype=np.uint8)
+            self._drawn = 0
+        for stroke in strokes[self._drawn:]:
+            self._draw(stroke, x0, y0, scale)
+        self._frame = frame
+        self._drawn = len(strokes)
+
+        return thin_strokes(resize_with_padding(self._working, self.target_size))
+
+    def _parse(self, objects):
+        """Parse the objects, reusing strokes for an unchanged prefix"""
+        reused = 0
+        for old, new in zip(self._objects, objects):
+            if old != new:
+                break
+            reused += 1
+
+        steps = self.config['curve_steps']
+        strokes = self._strokes[:reused]
+        for obj in objects[reused:]:
+            stroke = _parse_object(obj, steps)
+            if stroke is not None:
+                strokes.append(stroke)
+                continue
+            # Hidden objects keep their place so prefixes stay aligned
+            strokes.append(_Stroke([], 0.0, 255, (0.0, 0.0, 0.0, 0.0)))
+
+        self._objects = list(objects)
+        self._strokes = strokes
+        return strokes, reused
+
+    def _content_box(self, boxes):
+        """Ink bounding box plus crop padding, clipped to the canvas"""
+        padding = PROCESSING_CONFIG['crop_padding']
+        x0, y0 = boxes[:, 0].min() - padding, boxes[:, 1].min() - padding
+        x1, y1 = boxes[:, 2].max() + padding, boxes[:, 3].max() + padding
+        if self.canvas_size is not None:
+            width, height = self.canvas_size
+            x0, y0 = max(0.0, x0), max(0.0, y0)
+            x1, y1 = min(float(width), x1), min(float(height), y1)
+        if x1 - x0 < 1 or y1 - y0 < 1:
+            raise PreprocessingError("Drawing lies outside the canvas")
+        return float(x0), float(y0), float(x1), float(y1)
+
+    def _draw(self, stroke, x0, y0, scale):
+        """Draw one stroke into the working raster"""
+        thickness = max(1, int(round(stroke.thickness * scale)))
+        for points in stroke.polylines:
+            fixed = np.round((points - (x0, y0)) * (scale * (1 << _SHIFT))).astype(np.int32)
+            if len(fixed) == 1:
+                # A click without movement is a dot
+                fixed = np.repeat(fixed, 2, axis=0)
+            cv2.polylines(self._working, [fixed], False, stroke.value, thickness, cv2.LINE_8, _SHIFT)
+
+
+def process_canvas_strokes(json_data, rasterizer=None, background_color='#FFFFFF'):
+    """
+    Process a drawing from its canvas strokes for classification.
+
+    Args:
+        json_data: Canvas JSON with an 'objects' list
+        rasterizer: StrokeRasterizer kept between calls for incremental
+            rendering (a fresh one is used when omitted)
+        background_color: Canvas background colour
+
+    Returns:
+        numpy.ndarray or None: Processed image ready for classification, or
+            None if the drawing needs process_canvas_drawing instead
+
+    Raises:
+        PreprocessingError: If the strokes cannot be processed
+    """
+    rasterizer = rasterizer or StrokeRasterizer()
+    try:
+        with instrumentation.span('rasterize_strokes', rasterizer.target_size):
+            final = rasterizer.render(json_data, background_color)
+    except PreprocessingError:
+        raise
+    except Exception as e:
+        raise PreprocessingError(str(e)) from e
+    if final is None:
+        return None
+
+    final = final.astype('float32') / 255.0
+    return final[np.newaxis, :, :, np.newaxis]
+
+
+def _parse_object(obj, steps):
+    """Turn one Fabric.js object into a stroke in canvas coordinates"""
+    if not obj.get('visible', True):
+        return None
+    if obj.get('type') != 'path':
+        raise _Unsupported()
+    if obj.get('skewX') or obj.get('skewY') or obj.get('opacity', 1) != 1:
+        raise _Unsupported()
+    if obj.get('fill') not in (None, '', 'transparent'):
+        raise _Unsupported()
+
+    stroke_width = float(obj.get('strokeWidth', 1))
+    scale_x = float(obj.get('scaleX', 1)) * (-1 if obj.get('flipX') else 1)
+    scale_y = float(obj.get('scaleY', 1)) * (-1 if obj.get('flipY') else 1)
+    angle = np.deg2rad(float(obj.get('angle', 0)))
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+
+    # The object's centre: its origin point moved by the rotated offset of
+    # the origin within the stroked box
+    box = np.array([
+        (float(obj['width']) + stroke_width) * abs(scale_x),
+        (float(obj['height']) + stroke_width) * abs(scale_y),
+    ])
+    offset = (0.5 - np.array([_ORIGINS[obj.get('originX', 'left')], _ORIGINS[obj.get('originY', 'top')]])) * box
+    center = np.array([float(obj['left']), float(obj['top'])]) + rotation @ offset
+
+    path_offset = obj.get('pathOffset') or {'x': 0.0, 'y': 0.0}
+    local_origin = np.array([float(path_offset['x']), float(path_offset['y'])])
+    transform = rotation * (scale_x, scale_y)
+
+    polylines = [
+        (points - local_origin) @ transform.T + center
+        for points in _flatten_path(obj['path'], steps)
+    ]
+    if not polylines:
+        return None
+
+    thickness = stroke_width if obj.get('strokeUniform') else stroke_width * (abs(scale_x) + abs(scale_y)) / 2
+    value = 0 if _gray_level(obj.get('stroke') or '#000000') <= 127 else 255
+    points = np.concatenate(polylines)
+    half = thickness / 2
+    bbox = (points[:, 0].min() - half, points[:, 1].min() - half,
+            points[:, 0].max() + half, points[:, 1].max() + half)
+    return _Stroke(polylines, thickness, value, bbox)
+
+
+def _flatten_path(commands, steps):
+    """Flatten absolute SVG path commands into polylines"""
+    polylines = []
+    current = []
+    t = np.linspace(1.0 / steps, 1.0, steps)[:, np.newaxis]
+
+    for command in commands:
+        op, args = command[0], [float(value) for value in command[1:]]
+        if op == 'M':
+            if current:
+                polylines.append(current)
+            current = [np.array([args[:2]])]
+        elif op == 'L':
+            current.append(np.array([args[:2]]))
+        elif op == 'Q':
+            start = current[-1][-1]
+            control, end = np.array(args[0:2]), np.array(args[2:4])
+            current.append((1 - t) ** 2 * start + 2 * (1 - t) * t * control + t ** 2 * end)
+        elif op == 'C':
+            start = current[-1][-1]
+            c1, c2, end = np.array(args[0:2]), np.array(args[2:4]), np.array(args[4:6])
+            current.append((1 - t) ** 3 * start + 3 * (1 - t) ** 2 * t * c1
+                           + 3 * (1 - t) * t ** 2 * c2 + t ** 3 * end)
+        elif op in ('Z', 'z'):
+            if current:
+                current.append(current[0][:1])
+        else:
+            # Relative commands and arcs are never produced by the canvas
+            raise _Unsupported()
+
+    if current:
+        polylines.append(current)
+    return [np.concatenate(parts) for parts in polylines]
+
+
+def _gray_level(color):
+    """Gray level (0-255) of an opaque CSS colour, weighted like cv2's RGB2GRAY"""
+    color = color.strip().lower()
+    alpha = 1.0
+    if color.startswith('#'):
+        digits = color[1:]
+        if len(digits) in (3, 4):
+            digits = ''.join(c * 2 for c in digits)
+        if len(digits) not in (6, 8):
+            raise _Unsupported()
+        red, green, blue = (int(digits[i:i + 2], 16) for i in (0, 2, 4))
+        if len(digits) == 8:
+            alpha = int(digits[6:8], 16) / 255.0
+    elif color.startswith('rgb'):
+        values = [float(value) for value in re.findall(r'[\d.]+', color)]
+        red, green, blue = values[:3]
+        if len(values) > 3:
+            alpha = values[3]
+    else:
+        raise _Unsupported()
+
+    if alpha < 1:
+        raise _Unsupported()
+    return 0.299 * red + 0.587 * green + 0.114 * blue
+
+
+def process_canvas(json_data, image_data, rasterizer=None, background_color='#FFFFFF'):
+    """
+    Process a canvas drawing, from its strokes when possible.
+
+    Args:
+        json_data: Canvas JSON with an 'objects' list, or None
+        image_data: Canvas RGBA raster, used when the strokes cannot be
+            rasterized directly
+        rasterizer: StrokeRasterizer kept between calls
+        background_color: Canvas background colour
+
+    Returns:
+        numpy.ndarray: Processed image ready for classification
+
+    Raises:
+        PreprocessingError: If the drawing cannot be processed
+    """
+    processed = None
+    if CANVAS_CONFIG['vector_strokes'] and json_data is not None:
+        try:
+            processed = process_canvas_strokes(json_data, rasterizer, background_color)
+        except PreprocessingError:
+            # The raster path still works on whatever the strokes look like
+            processed = None
+    if processed is None:
+        processed = process_canvas_drawing(image_data)
+    return processed
@@ -0,0 +1,124 @@
+"""
+Two-stage model cascade: a small, fast classifier in front of the full CNN.
+
+Every batch goes through the fast model first. Rows whose top-1 confidence
+reaches CASCADE_CONFIG['threshold'] keep its answer; the rest are escalated
+to the full model together, in one call per batch. Most canvas drawings are
+clean and never reach the full model. The cascade exposes the same predict
+method as the engines, so the batch scheduler, the pages, the CLI and the
+HTTP API use it unchanged. Train the fast model with
+``python -m baybayin distill`` (baybayin.distill).
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+
+from baybayin import instrumentation
+from config.settings import CASCADE_CONFIG
+
+# Number of recent batches kept for the latency metrics
+_METRICS_WINDOW = 1024
+
+
+class CascadeEngine:
+    """Answers with a fast model when it is confident, else with the full model."""
+
+    name = 'cascade'
+
+    def __init__(self, fast, full, threshold=None):
+        """
+        Args:
+            fast: Engine for the first stage (same classes as the full model)
+            full: Engine for escalated rows
+            threshold: Top-1 confidence the fast model must reach to answer
+                (default from CASCADE_CONFIG)
+        """
+        self.fast = fast
+        self.full = full
+        self.threshold = CASCADE_CONFIG['threshold'] if threshold is None else threshold
+        self.model_version = (
+            f"cascade:{fast.model_version}|{full.model_version}|{self.threshold:g}"
+        )
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._escalated = 0
+        self._fast_times = collections.deque(maxlen=_METRICS_WINDOW)
+        self._full_times = collections.deque(maxlen=_METRICS_WINDOW)
+
+    def predict(self, batch, **kwargs):
+        """
+        Run the cascade on a batch of preprocessed images.
+
+        Args:
+            batch: float32 array of shape (N, height, width, 1)
+            **kwargs: Ignored; accepted for Keras predict compatibility
+
+        Returns:
+            numpy.ndarray: float32 probabilities of shape (N, num_classes),
+                from the fast model for confident rows and from the full
+                model for the others
+        """
+        started = time.perf_counter()
+        with instrumentation.span('cascade_fast', batch.shape):
+            probabilities = np.array(self.fast.predict(batch), dtype=np.float32)
+        fast_seconds = time.perf_counter() - started
+
+        escalate = probabilities.max(axis=1) < self.threshold
+        full_seconds = None
+        if escalate.any():
+            started = time.perf_counter()
+            selected = batch[escalate]
+            with instrumentation.span('cascade_full', selected.shape):
+                probabilities[escalate] = self.full.predict(selected)
+            full_seconds = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._batches += 1
+            self._rows += len(batch)
+            self._escalated += int(escalate.sum())
+            self._fast_times.append(fast_seconds)
+            if full_seconds is not None:
+                self._full_times.append(full_seconds)
+        return probabilities
+
+    def predict_on_batch(self, batch):
+        """Alias of predict, matching the Keras model API."""
+        return self.predict(batch)
+
+    def metrics(self):
+        """
+        Snapshot of cascade metrics.
+
+        Returns:
+            dict: batches, rows, escalated rows, escalation_rate, and
+                fast_ms / full_ms latency percentiles (p50, p95, max) per
+                batch over recent batches; full_ms only covers batches
+                that escalated
+        """
+        with self._stats_lock:
+            result = {
+                'batches': self._batches,
+                'rows': self._rows,
+                'escalated': self._escalated,
+                'escalation_rate': self._escalated / self._rows if self._rows else 0.0,
+                'threshold': self.threshold,
+            }
+            fast = np.asarray(self._fast_times, dtype=np.float64) * 1000.0
+            full = np.asarray(self._full_times, dtype=np.float64) * 1000.0
+        result['fast_ms'] = _latency(fast)
+        result['full_ms'] = _latency(full)
+        return result
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.fast!r}, {self.full!r}, threshold={self.threshold:g})"
+
+
+def _latency(times):
+    if not times.size:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    p50, p95 = np.percentile(times, [50, 95])
+    return {'p50': float(p50), 'p95': float(p95), 'max': float(times.max())}
@@ -0,0 +1,628 @@
+"""
+Command-line entry point for classifying Baybayin character images.
+
+Usage:
+    python -m baybayin classify <dir|glob|file>... [--output results.csv] [--workers 0] [--tta]
+    python -m baybayin read <page image>... [--output pages.jsonl]
+    python -m baybayin convert --to tflite [--quantize float16]
+    python -m baybayin distill <dir|glob|file>... [--output small.h5] [--width 16]
+    python -m baybayin serve [--port 8080] [--max-in-flight 64]
+    python -m baybayin model-server [--socket /tmp/baybayin-model.sock]
+    python -m baybayin store build <dir|glob|file>... [--store data/tensor_store]
+    python -m baybayin store score [--store data/tensor_store] [--output results.csv]
+"""
+import argparse
+import csv
+import glob
+import itertools
+import json
+import os
+import sys
+
+from baybayin import instrumentation
+from baybayin.engines import ENGINES
+from baybayin.exceptions import ModelLoadError
+from baybayin.image_io import open_image
+from baybayin.model import get_local_model, get_model
+from baybayin.parallel import ParallelPreprocessor
+from baybayin.preprocessing import preprocess_batch
+from baybayin.results import decode_top_k
+from baybayin.tta import predict_with_tta
+from config.settings import (
+    BAYBAYIN_CATEGORIES, CASCADE_CONFIG, IMAGE_IO_CONFIG, INFERENCE_CONFIG, MODEL_PATH, MODEL_SERVER_CONFIG,
+    STORE_CONFIG, TTA_CONFIG,
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def main(argv=None):
+    """
+    Parse command-line arguments and run the selected command.
+
+    Args:
+        argv: Argument list (defaults to sys.argv[1:])
+
+    Returns:
+        int: Process exit code
+    """
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+def _build_parser():
+    """Build the argument parser with all subcommands"""
+    parser = argparse.ArgumentParser(
+        prog="python -m baybayin",
+        description="Headless tools for the Baybayin character classifier."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify = subparsers.add_parser(
+        "classify", help="Classify character images from files, directories or globs"
+    )
+    classify.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    classify.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    classify.add_argument(
+        "-f", "--format", choices=("csv", "jsonl"), default=None,
+        help="Output format (default: from output extension, else csv)"
+    )
+    classify.add_argument("-k", "--top-k", type=int, default=5, help="Number of predictions per image")
+    classify.add_argument("-b", "--batch-size", type=int, default=64, help="Images per model call")
+    classify.add_argument(
+        "-w", "--workers", type=int, default=1,
+        help="Preprocessing processes (0: one per CPU; default 1 preprocesses in this process)"
+    )
+    classify.add_argument(
+        "--engine", choices=sorted(ENGINES), default=None,
+        help="Inference engine (default: from INFERENCE_CONFIG)"
+    )
+    classify.add_argument("--model", default=None, help="Model file for the engine")
+    classify.add_argument(
+        "--tta", action="store_true",
+        help="Re-score low-confidence images with augmented variants (settings from TTA_CONFIG)"
+    )
+    classify.add_argument(
+        "--timings", action="store_true", help="Print per-stage timing percentiles to stderr when done"
+    )
+    classify.set_defaults(func=_classify_command)
+
+    read = subparsers.add_parser(
+        "read", help="Segment whole words, lines or pages into glyphs and classify them"
+    )
+    read.add_argument("inputs", nargs="+", help="Page images, directories or glob patterns")
+    read.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    read.add_argument("-k", "--top-k", type=int, default=3, help="Number of predictions per glyph")
+    read.add_argument(
+        "--engine", choices=sorted(ENGINES), default=None,
+        help="Inference engine (default: from INFERENCE_CONFIG)"
+    )
+    read.add_argument("--model", default=None, help="Model file for the engine")
+    read.set_defaults(func=_read_command)
+
+    convert = subparsers.add_parser(
+        "convert", help="Convert the Keras model to TFLite or ONNX for the lighter engines"
+    )
+    convert.add_argument("--to", choices=("tflite", "onnx"), required=True, help="Target format")
+    convert.add_argument("-o", "--output", default=None, help="Output file (default: from INFERENCE_CONFIG)")
+    convert.add_argument("--model", default=MODEL_PATH, help="Keras .h5 model to convert")
+    convert.add_argument(
+        "--quantize", choices=("dynamic", "float16", "int8"), default=None,
+        help="TFLite quantization mode"
+    )
+    convert.add_argument(
+        "--calibration", nargs="+", default=(),
+        help="Images, directories or globs used to calibrate int8 quantization"
+    )
+    convert.add_argument(
+        "--calibration-size", type=int, default=200, help="Maximum number of calibration images"
+    )
+    convert.set_defaults(func=_convert_command)
+
+    distill = subparsers.add_parser(
+        "distill", help="Train the cascade's small first-stage model from the full model"
+    )
+    distill.add_argument("inputs", nargs="+", help="Training images, directories or glob patterns")
+    distill.add_argument(
+        "-o", "--output", default=None, help="Output .h5 file (default: from CASCADE_CONFIG)"
+    )
+    distill.add_argument(
+        "--teacher", default=None, help="Keras model to learn from (default: from INFERENCE_CONFIG)"
+    )
+    distill.add_argument(
+        "--width", type=int, default=None, help="Filters in the first layer (default: from CASCADE_CONFIG)"
+    )
+    distill.add_argument("--epochs", type=int, default=20, help="Training epochs")
+    distill.add_argument("--temperature", type=float, default=1.0, help="Softening of the teacher's outputs")
+    distill.add_argument(
+        "--no-augment", action="store_true", help="Train on the images only, without TTA variants"
+    )
+    distill.set_defaults(func=_distill_command)
+
+    serve = subparsers.add_parser("serve", help="Run the HTTP classification API (needs aiohttp)")
+    serve.add_argument("--host", default=None, help="Interface to bind (default: from SERVER_CONFIG)")
+    serve.add_argument("--port", type=int, default=None, help="Port to bind (default: from SERVER_CONFIG)")
+    serve.add_argument(
+        "--engine", choices=sorted(ENGINES), default=None,
+        help="Inference engine (default: from INFERENCE_CONFIG)"
+    )
+    serve.add_argument("--model", default=None, help="Model file for the engine")
+    serve.add_argument(
+        "--max-in-flight", type=int, default=None, help="Requests processed at once; more get 503"
+    )
+    serve.add_argument("--timeout", type=float, default=None, help="Seconds allowed per request")
+    serve.add_argument("--workers", type=int, default=None, help="Preprocessing threads")
+    serve.set_defaults(func=_serve_command)
+
+    model_server = subparsers.add_parser(
+        "model-server", help="Serve the model to the app processes on this host over a Unix socket"
+    )
+    model_server.add_argument(
+        "--socket", default=None, help="Socket file (default: from MODEL_SERVER_CONFIG)"
+    )
+    model_server.add_argument(
+        "--engine", choices=sorted(ENGINES), default=None,
+        help="Inference engine (default: from INFERENCE_CONFIG)"
+    )
+    model_server.add_argument("--model", default=None, help="Model file for the engine")
+    model_server.set_defaults(func=_model_server_command)
+
+    store = subparsers.add_parser(
+        "store", help="Preprocess a dataset once into a tensor store, then score it with any model"
+    )
+    store_commands = store.add_subparsers(dest="store_command", required=True)
+
+    build = store_commands.add_parser("build", help="Add new and changed images to the store")
+    build.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    build.add_argument("--store", default=None, help="Store directory (default: from STORE_CONFIG)")
+    build.add_argument(
+        "-w", "--workers", type=int, default=None, help="Preprocessing threads (default: from STORE_CONFIG)"
+    )
+    build.set_defaults(func=_store_build_command)
+
+    score = store_commands.add_parser("score", help="Classify every image in the store")
+    score.add_argument("--store", default=None, help="Store directory (default: from STORE_CONFIG)")
+    score.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    score.add_argument(
+        "-f", "--format", choices=("csv", "jsonl"), default=None,
+        help="Output format (default: from output extension, else csv)"
+    )
+    score.add_argument("-k", "--top-k", type=int, default=5, help="Number of predictions per image")
+    score.add_argument(
+        "-b", "--batch-size", type=int, default=None, help="Images per model call (default: from STORE_CONFIG)"
+    )
+    score.add_argument(
+        "--engine", choices=sorted(ENGINES), default=None,
+        help="Inference engine (default: from INFERENCE_CONFIG)"
+    )
+    score.add_argument("--model", default=None, help="Model file for the engine")
+    score.add_argument(
+        "--tta", action="store_true",
+        help="Re-score low-confidence images with augmented variants (settings from TTA_CONFIG)"
+    )
+    score.add_argument(
+        "--timings", action="store_true", help="Print per-stage timing percentiles to stderr when done"
+    )
+    score.set_defaults(func=_store_score_command)
+
+    return parser
+
+
+def _classify_command(args):
+    """Run the classify subcommand"""
+    if args.timings and not instrumentation.enabled():
+        instrumentation.set_sink(instrumentation.HistogramSink())
+
+    output_format = args.format or ("jsonl" if args.output.endswith(".jsonl") else "csv")
+    top_k = max(1, min(args.top_k, len(BAYBAYIN_CATEGORIES)))
+    tta = dict(TTA_CONFIG, enabled=True) if args.tta else None
+    try:
+        model = get_model(args.engine, args.model)
+    except ModelLoadError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    pool = None
+    paths = iter_image_paths(args.inputs)
+    if args.workers == 1:
+        batches = (classify_paths(model, chunk, top_k, tta) for chunk in _chunked(paths, args.batch_size))
+    else:
+        # The pool preprocesses the next batch while the model runs on this one
+        pool = ParallelPreprocessor(workers=args.workers or None)
+        batches = (
+            classify_batch(model, chunk, batch, failures, top_k, tta)
+            for chunk, batch, failures in pool.imap_batches(paths, args.batch_size)
+        )
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = _make_writer(out, output_format, top_k)
+        processed = failed = 0
+
+        for results in batches:
+            for path, predictions, error in results:
+                writer(path, predictions, error)
+                if error is None:
+                    processed += 1
+                else:
+                    failed += 1
+            print(f"Classified {processed} images ({failed} failed)", file=sys.stderr)
+    finally:
+        if pool is not None:
+            batches.close()
+            pool.close()
+        if out is not sys.stdout:
+            out.close()
+
+    if args.timings:
+        _print_timings(instrumentation.get_sink())
+        if getattr(model, 'name', None) == 'cascade':
+            _print_cascade(model.metrics())
+
+    return 0 if processed or not failed else 1
+
+
+def _read_command(args):
+    """Run the read subcommand: one JSONL record per page"""
+    from baybayin.segmentation import classify_page
+
+    try:
+        model = get_model(args.engine, args.model)
+    except ModelLoadError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    failed = 0
+    try:
+        for path in iter_image_paths(args.inputs):
+            record = {"path": path, "lines": [], "glyphs": [], "error": None}
+            try:
+                results = classify_page(open_image(path, IMAGE_IO_CONFIG['max_page_pixels']), model, k=args.top_k)
+            except Exception as e:
+                record["error"] = str(e)
+                failed += 1
+                results = []
+
+            for result in results:
+                glyph = result.glyph
+                while len(record["lines"]) <= glyph.line:
+                    record["lines"].append([])
+                record["lines"][glyph.line].append(result.labels[0])
+                record["glyphs"].append({
+                    "line": glyph.line,
+                    "box": [glyph.x, glyph.y, glyph.width, glyph.height],
+                    "predictions": [
+                        {"label": label, "confidence": round(confidence, 6)}
+                        for label, confidence in zip(result.labels, result.probabilities)
+                    ],
+                })
+            out.write(json.dumps(record) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    return 1 if failed else 0
+
+
+def _convert_command(args):
+    """Run the convert subcommand"""
+    from baybayin.convert import convert_to_onnx, convert_to_tflite
+
+    output = args.output or INFERENCE_CONFIG['model_paths'][args.to]
+    try:
+        if args.to == "tflite":
+            paths = itertools.islice(iter_image_paths(args.calibration), args.calibration_size)
+            calibration = list(_open_calibration(paths))
+            size = convert_to_tflite(output, args.model, args.quantize, calibration)
+        else:
+            if args.quantize:
+                print("error: --quantize only applies to TFLite", file=sys.stderr)
+                return 2
+            size = convert_to_onnx(output, args.model)
+    except ImportError as e:
+        print(f"error: conversion needs TensorFlow (and tf2onnx for ONNX): {e}", file=sys.stderr)
+        return 2
+    except (ModelLoadError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"Wrote {output} ({size / 1024:.1f} KiB)", file=sys.stderr)
+    return 0
+
+
+def _open_calibration(paths):
+    """Decode calibration images, skipping unreadable files with a warning"""
+    for path in paths:
+        try:
+            yield open_image(path)
+        except Exception as e:
+            print(f"warning: skipping calibration image {path}: {e}", file=sys.stderr)
+
+
+def _distill_command(args):
+    """Run the distill subcommand"""
+    try:
+        from baybayin.distill import distill
+        teacher = get_model("keras", args.teacher) if args.teacher else None
+        images = [open_image(path) for path in iter_image_paths(args.inputs)]
+        summary = distill(
+            images, args.output, teacher, width=args.width, epochs=args.epochs,
+            temperature=args.temperature, augment_data=not args.no_augment,
+        )
+    except ImportError as e:
+        print(f"error: distillation needs TensorFlow: {e}", file=sys.stderr)
+        return 2
+    except (ModelLoadError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    agreement = summary['agreement']
+    print(f"Wrote {summary['path']} (trained on {summary['samples']} samples"
+          + (f", {agreement:.1%} top-1 agreement with the teacher on {summary['validation']} held-out images"
+             if agreement is not None else "") + ")", file=sys.stderr)
+    if not CASCADE_CONFIG['enabled']:
+        print("Set CASCADE_CONFIG['enabled'] to serve it in front of the full model", file=sys.stderr)
+    return 0
+
+
+def _serve_command(args):
+    """Run the serve subcommand"""
+    try:
+        from baybayin.server import serve
+    except ImportError as e:
+        print(f"error: the HTTP API needs aiohttp (pip install aiohttp): {e}", file=sys.stderr)
+        return 2
+
+    try:
+        model = get_model(args.engine, args.model)
+    except ModelLoadError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    serve(args.host, args.port, model, max_in_flight=args.max_in_flight,
+          request_timeout=args.timeout, workers=args.workers)
+    return 0
+
+
+def _model_server_command(args):
+    """Run the model-server subcommand"""
+    from baybayin.model_server import serve
+
+    try:
+        model = get_local_model(args.engine, args.model)
+    except ModelLoadError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    socket_path = args.socket or MODEL_SERVER_CONFIG['socket_path']
+    print(f"Serving {model.model_version} on {socket_path}", file=sys.stderr)
+    try:
+        serve(socket_path, model)
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def _store_build_command(args):
+    """Run the store build subcommand"""
+    from baybayin.tensor_store import TensorStore
+
+    with TensorStore(args.store) as store:
+        if store.invalidated:
+            print("Preprocessing configuration changed; rebuilding the store", file=sys.stderr)
+        summary = store.update(iter_image_paths(args.inputs), workers=args.workers)
+        print(f"{store.directory}: {summary['added']} added, {summary['unchanged']} unchanged, "
+              f"{summary['failed']} failed, {summary['removed']} removed; {len(store)} images",
+              file=sys.stderr)
+    return 0 if summary['added'] or summary['unchanged'] or not summary['failed'] else 1
+
+
+def _store_score_command(args):
+    """Run the store score subcommand: inference only, on the stored tensors"""
+    from baybayin.tensor_store import TensorStore
+
+    if args.timings and not instrumentation.enabled():
+        instrumentation.set_sink(instrumentation.HistogramSink())
+
+    output_format = args.format or ("jsonl" if args.output.endswith(".jsonl") else "csv")
+    top_k = max(1, min(args.top_k, len(BAYBAYIN_CATEGORIES)))
+    tta = dict(TTA_CONFIG, enabled=True) if args.tta else None
+    try:
+        store = TensorStore(args.store, readonly=True)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    try:
+        model = get_model(args.engine, args.model)
+    except ModelLoadError as e:
+        store.close()
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    processed = 0
+    try:
+        writer = _make_writer(out, output_format, top_k)
+        for entries, batch in store.batches(args.batch_size or STORE_CONFIG['batch_size']):
+            paths = [entry.path for entry in entries]
+            for path, predictions, error in classify_batch(model, paths, batch, {}, top_k, tta):
+                writer(path, predictions, error)
+            processed += len(entries)
+            print(f"Classified {processed} images", file=sys.stderr)
+        failures = store.failures()
+        for path, error in failures:
+            writer(path, [], error)
+    finally:
+        store.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Classified {processed} images ({len(failures)} failed when the store was built)",
+          file=sys.stderr)
+    if args.timings:
+        _print_timings(instrumentation.get_sink())
+        if getattr(model, 'name', None) == 'cascade':
+            _print_cascade(model.metrics())
+
+    return 0 if processed or not failures else 1
+
+
+def _print_timings(sink):
+    """Print a per-stage timing table from a histogram sink to stderr"""
+    if not isinstance(sink, instrumentation.HistogramSink):
+        return
+    print(f"{'stage':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}", file=sys.stderr)
+    for stage, stats in sink.snapshot().items():
+        print(f"{stage:<22}{stats['count']:>8}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+              f"{stats['max_ms']:>10.3f}", file=sys.stderr)
+
+
+def _print_cascade(metrics):
+    """Print the escalation rate and the latency split of a cascade to stderr"""
+    print(f"cascade: {metrics['escalated']} of {metrics['rows']} images escalated "
+          f"({metrics['escalation_rate']:.1%}, threshold {metrics['threshold']:g}); "
+          f"fast p50 {metrics['fast_ms']['p50']:.1f} ms, full p50 {metrics['full_ms']['p50']:.1f} ms per batch",
+          file=sys.stderr)
+
+
+def iter_image_paths(inputs):
+    """
+    Expand files, directories and glob patterns into image paths lazily.
+
+    Args:
+        inputs: Iterable of file paths, directory paths or glob patterns
+
+    Yields:
+        str: Path to each image file, in a stable sorted order per input
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif os.path.isfile(item):
+            yield item
+        else:
+            for path in sorted(glob.iglob(item, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path
+
+
+def classify_paths(model, paths, top_k=5, tta=None):
+    """
+    Classify one batch of image files with a single model call.
+
+    Args:
+        model: Loaded classifier model
+        paths: List of image file paths
+        top_k: Number of predictions to return per image
+        tta: TTA configuration for re-scoring low-confidence images, or
+            None to skip test-time augmentation
+
+    Returns:
+        list: (path, predictions, error) tuples in input order, where
+            predictions is a list of (label, confidence) pairs and error is
+            None on success or an error message on failure
+    """
+    images = []
+    errors = {}
+    for i, path in enumerate(paths):
+        try:
+            with instrumentation.span('decode'):
+                images.append(open_image(path))
+        except Exception as e:
+            images.append(None)
+            errors[i] = str(e)
+
+    batch, failures = preprocess_batch(images)
+    for i, message in failures.items():
+        errors.setdefault(i, message)
+
+    return classify_batch(model, paths, batch, errors, top_k, tta)
+
+
+def classify_batch(model, paths, batch, errors, top_k=5, tta=None):
+    """
+    Classify an already preprocessed batch with a single model call.
+
+    Args:
+        model: Loaded classifier model
+        paths: Image file paths matching the batch rows
+        batch: Preprocessed images of shape (N, height, width, 1)
+        errors: Maps the index of each row that failed to its error message
+        top_k: Number of predictions to return per image
+        tta: TTA configuration (see classify_paths), or None
+
+    Returns:
+        list: (path, predictions, error) tuples as from classify_paths
+    """
+    ok = [i for i in range(len(paths)) if i not in errors]
+    rows = {}
+    if ok:
+        # Only failures force a copy of the rows that go to the model
+        selected = batch if len(ok) == len(batch) else batch[ok]
+        with instrumentation.span('predict', selected.shape):
+            prediction = model.predict_on_batch(selected)
+        if tta is not None:
+            # Uncertain rows of the whole batch are re-scored in one more call
+            prediction = predict_with_tta(model, selected, prediction, tta).probabilities
+        top = decode_top_k(prediction, k=top_k)
+        labels, probabilities = top.labels.tolist(), top.probabilities.tolist()
+        for row, i in enumerate(ok):
+            rows[i] = list(zip(labels[row], probabilities[row]))
+
+    results = []
+    for i, path in enumerate(paths):
+        if i in errors:
+            results.append((path, [], errors[i]))
+        else:
+            results.append((path, rows[i], None))
+
+    return results
+
+
+def _chunked(iterable, size):
+    """Yield lists of up to size items from an iterable"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _make_writer(out, output_format, top_k):
+    """Create a row writer for the requested output format"""
+    if output_format == "jsonl":
+        def write_jsonl(path, predictions, error):
+            record = {
+                "path": path,
+                "predictions": [
+                    {"label": label, "confidence": round(confidence, 6)}
+                    for label, confidence in predictions
+                ],
+                "error": error,
+            }
+            out.write(json.dumps(record) + "\n")
+        return write_jsonl
+
+    csv_writer = csv.writer(out)
+    header = ["path"]
+    for rank in range(1, top_k + 1):
+        header += [f"label_{rank}", f"confidence_{rank}"]
+    csv_writer.writerow(header + ["error"])
+
+    def write_csv(path, predictions, error):
+        row = [path]
+        for label, confidence in predictions:
+            row += [label, f"{confidence:.6f}"]
+        row += [""] * (len(header) - len(row))
+        csv_writer.writerow(row + [error or ""])
+    return write_csv
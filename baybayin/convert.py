@@ -0,0 +1,108 @@
+"""
+One-time conversion of the Keras .h5 classifier to TFLite or ONNX.
+
+Conversion needs TensorFlow (and tf2onnx for ONNX); the converted models can
+then be served by the lighter engines in baybayin.engines.
+"""
+import logging
+
+import numpy as np
+
+from baybayin.model import load_model
+from baybayin.preprocessing import preprocess_batch
+from config.settings import IMAGE_SIZE, MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+TFLITE_QUANTIZATIONS = (None, 'dynamic', 'float16', 'int8')
+
+
+def convert_to_tflite(output_path, model_path=MODEL_PATH, quantization=None, calibration_images=None):
+    """
+    Convert the Keras model to a TFLite flatbuffer.
+
+    Args:
+        output_path: Where to write the .tflite file
+        model_path: Path to the Keras .h5 model
+        quantization: None for float32, 'dynamic' for dynamic-range int8
+            weights, 'float16' for float16 weights, or 'int8' for full
+            integer quantization (requires calibration_images)
+        calibration_images: Images used to calibrate int8 activation ranges;
+            they are preprocessed exactly like inference inputs, and images
+            that fail preprocessing are left out
+
+    Returns:
+        int: Size of the written model in bytes
+
+    Raises:
+        ValueError: If the quantization mode is unknown or int8 is requested
+            without calibration images, or none of them can be preprocessed
+    """
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}; expected one of {TFLITE_QUANTIZATIONS}")
+    if quantization == 'int8' and not calibration_images:
+        raise ValueError("int8 quantization needs calibration images")
+
+    import tensorflow as tf
+
+    model = load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        calibration = _calibration_batch(calibration_images)
+
+        def representative_dataset():
+            for sample in calibration:
+                yield [sample[np.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+        # Keep float32 input/output so callers do not change
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS
+        ]
+
+    flatbuffer = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(flatbuffer)
+    return len(flatbuffer)
+
+
+def _calibration_batch(images):
+    """Preprocess calibration images, leaving out the ones that fail"""
+    calibration, failures = preprocess_batch(images)
+    if failures:
+        # Failed rows are blank and would skew the activation ranges
+        for i, message in sorted(failures.items()):
+            logger.warning("Skipping calibration image %d: %s", i, message)
+        calibration = np.delete(calibration, sorted(failures), axis=0)
+    if not len(calibration):
+        raise ValueError(f"None of the {len(failures)} calibration images could be preprocessed")
+    return calibration
+
+
+def convert_to_onnx(output_path, model_path=MODEL_PATH, opset=13):
+    """
+    Convert the Keras model to ONNX with a dynamic batch dimension.
+
+    Args:
+        output_path: Where to write the .onnx file
+        model_path: Path to the Keras .h5 model
+        opset: ONNX opset version
+
+    Returns:
+        int: Size of the written model in bytes
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    model = load_model(model_path)
+    width, height = IMAGE_SIZE
+    signature = [tf.TensorSpec((None, height, width, 1), tf.float32, name='input')]
+    onnx_model, _ = tf2onnx.convert.from_keras(
+        model, input_signature=signature, opset=opset, output_path=output_path
+    )
+    return onnx_model.ByteSize()
@@ -0,0 +1,142 @@
+"""
+Distillation of a small, fast first-stage model for the cascade.
+
+The full classifier labels a set of images, preprocessed exactly like
+inference inputs; the student, a reduced-width CNN with the same input and
+59 outputs, is trained to match the teacher's probabilities. The training
+set is widened with the TTA variants (small rotations, rescalings and stroke
+changes), so a few hundred images are enough. Needs TensorFlow.
+"""
+import numpy as np
+
+from baybayin.model import get_model
+from baybayin.preprocessing import preprocess_batch
+from baybayin.tta import augment, variant_transforms
+from config.settings import BAYBAYIN_CATEGORIES, CASCADE_CONFIG, IMAGE_SIZE, INFERENCE_CONFIG, TTA_CONFIG
+
+
+def build_student(width=None, input_size=IMAGE_SIZE, num_classes=len(BAYBAYIN_CATEGORIES)):
+    """
+    Build an untrained reduced-width CNN for the first stage.
+
+    Args:
+        width: Filters in the first convolution; later layers use 2x and 4x
+            (default CASCADE_CONFIG['student_width'])
+        input_size: Input image size (width, height)
+        num_classes: Number of output classes
+
+    Returns:
+        tensorflow.keras.Model: Compiled model with softmax outputs
+    """
+    import tensorflow as tf
+
+    width = width or CASCADE_CONFIG['student_width']
+    target_w, target_h = input_size
+    layers = tf.keras.layers
+    model = tf.keras.Sequential([
+        tf.keras.Input((target_h, target_w, 1)),
+        layers.Conv2D(width, 3, activation='relu', padding='same'),
+        layers.MaxPooling2D(),
+        layers.Conv2D(width * 2, 3, activation='relu', padding='same'),
+        layers.MaxPooling2D(),
+        layers.Conv2D(width * 4, 3, activation='relu', padding='same'),
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.2),
+        layers.Dense(num_classes, activation='softmax'),
+    ], name='baybayin_student')
+    model.compile(optimizer='adam', loss=tf.keras.losses.KLDivergence(), metrics=['accuracy'])
+    return model
+
+
+def teacher_targets(teacher, batch, temperature=1.0, batch_size=256):
+    """
+    Soft labels from the full model.
+
+    Args:
+        teacher: Engine with a predict(batch) method
+        batch: Preprocessed images of shape (N, height, width, 1)
+        temperature: Softening of the teacher's probabilities (1: unchanged).
+            A student trained on softened targets is less confident, so
+            the cascade threshold must be lowered to match
+        batch_size: Images per teacher call
+
+    Returns:
+        numpy.ndarray: float32 target distributions of shape (N, num_classes)
+    """
+    probabilities = np.concatenate([
+        np.asarray(teacher.predict(batch[start:start + batch_size]), dtype=np.float32)
+        for start in range(0, len(batch), batch_size)
+    ])
+    # p ** (1 / T), renormalized, equals softmax(logits / T)
+    softened = np.power(np.clip(probabilities, 1e-12, 1.0), 1.0 / temperature)
+    return softened / softened.sum(axis=1, keepdims=True)
+
+
+def distill(images, output_path=None, teacher=None, width=None, epochs=20, batch_size=64,
+            temperature=1.0, validation_split=0.1, augment_data=True, seed=0):
+    """
+    Train a first-stage model from the full model's predictions.
+
+    Args:
+        images: Images to learn from (PIL Images or numpy arrays); they are
+            preprocessed like inference inputs and unusable ones are skipped
+        output_path: Where to save the .h5 model (default
+            CASCADE_CONFIG['fast_model_path'])
+        teacher: Engine labelling the images (default: the full model from
+            INFERENCE_CONFIG)
+        width: Student width (see build_student)
+        epochs: Training epochs
+        batch_size: Training batch size
+        temperature: Softening of the teacher's probabilities
+        validation_split: Fraction of the images held out to measure agreement
+        augment_data: Add the TTA variants of every training image
+        seed: Seed for the split and the student's initial weights
+
+    Returns:
+        dict: samples (after augmentation), validation images, top-1
+            agreement with the teacher on the held-out images, and the
+            written path
+
+    Raises:
+        ValueError: If none of the images could be preprocessed
+        ModelLoadError: If the teacher model cannot be loaded
+    """
+    import tensorflow as tf
+
+    output_path = output_path or CASCADE_CONFIG['fast_model_path']
+    if teacher is None:
+        teacher = get_model(INFERENCE_CONFIG['engine'])
+
+    batch, failures = preprocess_batch(images)
+    usable = np.array([i not in failures for i in range(len(batch))], dtype=bool)
+    batch = batch[usable]
+    if not len(batch):
+        raise ValueError("None of the images could be preprocessed")
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(batch))
+    held_out = int(round(len(batch) * validation_split)) if len(batch) > 1 else 0
+    validation, training = batch[order[:held_out]], batch[order[held_out:]]
+
+    if augment_data:
+        transforms = variant_transforms(dict(TTA_CONFIG, max_variants=None))
+        training = np.concatenate([training, augment(training, transforms)])
+    targets = teacher_targets(teacher, training, temperature)
+
+    tf.keras.utils.set_random_seed(seed)
+    student = build_student(width)
+    student.fit(training, targets, epochs=epochs, batch_size=batch_size, shuffle=True, verbose=2)
+    student.save(output_path)
+
+    agreement = None
+    if held_out:
+        expected = np.asarray(teacher.predict(validation)).argmax(axis=1)
+        predicted = np.asarray(student.predict_on_batch(validation)).argmax(axis=1)
+        agreement = float((expected == predicted).mean())
+
+    return {
+        'samples': len(training),
+        'validation': held_out,
+        'agreement': agreement,
+        'path': output_path,
+    }
@@ -0,0 +1,211 @@
+"""
+Inference engines that run the Baybayin classifier through different runtimes.
+
+Every engine exposes ``predict(batch)``, taking a float32 array of shape
+(N, 64, 64, 1) and returning an (N, 59) float32 array of probabilities, so it
+can be used anywhere a Keras model was used before. Runtimes are imported
+only when an engine is created.
+"""
+import os
+import threading
+
+import numpy as np
+
+from baybayin.exceptions import ModelLoadError
+from config.settings import INFERENCE_CONFIG
+
+
+class InferenceEngine:
+    """Base class for inference engines."""
+
+    name = None
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.model_version = model_version(self.name, model_path)
+
+    def predict(self, batch, **kwargs):
+        """
+        Run the classifier on a batch of preprocessed images.
+
+        Args:
+            batch: float32 array of shape (N, height, width, 1)
+            **kwargs: Ignored; accepted for Keras predict compatibility
+
+        Returns:
+            numpy.ndarray: float32 probabilities of shape (N, num_classes)
+        """
+        raise NotImplementedError
+
+    def predict_on_batch(self, batch):
+        """Alias of predict, matching the Keras model API."""
+        return self.predict(batch)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model_path!r})"
+
+
+class KerasEngine(InferenceEngine):
+    """Runs the original Keras .h5 model with TensorFlow."""
+
+    name = 'keras'
+
+    def __init__(self, model_path):
+        from baybayin.model import load_model
+
+        super().__init__(model_path)
+        self.model = load_model(model_path)
+
+    def predict(self, batch, **kwargs):
+        return np.asarray(self.model.predict_on_batch(batch), dtype=np.float32)
+
+
+class TFLiteEngine(InferenceEngine):
+    """
+    Runs a converted .tflite model.
+
+    Uses the standalone ai_edge_litert or tflite_runtime package when
+    installed, which avoids importing TensorFlow entirely, and falls back to
+    tf.lite otherwise.
+    Float16 and int8 quantized models are supported; quantized inputs and
+    outputs are converted transparently.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        super().__init__(model_path)
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+
+        try:
+            self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+            self._interpreter.allocate_tensors()
+        except Exception as e:
+            raise ModelLoadError(model_path, str(e)) from e
+
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, batch, **kwargs):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch_size = batch.shape[0]
+
+            self._interpreter.set_tensor(self._input['index'], _quantize(batch, self._input))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output['index'])
+            return _dequantize(output, self._output)
+
+
+class ONNXEngine(InferenceEngine):
+    """Runs a converted .onnx model with ONNX Runtime on the CPU."""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=None):
+        super().__init__(model_path)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        try:
+            self._session = ort.InferenceSession(
+                model_path, sess_options=options, providers=['CPUExecutionProvider']
+            )
+        except Exception as e:
+            raise ModelLoadError(model_path, str(e)) from e
+        self._input_name = self._session.get_inputs()[0].name
+
+    def predict(self, batch, **kwargs):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self._session.run(None, {self._input_name: batch})[0]
+
+
+ENGINES = {
+    KerasEngine.name: KerasEngine,
+    TFLiteEngine.name: TFLiteEngine,
+    ONNXEngine.name: ONNXEngine,
+}
+
+
+def create_engine(engine=None, model_path=None):
+    """
+    Create an inference engine.
+
+    Args:
+        engine: Engine name ('keras', 'tflite' or 'onnx'; default from INFERENCE_CONFIG)
+        model_path: Model file for the engine (default from INFERENCE_CONFIG)
+
+    Returns:
+        InferenceEngine: Ready-to-use engine
+
+    Raises:
+        ValueError: If the engine name is unknown
+        ModelLoadError: If the model cannot be loaded
+    """
+    engine = engine or INFERENCE_CONFIG['engine']
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine {engine!r}; expected one of {sorted(ENGINES)}")
+
+    model_path = model_path or INFERENCE_CONFIG['model_paths'][engine]
+    if engine == KerasEngine.name:
+        return KerasEngine(model_path)
+
+    try:
+        return ENGINES[engine](model_path, num_threads=INFERENCE_CONFIG['num_threads'])
+    except ImportError as e:
+        raise ModelLoadError(model_path, f"{engine} runtime is not installed ({e})") from e
+
+
+def model_version(engine, model_path):
+    """
+    Identify a model file well enough to invalidate caches when it changes.
+
+    Args:
+        engine: Engine name
+        model_path: Model file path
+
+    Returns:
+        str: Engine, file name, size and modification time
+    """
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return f"{engine}:{model_path}"
+    return f"{engine}:{os.path.basename(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _quantize(batch, details):
+    """Convert a float batch to the input tensor's dtype using its quantization"""
+    dtype = details['dtype']
+    if dtype == np.float32:
+        return batch
+    scale, zero_point = details['quantization']
+    if dtype == np.float16 or not scale:
+        return batch.astype(dtype)
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def _dequantize(output, details):
+    """Convert an output tensor back to float32 probabilities"""
+    scale, zero_point = details['quantization']
+    if np.issubdtype(output.dtype, np.integer) and scale:
+        return (output.astype(np.float32) - zero_point) * scale
+    return output.astype(np.float32, copy=True)
@@ -0,0 +1,23 @@
+class BaybayinError(Exception):
+    """Base class for errors raised by the Baybayin core package."""
+
+
+class ModelLoadError(BaybayinError):
+    """Raised when the classifier model cannot be loaded."""
+
+    def __init__(self, model_path, reason):
+        self.model_path = model_path
+        self.reason = reason
+        super().__init__(f"Could not load model from {model_path}: {reason}")
+
+
+class PreprocessingError(BaybayinError):
+    """Raised when an input image cannot be preprocessed."""
+
+
+class InputQualityError(PreprocessingError):
+    """Raised when an input image fails the pre-flight quality checks."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(" ".join(report.reasons))
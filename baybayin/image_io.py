@@ -0,0 +1,165 @@
+"""
+Memory-bounded decoding of image files.
+
+Every entry point (the upload pages, the CLI, the HTTP API and the worker
+pools) decodes through open_image, so all inputs get the same treatment:
+
+- Images over a pixel budget are downsampled while loading. JPEGs,
+  including CMYK print JPEGs, are decoded at the largest reduced scale
+  (1/2, 1/4 or 1/8) of the DCT decoder (draft mode) that fits the budget,
+  so the full resolution is never materialized; other formats are reduced
+  right after decoding.
+- EXIF orientation is applied to the reduced image.
+- Palette images are expanded to their colours, and transparent areas are
+  composited onto white, so drawings on transparent backgrounds read as ink
+  on paper. 16-bit and other modes are converted to 8-bit L or RGB.
+
+The budget (IMAGE_IO_CONFIG['max_pixels']) keeps enough resolution for
+downscale_oversized to crop the character before its own downsampling,
+even when a JPEG's reduced decode lands at a quarter of it.
+"""
+import io
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from config.settings import IMAGE_IO_CONFIG
+
+# Modes decoded as-is; everything else is converted first
+_PLAIN_MODES = ('L', 'RGB')
+_ALPHA_MODES = ('RGBA', 'LA', 'PA', 'RGBa', 'La')
+
+
+class DecodedImage(NamedTuple):
+    """An uploaded image kept between reruns: what to show and what to process."""
+
+    working: np.ndarray
+    preview: np.ndarray
+    original_size: tuple
+
+
+def open_image(source, max_pixels=None):
+    """
+    Decode an image within a pixel budget.
+
+    Args:
+        source: File path, encoded bytes, binary file object, PIL Image or
+            numpy array (images and arrays are returned as given)
+        max_pixels: Most pixels to decode to (default
+            IMAGE_IO_CONFIG['max_pixels']; 0 for no limit)
+
+    Returns:
+        PIL.Image.Image or numpy.ndarray: Fully loaded image in L or RGB mode,
+            upright, no larger than the budget
+
+    Raises:
+        PIL.UnidentifiedImageError: If the data is not an image
+        OSError: If the file cannot be read or is truncated
+    """
+    if isinstance(source, (Image.Image, np.ndarray)):
+        return source
+    return _decode(source, max_pixels)[0]
+
+
+def decode_upload(source, max_pixels=None, preview_size=None):
+    """
+    Decode an upload once into the arrays a page keeps between reruns.
+
+    Args:
+        source: Encoded bytes, binary file object (e.g. a Streamlit
+            UploadedFile) or file path
+        max_pixels: Pixel budget for the working image (see open_image)
+        preview_size: Longest side of the preview (default
+            IMAGE_IO_CONFIG['preview_size'])
+
+    Returns:
+        DecodedImage: working grayscale uint8 array for preprocessing, RGB
+            (or L) uint8 preview for display, and the image's (width, height)
+            in the file
+
+    Raises:
+        PIL.UnidentifiedImageError: If the data is not an image
+        OSError: If the file cannot be read or is truncated
+    """
+    preview_size = preview_size or IMAGE_IO_CONFIG['preview_size']
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    image, original_size = _decode(source, max_pixels)
+
+    preview = image.copy()
+    preview.thumbnail((preview_size, preview_size), Image.LANCZOS)
+    # The conversion to_grayscale applies, so preprocessing sees the same pixels
+    working = np.asarray(image)
+    if working.ndim == 3:
+        working = cv2.cvtColor(working, cv2.COLOR_RGB2GRAY)
+    return DecodedImage(working, np.asarray(preview), original_size)
+
+
+def _decode(source, max_pixels):
+    """Decode within the budget; returns (image, size in the file)"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    max_pixels = IMAGE_IO_CONFIG['max_pixels'] if max_pixels is None else max_pixels
+
+    image = Image.open(source)
+    original_size = image.size
+    orientation = image.getexif().get(0x0112, 1)
+
+    width, height = image.size
+    size = None
+    if max_pixels and width * height > max_pixels:
+        scale = (max_pixels / (width * height)) ** 0.5
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        # JPEGs decode at the first DCT scale (1/2, 1/4, 1/8) within the
+        # budget, so images just over it are not decoded at full size. This
+        # must happen on the opened file, before a mode conversion (e.g. of
+        # CMYK print JPEGs) decodes it at full size
+        if image.format == 'JPEG':
+            factor = next((f for f in (2, 4, 8) if -(-width // f) * -(-height // f) <= max_pixels), 8)
+            image.draft(image.mode, (width // factor, height // factor))
+            if image.size[0] * image.size[1] <= max_pixels:
+                size = None
+
+    image = _normalize_mode(image)
+    if size is not None:
+        # Area averaging, as in preprocessing, does the rest
+        image = image.resize(size, Image.BOX)
+    else:
+        image.load()
+
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode in _ALPHA_MODES:
+        image = _on_white(image)
+    return image, original_size
+
+
+def _normalize_mode(image):
+    """Convert modes thumbnail() cannot resample well, before any resizing"""
+    mode = image.mode
+    if mode in _PLAIN_MODES or mode in ('RGBA', 'LA'):
+        return image
+    if mode == 'P':
+        return image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    if mode == 'PA':
+        return image.convert('RGBA')
+    if mode == '1':
+        return image.convert('L')
+    if mode.startswith('I'):
+        # 16-bit grayscale: keep the top 8 bits instead of clipping to white
+        values = np.asarray(image)
+        if values.max() > 255:
+            values = values >> 8
+        return Image.fromarray(np.clip(values, 0, 255).astype(np.uint8), 'L')
+    return image.convert('RGB')
+
+
+def _on_white(image):
+    """Composite an image with alpha onto a white background"""
+    alpha = image.getchannel('A')
+    base = 'L' if image.mode in ('LA', 'La') else 'RGB'
+    background = Image.new(base, image.size, 255 if base == 'L' else (255, 255, 255))
+    background.paste(image.convert(base), mask=alpha)
+    return background
@@ -0,0 +1,246 @@
+"""
+Optional per-stage timing for preprocessing and inference.
+
+Tracing is off unless a sink is installed, and the hot paths check
+``enabled()`` once per image, so the disabled cost is a single global
+lookup. When enabled, every ``span`` reports its stage name, duration and
+input size to the sink, and to the calling thread's active ``trace`` (used
+by the debug panel to show the timings of one request).
+
+Sinks are plain objects with a ``record(stage, seconds, size)`` method:
+LoggingSink, HistogramSink (in-memory percentiles) and PrometheusSink
+(text exposition format) are provided.
+"""
+import bisect
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from config.settings import INSTRUMENTATION_CONFIG
+
+_sink = None
+_local = threading.local()
+
+
+def enabled():
+    """Whether a sink is installed and spans are being recorded."""
+    return _sink is not None
+
+
+def set_sink(sink):
+    """
+    Install the sink that receives all spans, or None to disable tracing.
+
+    Args:
+        sink: Object with a record(stage, seconds, size) method, or None
+    """
+    global _sink
+    _sink = sink
+
+
+def get_sink():
+    """The installed sink, or None when tracing is disabled."""
+    return _sink
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('stage', 'size', 'started')
+
+    def __init__(self, stage, size):
+        self.stage = stage
+        self.size = size
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.started, self.size)
+        return False
+
+
+def span(stage, size=None):
+    """
+    Time a block of code as one stage.
+
+    Args:
+        stage: Stage name, e.g. 'bilateral_filter' or 'predict'
+        size: Input size for the stage, e.g. (width, height) or a batch shape
+
+    Returns:
+        Context manager; a shared no-op object when tracing is disabled
+    """
+    if _sink is None:
+        return _NULL_SPAN
+    return _Span(stage, size)
+
+
+def record(stage, seconds, size=None):
+    """
+    Report a stage duration measured elsewhere.
+
+    Args:
+        stage: Stage name
+        seconds: Duration in seconds
+        size: Input size for the stage
+    """
+    sink = _sink
+    if sink is None:
+        return
+    sink.record(stage, seconds, size)
+    records = getattr(_local, 'records', None)
+    if records is not None:
+        records.append((stage, seconds, size))
+
+
+@contextlib.contextmanager
+def trace():
+    """
+    Collect the spans recorded by the current thread within a block.
+
+    Yields:
+        list: (stage, seconds, size) tuples, filled in as spans complete;
+            stays empty when tracing is disabled
+    """
+    previous = getattr(_local, 'records', None)
+    records = []
+    _local.records = records
+    try:
+        yield records
+    finally:
+        _local.records = previous
+
+
+def size_of(image):
+    """
+    Describe an image's size for a span without touching its pixels.
+
+    Args:
+        image: PIL Image or numpy array
+
+    Returns:
+        tuple: (width, height) for images, or the shape of other arrays
+    """
+    if hasattr(image, 'shape'):
+        shape = image.shape
+        return (shape[1], shape[0]) if len(shape) in (2, 3) else tuple(shape)
+    return getattr(image, 'size', None)
+
+
+class LoggingSink:
+    """Logs every span through the standard logging module."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('baybayin.timing')
+        self.level = level
+
+    def record(self, stage, seconds, size):
+        self.logger.log(self.level, "stage=%s ms=%.3f size=%s", stage, seconds * 1000.0, size)
+
+
+class HistogramSink:
+    """Keeps the most recent durations per stage in memory for percentiles."""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._durations = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, size):
+        with self._lock:
+            self._durations[stage].append(seconds)
+            self._counts[stage] += 1
+
+    def snapshot(self):
+        """
+        Per-stage statistics over the recent window.
+
+        Returns:
+            dict: Stage -> count, p50_ms, p95_ms and max_ms
+        """
+        with self._lock:
+            items = [(stage, sorted(values), self._counts[stage]) for stage, values in self._durations.items()]
+        summary = {}
+        for stage, values, count in items:
+            summary[stage] = {
+                'count': count,
+                'p50_ms': _quantile(values, 0.50) * 1000.0,
+                'p95_ms': _quantile(values, 0.95) * 1000.0,
+                'max_ms': values[-1] * 1000.0,
+            }
+        return summary
+
+
+class PrometheusSink:
+    """Cumulative duration histograms rendered in Prometheus text format."""
+
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, metric='baybayin_stage_duration_seconds', buckets=BUCKETS):
+        self.metric = metric
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, size):
+        with self._lock:
+            counts, totals = self._stages.setdefault(stage, ([0] * (len(self.buckets) + 1), [0, 0.0]))
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            totals[0] += 1
+            totals[1] += seconds
+
+    def render(self):
+        """
+        Render all histograms in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text, ready to serve from a /metrics endpoint
+        """
+        lines = [
+            f"# HELP {self.metric} Duration of Baybayin classification stages.",
+            f"# TYPE {self.metric} histogram",
+        ]
+        with self._lock:
+            stages = {stage: (list(counts), list(totals)) for stage, (counts, totals) in self._stages.items()}
+        for stage, (counts, (count, total)) in sorted(stages.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.metric}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{self.metric}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{self.metric}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+SINKS = {
+    'logging': LoggingSink,
+    'histogram': HistogramSink,
+    'prometheus': PrometheusSink,
+}
+
+
+def _quantile(sorted_values, q):
+    """Nearest-rank quantile of an already sorted list"""
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+if INSTRUMENTATION_CONFIG['enabled'] or INSTRUMENTATION_CONFIG['debug_panel']:
+    set_sink(SINKS[INSTRUMENTATION_CONFIG['sink']]())
@@ -0,0 +1,245 @@
+"""
+Debounced background classification for live, as-you-draw predictions.
+
+Each canvas gets a LiveClassifier. Submitting a new drawing only records it
+and returns; once the drawing has been still for the debounce interval (or
+has kept changing for the maximum delay), a shared dispatcher hands it to a
+small shared thread pool that preprocesses it and submits it to the model.
+Through the batch scheduler, concurrent sessions' predictions are coalesced
+into batched model calls. A newer submission makes older ones stale: they
+are skipped before preprocessing and before prediction, so a fast drawer
+never queues up outdated work. A prediction already under way still
+replaces an older result when it lands. The UI polls latest() for the
+current result.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.cache import make_cache_key
+from config.settings import LIVE_CONFIG
+
+
+class LiveResult(NamedTuple):
+    """The outcome of one live submission."""
+
+    generation: int
+    processed: Optional[np.ndarray]
+    probabilities: Optional[np.ndarray]
+    error: Optional[str]
+
+
+class LiveClassifier:
+    """
+    Live predictions for one canvas (e.g. one Streamlit session).
+
+    Submissions are handled one at a time per classifier, so the preprocess
+    function may keep per-canvas state such as a StrokeRasterizer.
+    """
+
+    def __init__(self, preprocess, model, cache=None, debounce_ms=None, max_delay_ms=None):
+        """
+        Args:
+            preprocess: Function turning a submitted payload into a model-ready
+                batch of shape (1, height, width, 1); runs on a pool thread
+            model: Object with a predict(batch) method; a submit(batch) method
+                returning a future (like BatchScheduler) is used when present
+            cache: Optional PredictionCache, keyed by the processed image
+            debounce_ms: Quiet time before a drawing is classified
+                (default from LIVE_CONFIG)
+            max_delay_ms: Longest a continuously changing drawing waits
+                (default from LIVE_CONFIG)
+        """
+        self.preprocess = preprocess
+        self.model = model
+        self.cache = cache
+        debounce_ms = LIVE_CONFIG['debounce_ms'] if debounce_ms is None else debounce_ms
+        max_delay_ms = LIVE_CONFIG['max_delay_ms'] if max_delay_ms is None else max_delay_ms
+        self.debounce = debounce_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._payload = None
+        self._first_pending = None
+        self._due = None
+        self._running = False
+        self._result = None
+        # Results for generations up to this one are never shown
+        self._floor = 0
+
+    def submit(self, payload):
+        """
+        Record the latest drawing; it is classified once the debounce passes.
+
+        Args:
+            payload: Anything the preprocess function accepts
+
+        Returns:
+            int: Generation number of this submission
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._generation += 1
+            if self._payload is None:
+                self._first_pending = now
+            self._payload = payload
+            self._due = min(self._first_pending + self.max_delay, now + self.debounce)
+            generation, due = self._generation, self._due
+        _get_dispatcher().schedule(self, due)
+        return generation
+
+    def clear(self):
+        """Drop the pending drawing and the last result (e.g. the canvas was cleared)."""
+        with self._lock:
+            self._generation += 1
+            self._payload = None
+            self._result = None
+            self._floor = self._generation
+
+    def latest(self):
+        """
+        The result for the most recent classified drawing.
+
+        Returns:
+            LiveResult or None: None until a first result is ready
+        """
+        return self._result
+
+    def pending(self):
+        """Whether a drawing is waiting for or being classified."""
+        return self._payload is not None or self._running
+
+    def _dispatch(self, due):
+        """Called by the dispatcher when a deadline passes; starts the job if still current"""
+        with self._lock:
+            if self._payload is None or due != self._due or self._running:
+                return
+            payload, generation = self._payload, self._generation
+            self._payload = None
+            self._running = True
+        _get_dispatcher().executor.submit(self._process, payload, generation)
+
+    def _process(self, payload, generation):
+        """Preprocess and submit one drawing; runs on a pool thread"""
+        try:
+            if self._stale(generation):
+                return self._finish()
+            processed = self.preprocess(payload)
+            if self._stale(generation):
+                return self._finish()
+
+            key = None
+            if self.cache is not None:
+                key = make_cache_key(processed, getattr(self.model, 'model_version', None), namespace='live')
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self._store(LiveResult(generation, cached.processed, cached.probabilities, None))
+                    return self._finish()
+
+            future = _submit_prediction(self.model, processed)
+        except Exception as e:
+            self._store(LiveResult(generation, None, None, str(e)))
+            return self._finish()
+
+        # Completion runs on whichever thread resolves the future, leaving
+        # this pool thread free for other sessions in the meantime
+        future.add_done_callback(lambda f: self._complete(f, generation, processed, key))
+
+    def _complete(self, future, generation, processed, key):
+        """Store a finished prediction"""
+        try:
+            probabilities = future.result()
+        except Exception as e:
+            self._store(LiveResult(generation, None, None, str(e)))
+        else:
+            if key is not None:
+                entry = self.cache.put(key, processed, probabilities)
+                processed, probabilities = entry.processed, entry.probabilities
+            self._store(LiveResult(generation, processed, probabilities, None))
+        self._finish()
+
+    def _stale(self, generation):
+        return generation != self._generation
+
+    def _store(self, result):
+        """Keep a result if it is for a newer drawing than the one shown"""
+        with self._lock:
+            shown = self._result.generation if self._result is not None else self._floor
+            if result.generation > shown:
+                self._result = result
+
+    def _finish(self):
+        """Mark the job done and start the next one if a drawing is waiting"""
+        with self._lock:
+            self._running = False
+            due = self._due if self._payload is not None else None
+        if due is not None:
+            _get_dispatcher().schedule(self, due)
+
+
+def _submit_prediction(model, batch):
+    """Start a prediction, returning a future"""
+    if hasattr(model, 'submit'):
+        return model.submit(batch)
+
+    future = Future()
+    try:
+        with instrumentation.span('predict', batch.shape):
+            future.set_result(model.predict(batch))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class _Dispatcher:
+    """Fires LiveClassifier deadlines from one timer thread for all sessions"""
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='baybayin-live')
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='baybayin-live-timer', daemon=True)
+        self._thread.start()
+
+    def schedule(self, classifier, due):
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._counter), classifier))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                due, _, classifier = self._heap[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+            # Deadlines that were moved or already handled are ignored here
+            classifier._dispatch(due)
+
+
+# Process-wide dispatcher, created on first use
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def _get_dispatcher():
+    global _dispatcher
+    if _dispatcher is not None:
+        return _dispatcher
+
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = _Dispatcher(LIVE_CONFIG['workers'])
+    return _dispatcher
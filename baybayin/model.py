@@ -0,0 +1,171 @@
+import threading
+
+from baybayin.engines import create_engine
+from baybayin.exceptions import ModelLoadError
+from config.settings import CASCADE_CONFIG, INFERENCE_CONFIG, MODEL_PATH, MODEL_SERVER_CONFIG
+
+# Process-wide engine cache, keyed by (engine name, model path)
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_model(model_path=MODEL_PATH):
+    """
+    Load the trained Baybayin classifier model without Streamlit.
+    
+    TensorFlow is imported on first use so that importing this module
+    stays cheap. Every call reads the model from disk; use get_model for
+    the shared cached instance.
+    
+    Args:
+        model_path: Path to the saved Keras model
+    
+    Returns:
+        tensorflow.keras.Model: Loaded Baybayin classifier model
+    
+    Raises:
+        ModelLoadError: If the model file is missing or cannot be loaded
+    """
+    try:
+        import tensorflow as tf
+        from tensorflow.keras.optimizers.schedules import CosineDecay
+        
+        # Register the CosineDecay schedule as a custom object
+        return tf.keras.models.load_model(
+            model_path,
+            custom_objects={'CosineDecay': CosineDecay}
+        )
+    except Exception as e:
+        raise ModelLoadError(model_path, str(e)) from e
+
+
+def get_model(engine=None, model_path=None):
+    """
+    Get the process-wide inference engine, loading it on first use.
+    
+    Loading is thread-safe: concurrent first callers wait for a single
+    load instead of each reading the model. Failed loads are not cached,
+    so a later call retries. When no engine or model path is given, the
+    default model is the shared model server when MODEL_SERVER_CONFIG is
+    enabled (see get_remote_model), else the cascade when CASCADE_CONFIG
+    is enabled (see get_cascade).
+    
+    Args:
+        engine: Engine name ('keras', 'tflite' or 'onnx'; default from INFERENCE_CONFIG)
+        model_path: Model file for the engine (default from INFERENCE_CONFIG)
+    
+    Returns:
+        baybayin.engines.InferenceEngine: The shared engine; its predict
+            method takes the same batches as the Keras model
+    
+    Raises:
+        ModelLoadError: If the model file is missing or cannot be loaded
+    """
+    if engine is None and model_path is None and MODEL_SERVER_CONFIG['enabled']:
+        return get_remote_model()
+    return get_local_model(engine, model_path)
+
+
+def get_local_model(engine=None, model_path=None):
+    """
+    Get the process-wide engine run in this process.
+    
+    Same as get_model, but never goes through the model server; this is
+    what the server itself runs and what its clients fall back to.
+    
+    Args:
+        engine: Engine name (default from INFERENCE_CONFIG)
+        model_path: Model file for the engine (default from INFERENCE_CONFIG)
+    
+    Returns:
+        baybayin.engines.InferenceEngine or baybayin.cascade.CascadeEngine:
+            The shared engine
+    
+    Raises:
+        ModelLoadError: If the model file is missing or cannot be loaded
+    """
+    if engine is None and model_path is None and CASCADE_CONFIG['enabled']:
+        return get_cascade()
+    
+    engine = engine or INFERENCE_CONFIG['engine']
+    key = (engine, model_path or INFERENCE_CONFIG['model_paths'].get(engine))
+    model = _models.get(key)
+    if model is not None:
+        return model
+    
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = create_engine(engine, key[1])
+            _models[key] = model
+    return model
+
+
+def get_cascade(threshold=None):
+    """
+    Get the process-wide cascade of the fast model and the full model.
+    
+    Args:
+        threshold: Top-1 confidence the fast model needs to answer
+            (default from CASCADE_CONFIG)
+    
+    Returns:
+        baybayin.cascade.CascadeEngine: Cascade over the engines from
+            CASCADE_CONFIG (fast) and INFERENCE_CONFIG (full)
+    
+    Raises:
+        ModelLoadError: If either model cannot be loaded
+    """
+    from baybayin.cascade import CascadeEngine
+    
+    threshold = CASCADE_CONFIG['threshold'] if threshold is None else threshold
+    key = ('cascade', threshold)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    
+    # Loaded outside the lock: get_model takes it for each stage
+    fast = get_model(CASCADE_CONFIG['fast_engine'], CASCADE_CONFIG['fast_model_path'])
+    full = get_model(INFERENCE_CONFIG['engine'], INFERENCE_CONFIG['model_paths'][INFERENCE_CONFIG['engine']])
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = CascadeEngine(fast, full, threshold)
+            _models[key] = model
+    return model
+
+
+def get_remote_model():
+    """
+    Get the process-wide client of the shared model server.
+    
+    Returns:
+        baybayin.model_server.RemoteModel: Client for the server at
+            MODEL_SERVER_CONFIG['socket_path'], falling back to
+            get_local_model() while the server is unavailable
+    
+    Raises:
+        ModelLoadError: If the server is unavailable and the in-process
+            model cannot be loaded
+    """
+    from baybayin.model_server import RemoteModel
+    
+    key = ('remote', MODEL_SERVER_CONFIG['socket_path'])
+    model = _models.get(key)
+    if model is not None:
+        return model
+    
+    # Created outside the lock: the fallback may need get_local_model
+    model = RemoteModel(key[1], fallback=get_local_model)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = model
+        else:
+            model.close()
+    return _models[key]
+
+
+def clear_model_cache():
+    """Drop all cached engines so the next get_model reloads them."""
+    with _models_lock:
+        _models.clear()
@@ -0,0 +1,488 @@
+"""
+Shared model server for several app processes on one host.
+
+One process owns the model and serves predictions over a Unix domain
+socket (``python -m baybayin model-server``); the Streamlit workers, the
+CLI and the HTTP API reach it through RemoteModel, which get_model returns
+when MODEL_SERVER_CONFIG is enabled. The weights and the runtime are then
+loaded and warmed up once per host instead of once per worker, and
+requests from all workers are coalesced by one BatchScheduler in the
+server, so they share model calls.
+
+Framing (all integers little-endian uint32, tensors little-endian float32):
+
+    request:   magic 'BYB1', op (1 byte), 3 bytes padding, N, H, W, C,
+               then N*H*W*C floats (op PREDICT) or nothing (op INFO)
+    response:  magic 'BYB1', status (1 byte), 3 bytes padding, rows, cols,
+               then rows*cols floats (status OK, PREDICT), or cols bytes of
+               UTF-8 text: the server info as JSON (status OK, INFO) or the
+               error message (status ERROR)
+
+A PREDICT request that is empty or whose images are not shaped like the
+model input is answered with an error, and its payload is read and
+dropped, before anything reaches the shared scheduler.
+
+Connections are kept open and reused for many requests. RemoteModel keeps a
+small pool of them per process. When the server is not running (no socket,
+or connections refused or dropped) it runs the model in-process instead and
+tries the server again after MODEL_SERVER_CONFIG['retry_interval'] seconds.
+A server that is running but slow to answer is not a reason to load a
+second copy of the model: timeouts raise ModelServerError instead.
+"""
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+import numpy as np
+
+from baybayin.exceptions import ModelLoadError
+from config.settings import IMAGE_SIZE, MODEL_SERVER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'BYB1'
+# Errors meaning no server is listening, as opposed to a slow one
+_UNREACHABLE = (ConnectionError, FileNotFoundError)
+OP_PREDICT = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_REQUEST = struct.Struct('<4sB3xIIII')
+_RESPONSE = struct.Struct('<4sB3xII')
+_FLOAT32 = np.dtype('<f4')
+
+
+class ModelServerError(RuntimeError):
+    """Raised when the model server answers a request with an error."""
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves one model to many processes over a Unix domain socket."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, model):
+        """
+        Args:
+            socket_path: Path of the socket file to create
+            model: BatchScheduler (or object with submit(batch) returning a
+                future) shared by all connections
+
+        Raises:
+            OSError: If another server is already listening on the path
+        """
+        _remove_stale_socket(socket_path)
+        self.model = model
+        target_w, target_h = IMAGE_SIZE
+        self.input_shape = tuple(getattr(model, 'input_shape', None) or (target_h, target_w, 1))
+        self.max_request_bytes = MODEL_SERVER_CONFIG['max_request_bytes']
+        super().__init__(socket_path, _Handler)
+
+    def info(self):
+        """Model version and batching metrics, sent to clients for op INFO"""
+        engine = getattr(self.model, 'engine', self.model)
+        return {
+            'model_version': getattr(self.model, 'model_version', None),
+            'pid': os.getpid(),
+            # Only a scheduler wrapping the engine has batching metrics
+            'batching': self.model.metrics() if engine is not self.model else None,
+            'cascade': engine.metrics() if getattr(engine, 'name', None) == 'cascade' else None,
+        }
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Answers requests on one connection until the client closes it"""
+
+    def handle(self):
+        sock = self.request
+        while True:
+            header = _recv_header(sock, _REQUEST.size)
+            if header is None:
+                return
+            magic, op, n, height, width, channels = _REQUEST.unpack(header)
+            if magic != MAGIC:
+                logger.warning("Closing connection with bad framing")
+                return
+
+            if op == OP_INFO:
+                _send_text(sock, STATUS_OK, json.dumps(self.server.info()))
+            elif op == OP_PREDICT:
+                size = n * height * width * channels * _FLOAT32.itemsize
+                if size > self.server.max_request_bytes:
+                    # The payload cannot be skipped cheaply; drop the connection
+                    _send_text(sock, STATUS_ERROR, f"Request of {size} bytes exceeds the server limit")
+                    return
+                if n == 0 or (height, width, channels) != self.server.input_shape:
+                    # Refused before it reaches the scheduler, where it would
+                    # fail every request batched with it
+                    _discard(sock, size)
+                    _send_text(sock, STATUS_ERROR, f"Expected a non-empty batch of images shaped "
+                                                   f"{self.server.input_shape}, got {(n, height, width, channels)}")
+                    continue
+                batch = np.empty((n, height, width, channels), dtype=_FLOAT32)
+                _recv_into(sock, batch)
+                self._predict(sock, batch)
+            else:
+                _send_text(sock, STATUS_ERROR, f"Unknown op {op}")
+                return
+
+    def _predict(self, sock, batch):
+        try:
+            output = np.ascontiguousarray(self.server.model.submit(batch).result(), dtype=_FLOAT32)
+        except Exception as e:
+            logger.exception("Prediction failed")
+            _send_text(sock, STATUS_ERROR, f"{type(e).__name__}: {e}")
+            return
+        rows, cols = output.shape
+        sock.sendall(_RESPONSE.pack(MAGIC, STATUS_OK, rows, cols))
+        sock.sendall(memoryview(output).cast('B'))
+
+
+class RemoteModel:
+    """
+    Client for a ModelServer, with the predict method of the engines.
+
+    Connections are pooled per instance and shared by all threads. When
+    the server is unreachable (not started, restarting, or on a platform
+    without Unix sockets), predictions run on the fallback model in this
+    process.
+    """
+
+    name = 'remote'
+
+    def __init__(self, socket_path=None, fallback=None, pool_size=None, timeout=None,
+                 retry_interval=None):
+        """
+        Args:
+            socket_path: Server socket (default from MODEL_SERVER_CONFIG)
+            fallback: Callable returning the in-process model; called only
+                when the server cannot be reached
+            pool_size: Idle connections kept for reuse
+            timeout: Seconds allowed per request
+            retry_interval: Seconds to use the fallback before trying the
+                server again
+
+        Raises:
+            ModelLoadError: If the server does not answer within the timeout,
+                or is unreachable and the fallback model cannot be loaded
+        """
+        self.socket_path = socket_path or MODEL_SERVER_CONFIG['socket_path']
+        self.fallback = fallback
+        self.timeout = timeout or MODEL_SERVER_CONFIG['timeout']
+        self.retry_interval = (MODEL_SERVER_CONFIG['retry_interval']
+                               if retry_interval is None else retry_interval)
+        self._idle = queue.LifoQueue(maxsize=pool_size or MODEL_SERVER_CONFIG['pool_size'])
+        self._down_until = 0.0
+        self._fallback_model = None
+        self._fallback_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._remote_calls = 0
+        self._fallback_calls = 0
+        # Set while model_version may not be the server's (after falling back
+        # or reconnecting); refreshed after the next remote prediction
+        self._version_stale = False
+
+        try:
+            info = json.loads(self._request(OP_INFO))
+        except TimeoutError as e:
+            raise ModelLoadError(self.socket_path, self._timeout_message()) from e
+        except _UNREACHABLE as e:
+            self._server_down(e)
+            self.model_version = self._local().model_version
+        else:
+            self.model_version = info['model_version']
+
+    def predict(self, batch, **kwargs):
+        """
+        Run the classifier on a batch of preprocessed images.
+
+        Args:
+            batch: float32 array of shape (N, height, width, channels)
+            **kwargs: Ignored; accepted for Keras predict compatibility
+
+        Returns:
+            numpy.ndarray: float32 probabilities of shape (N, num_classes)
+
+        Raises:
+            ModelServerError: If the server failed to run the model or did
+                not answer within the timeout
+        """
+        batch = np.ascontiguousarray(batch, dtype=_FLOAT32)
+        if batch.ndim == 3:
+            batch = batch[np.newaxis]
+        if time.monotonic() >= self._down_until:
+            try:
+                output = self._request(OP_PREDICT, batch)
+            except TimeoutError as e:
+                raise ModelServerError(self._timeout_message()) from e
+            except _UNREACHABLE as e:
+                self._server_down(e)
+            else:
+                with self._stats_lock:
+                    self._remote_calls += 1
+                if self._version_stale:
+                    self._refresh_version()
+                return output
+
+        with self._stats_lock:
+            self._fallback_calls += 1
+        return np.asarray(self._local().predict(batch), dtype=np.float32)
+
+    def predict_on_batch(self, batch):
+        """Alias of predict, matching the Keras model API."""
+        return self.predict(batch)
+
+    def server_info(self):
+        """
+        Ask the server for its model version and metrics.
+
+        Returns:
+            dict or None: model_version, pid, batching and cascade metrics,
+                or None if the server cannot be reached or is too slow
+        """
+        try:
+            return json.loads(self._request(OP_INFO))
+        except TimeoutError:
+            logger.warning(self._timeout_message())
+            return None
+        except _UNREACHABLE as e:
+            self._server_down(e)
+            return None
+
+    def metrics(self):
+        """
+        Snapshot of client metrics.
+
+        Returns:
+            dict: remote_calls, fallback_calls and whether the server is
+                currently considered reachable
+        """
+        with self._stats_lock:
+            return {
+                'remote_calls': self._remote_calls,
+                'fallback_calls': self._fallback_calls,
+                'server_available': time.monotonic() >= self._down_until,
+            }
+
+    def close(self):
+        """Close the pooled connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _request(self, op, batch=None):
+        """Send one request on a pooled connection and read the answer"""
+        while True:
+            sock, reused = self._connection()
+            try:
+                if batch is None:
+                    sock.sendall(_REQUEST.pack(MAGIC, op, 0, 0, 0, 0))
+                else:
+                    sock.sendall(_REQUEST.pack(MAGIC, op, *batch.shape))
+                    if batch.size:
+                        sock.sendall(memoryview(batch).cast('B'))
+                output = self._response(sock, op)
+            except ModelServerError:
+                # The model failed, not the connection
+                self._release(sock)
+                raise
+            except ConnectionError:
+                sock.close()
+                if reused:
+                    # Pooled connections go stale when the server restarts,
+                    # possibly with another model
+                    self._version_stale = True
+                    continue
+                raise
+            except BaseException:
+                sock.close()
+                raise
+            self._release(sock)
+            return output
+
+    def _response(self, sock, op):
+        header = _recv_header(sock, _RESPONSE.size)
+        if header is None:
+            raise ConnectionError("Model server closed the connection")
+        magic, status, rows, cols = _RESPONSE.unpack(header)
+        if magic != MAGIC:
+            raise ConnectionError("Bad response framing from the model server")
+        if status != STATUS_OK or op == OP_INFO:
+            text = bytearray(cols)
+            _recv_into(sock, text)
+            if status != STATUS_OK:
+                raise ModelServerError(text.decode('utf-8', 'replace'))
+            return text.decode('utf-8')
+
+        output = np.empty((rows, cols), dtype=_FLOAT32)
+        _recv_into(sock, output)
+        return output.astype(np.float32, copy=False)
+
+    def _connection(self):
+        """A pooled connection, or a new one; returns (socket, reused)"""
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            pass
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ConnectionError("Unix domain sockets are not available on this platform")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except BaseException:
+            sock.close()
+            raise
+        return sock, False
+
+    def _release(self, sock):
+        try:
+            self._idle.put_nowait(sock)
+        except queue.Full:
+            sock.close()
+
+    def _server_down(self, error):
+        if time.monotonic() >= self._down_until:
+            logger.warning("Model server at %s unavailable (%s); running the model in-process",
+                           self.socket_path, error)
+        self._down_until = time.monotonic() + self.retry_interval
+        self._version_stale = True
+        self.close()
+
+    def _timeout_message(self):
+        return f"Model server at {self.socket_path} did not answer within {self.timeout:g}s"
+
+    def _refresh_version(self):
+        """Take model_version from the server after falling back or reconnecting"""
+        info = self.server_info()
+        if info is not None:
+            self._version_stale = False
+            self.model_version = info['model_version']
+
+    def _local(self):
+        if self._fallback_model is not None:
+            return self._fallback_model
+        if self.fallback is None:
+            raise ConnectionError(f"Model server at {self.socket_path} is unavailable")
+        with self._fallback_lock:
+            if self._fallback_model is None:
+                self._fallback_model = self.fallback()
+        return self._fallback_model
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.socket_path!r})"
+
+
+def serve(socket_path=None, model=None):
+    """
+    Run the model server until interrupted.
+
+    Args:
+        socket_path: Socket file to listen on (default from MODEL_SERVER_CONFIG)
+        model: Engine to serve; wrapped in a BatchScheduler so requests from
+            all clients are batched together (default: the in-process model
+            from baybayin.model.get_local_model)
+
+    Raises:
+        ModelLoadError: If the default model cannot be loaded
+        OSError: If another server is already listening on the path
+    """
+    from baybayin.batching import BatchScheduler
+    from baybayin.model import get_local_model
+
+    socket_path = socket_path or MODEL_SERVER_CONFIG['socket_path']
+    engine = model or get_local_model()
+    scheduler = BatchScheduler(engine)
+    # Warm up before accepting connections, so no client waits on it
+    target_w, target_h = IMAGE_SIZE
+    scheduler.predict(np.ones((1, target_h, target_w, 1), dtype=np.float32))
+
+    if threading.current_thread() is threading.main_thread():
+        # Stop cleanly, removing the socket file, when a service manager stops us
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    with ModelServer(socket_path, scheduler) as server:
+        logger.info("Serving %s on %s", scheduler.model_version, socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.close()
+
+
+def _remove_stale_socket(path):
+    """Delete a socket file left by a server that is no longer running"""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError(f"A model server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def _recv_header(sock, size):
+    """Read a fixed-size header; None on a clean end of stream"""
+    header = bytearray(size)
+    view = memoryview(header)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            if received == 0:
+                return None
+            raise ConnectionError("Connection closed mid-message")
+        received += count
+    return header
+
+
+def _recv_into(sock, buffer):
+    """Fill a writable buffer (bytearray or contiguous array) from the socket"""
+    view = memoryview(buffer).cast('B')
+    received = 0
+    while received < len(view):
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed mid-message")
+        received += count
+
+
+def _discard(sock, size):
+    """Read and drop a payload, so the connection stays usable"""
+    buffer = bytearray(min(size, 1 << 16))
+    while size:
+        chunk = memoryview(buffer)[:min(size, len(buffer))]
+        _recv_into(sock, chunk)
+        size -= len(chunk)
+
+
+def _send_text(sock, status, text):
+    data = text.encode('utf-8')
+    sock.sendall(_RESPONSE.pack(MAGIC, status, 0, len(data)) + data)
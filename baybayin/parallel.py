@@ -0,0 +1,263 @@
+"""
+Process-pool preprocessing for large batch jobs.
+
+Images are fanned out in chunks to worker processes, each running its own
+PreprocessingPipeline with single-threaded OpenCV. Workers write the
+normalized tensors straight into a multiprocessing.shared_memory batch
+buffer owned by the parent, so only file paths (or encoded bytes) go to the
+workers and only error messages come back. Rows keep their input order;
+unreadable files are retried on I/O errors and otherwise skipped, leaving a
+blank row and an entry in the failures dict.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from baybayin.image_io import open_image
+from baybayin.preprocessing import get_pipeline
+from config.settings import IMAGE_SIZE, PARALLEL_CONFIG
+
+
+class ParallelPreprocessor:
+    """
+    Preprocesses images on a pool of worker processes into shared memory.
+
+    Use as a context manager, or call close() when done, so the workers
+    exit and the shared buffers are released.
+    """
+
+    def __init__(self, workers=None, chunk_size=None, retries=None, target_size=IMAGE_SIZE):
+        """
+        Args:
+            workers: Worker processes (default from PARALLEL_CONFIG, else one per CPU)
+            chunk_size: Images per task sent to a worker (default from PARALLEL_CONFIG)
+            retries: Extra attempts for files failing with I/O errors, and for
+                chunks lost to a crashed worker (default from PARALLEL_CONFIG)
+            target_size: Target size for the processed images (width, height)
+        """
+        self.workers = workers or PARALLEL_CONFIG['workers'] or os.cpu_count() or 1
+        self.chunk_size = chunk_size or PARALLEL_CONFIG['chunk_size']
+        self.retries = PARALLEL_CONFIG['retries'] if retries is None else retries
+        self.target_size = tuple(target_size)
+        self._context = multiprocessing.get_context(PARALLEL_CONFIG['start_method'])
+        self._executor = None
+        self._buffers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def preprocess(self, sources):
+        """
+        Preprocess all sources into one batch.
+
+        Args:
+            sources: Sequence of image file paths, encoded image bytes, or
+                images (PIL Images or numpy arrays, which are pickled to the
+                workers)
+
+        Returns:
+            tuple: (batch, failures) where batch is a numpy.ndarray of shape
+                (N, height, width, 1) and failures maps the index of each
+                source that could not be processed to its error message
+        """
+        sources = list(sources)
+        if not sources:
+            target_w, target_h = self.target_size
+            return np.ones((0, target_h, target_w, 1), dtype=np.float32), {}
+
+        buffer = self._allocate(len(sources))
+        try:
+            failures = self._collect(self._submit(buffer, sources), buffer)
+            return buffer.array.copy(), failures
+        finally:
+            self._release(buffer)
+
+    def imap_batches(self, sources, batch_size):
+        """
+        Preprocess a stream of sources in batches, in input order.
+
+        Two shared buffers alternate, so the next batch is already being
+        preprocessed while the caller works on the current one (e.g. runs
+        the model on it).
+
+        Args:
+            sources: Iterable of sources (see preprocess); consumed lazily
+            batch_size: Images per yielded batch
+
+        Yields:
+            tuple: (sources, batch, failures) for each batch of up to
+                batch_size sources, with failures keyed by index in the batch
+        """
+        iterator = iter(sources)
+        buffers = [self._allocate(batch_size), self._allocate(batch_size)]
+        try:
+            pending = self._start(buffers[0], iterator, batch_size)
+            turn = 0
+            while pending is not None:
+                chunk, submissions = pending
+                turn ^= 1
+                pending = self._start(buffers[turn], iterator, batch_size)
+                failures = self._collect(submissions, buffers[turn ^ 1])
+                yield chunk, buffers[turn ^ 1].array[:len(chunk)].copy(), failures
+        finally:
+            for buffer in buffers:
+                self._release(buffer)
+
+    def close(self):
+        """Stop the workers and release any remaining shared buffers."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        for buffer in list(self._buffers):
+            self._release(buffer)
+
+    def _start(self, buffer, iterator, batch_size):
+        """Take the next batch of sources and submit it into a buffer"""
+        chunk = []
+        for source in iterator:
+            chunk.append(source)
+            if len(chunk) >= batch_size:
+                break
+        if not chunk:
+            return None
+        return chunk, self._submit(buffer, chunk)
+
+    def _submit(self, buffer, sources):
+        """Reset the buffer rows and submit the sources in chunks"""
+        buffer.array[:len(sources)] = 1.0
+        submissions = []
+        for start in range(0, len(sources), self.chunk_size):
+            chunk = sources[start:start + self.chunk_size]
+            submissions.append((start, chunk) + self._submit_chunk(buffer, start, chunk))
+        return submissions
+
+    def _submit_chunk(self, buffer, start, chunk):
+        """Submit one chunk; returns (future, executor it was submitted to)"""
+        args = (_preprocess_chunk, buffer.shm.name, buffer.array.shape, start, chunk,
+                self.retries, self.target_size)
+        executor = self._pool()
+        try:
+            return executor.submit(*args), executor
+        except BrokenProcessPool:
+            self._replace(executor)
+            executor = self._pool()
+            return executor.submit(*args), executor
+
+    def _collect(self, submissions, buffer):
+        """Wait for the submitted chunks; chunks lost to a crashed worker are resubmitted"""
+        failures = {}
+        for start, chunk, future, executor in submissions:
+            attempts = 0
+            while True:
+                try:
+                    failures.update(future.result())
+                    break
+                except BrokenProcessPool as e:
+                    if attempts >= self.retries:
+                        buffer.array[start:start + len(chunk)] = 1.0
+                        failures.update((index, f"Worker process died: {e}")
+                                        for index in range(start, start + len(chunk)))
+                        break
+                    attempts += 1
+                    self._replace(executor)
+                    future, executor = self._submit_chunk(buffer, start, chunk)
+        return failures
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=self._context, initializer=_init_worker
+            )
+        return self._executor
+
+    def _replace(self, broken):
+        """Drop a broken pool (once) so the next submission starts a new one"""
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _allocate(self, rows):
+        """Create a shared float32 batch buffer"""
+        target_w, target_h = self.target_size
+        shape = (rows, target_h, target_w, 1)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        buffer = _SharedBatch(shm, np.ndarray(shape, dtype=np.float32, buffer=shm.buf))
+        self._buffers.append(buffer)
+        return buffer
+
+    def _release(self, buffer):
+        if buffer not in self._buffers:
+            return
+        self._buffers.remove(buffer)
+        buffer.array = None
+        buffer.shm.close()
+        buffer.shm.unlink()
+
+
+class _SharedBatch:
+    __slots__ = ('shm', 'array')
+
+    def __init__(self, shm, array):
+        self.shm = shm
+        self.array = array
+
+
+# Worker side: shared buffers this process has attached to, by name
+_attached = {}
+_MAX_ATTACHED = 4
+
+
+def _init_worker():
+    """One OpenCV thread per process; the pool provides the parallelism"""
+    cv2.setNumThreads(1)
+
+
+def _preprocess_chunk(shm_name, shape, start, sources, retries, target_size):
+    """Preprocess sources into rows start.. of a shared batch; returns failures"""
+    batch = _attach(shm_name, shape)
+    pipeline = get_pipeline(target_size)
+    failures = {}
+    for index, source in enumerate(sources, start):
+        error = _process_one(pipeline, source, batch[index, :, :, 0], retries)
+        if error is not None:
+            failures[index] = error
+    return failures
+
+
+def _process_one(pipeline, source, row, retries):
+    """Preprocess one source into its row; returns an error message or None"""
+    for attempt in range(retries + 1):
+        try:
+            pipeline.process_into(open_image(source), row)
+            return None
+        except UnidentifiedImageError as e:
+            return str(e)
+        except OSError as e:
+            # Possibly transient (e.g. network storage); try again
+            error = str(e)
+        except Exception as e:
+            return str(e)
+    return error
+
+
+def _attach(name, shape):
+    """Map a shared batch buffer, reusing earlier attachments"""
+    entry = _attached.get(name)
+    if entry is None:
+        while len(_attached) >= _MAX_ATTACHED:
+            old_shm, old_array = _attached.pop(next(iter(_attached)))
+            del old_array
+            old_shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        entry = _attached[name] = (shm, np.ndarray(shape, dtype=np.float32, buffer=shm.buf))
+    return entry[1]
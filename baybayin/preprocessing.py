@@ -0,0 +1,570 @@
+import collections
+import threading
+
+import numpy as np
+import cv2
+from PIL import Image
+from baybayin import instrumentation
+from baybayin.exceptions import PreprocessingError
+from config.settings import IMAGE_SIZE, PROCESSING_CONFIG
+
+
+def preprocess_image(image, target_size=IMAGE_SIZE):
+    """
+    Enhanced image processing function for Baybayin character recognition.
+    
+    Args:
+        image: Input image (PIL Image or numpy array)
+        target_size: Target size for the processed image (width, height)
+    
+    Returns:
+        numpy.ndarray: Preprocessed image ready for model prediction
+    
+    Raises:
+        PreprocessingError: If the image cannot be processed
+    """
+    target_w, target_h = target_size
+    # Normalized straight into the model's layout: batch and channel dimensions
+    final = np.empty((1, target_h, target_w, 1), dtype=np.float32)
+    try:
+        get_pipeline(target_size).process_into(image, final[0, :, :, 0])
+    except Exception as e:
+        raise PreprocessingError(str(e)) from e
+    
+    return final
+
+
+def preprocess_batch(images, target_size=IMAGE_SIZE):
+    """
+    Preprocess many images into a single model-ready batch.
+    
+    Every image goes through the same steps as preprocess_image and is
+    written straight into one preallocated float32 buffer. A failing image
+    does not abort the batch; its row is left blank (all white) and the
+    error is reported by index.
+    
+    Args:
+        images: List or iterator of input images (PIL Images or numpy arrays)
+        target_size: Target size for the processed images (width, height)
+    
+    Returns:
+        tuple: (batch, failures) where batch is a numpy.ndarray of shape
+            (N, height, width, 1) and failures maps the index of each image
+            that could not be processed to its error message
+    """
+    if not hasattr(images, '__len__'):
+        images = list(images)
+    
+    target_w, target_h = target_size
+    batch = np.ones((len(images), target_h, target_w, 1), dtype=np.float32)
+    failures = {}
+    pipeline = get_pipeline(target_size)
+    
+    for i, image in enumerate(images):
+        try:
+            pipeline.process_into(image, batch[i, :, :, 0])
+        except Exception as e:
+            failures[i] = str(e)
+    
+    return batch, failures
+
+
+class PreprocessingPipeline:
+    """
+    The preprocessing steps compiled once from a processing configuration.
+    
+    The pipeline holds its CLAHE instance, morphology kernels and scratch
+    buffers. Every filter writes into a reused buffer, and pixel counts and
+    the content box come from cv2.countNonZero and cv2.boundingRect rather
+    than NumPy temporaries, so images of a recurring size are processed with
+    almost no allocations. Outputs are identical to running to_grayscale,
+    downscale_oversized and the standalone stage functions.
+    
+    A pipeline keeps state between its stages and is not thread-safe; use
+    get_pipeline() for the one owned by the calling thread.
+    """
+    
+    def __init__(self, config=PROCESSING_CONFIG, target_size=IMAGE_SIZE, max_buffers=12):
+        """
+        Args:
+            config: Processing parameters at full resolution
+            target_size: Target size for the processed image (width, height)
+            max_buffers: Scratch buffers kept; each input size needs up to four
+        """
+        self.config = config
+        self.target_size = tuple(target_size)
+        self.max_buffers = max_buffers
+        
+        target_w, target_h = self.target_size
+        self._clahe = cv2.createCLAHE(**config['clahe'])
+        self._kernels = {}
+        self._thin_kernel = np.ones((2, 2), np.uint8)
+        self._output = np.empty((target_h, target_w), np.uint8)
+        self._thinned = np.empty((target_h, target_w), np.uint8)
+        self._buffers = collections.OrderedDict()
+        # Parameters for the current image, scaled when it was downsampled
+        self._params = config
+        
+        # Each stage takes and returns one image; running them in order is
+        # preprocess_image without the final normalization, and exposing
+        # them lets benchmarks and tracing time each step
+        self.stages = [
+            ('to_grayscale', self._to_grayscale),
+            ('downscale', self._downscale),
+            ('bilateral_filter', self._denoise),
+            ('clahe', self._enhance_contrast),
+            ('gaussian_blur', self._smooth),
+            ('otsu_threshold', self._binarize),
+            ('morphology', self._clean_binary),
+            ('polarity', self._fix_polarity),
+            ('crop_to_content', self._crop_to_content),
+            ('resize_with_padding', self._resize_with_padding),
+            ('thin_strokes', self._thin_strokes),
+        ]
+    
+    def process(self, image):
+        """
+        Run all stages on one image.
+        
+        Args:
+            image: Input image (PIL Image or numpy array)
+        
+        Returns:
+            numpy.ndarray: Processed uint8 image of shape (height, width);
+                a pipeline buffer that is overwritten by the next call
+        
+        Raises:
+            Exception: If any processing step fails
+        """
+        if not instrumentation.enabled():
+            for _, stage in self.stages:
+                image = stage(image)
+            return image
+        
+        for name, stage in self.stages:
+            with instrumentation.span(name, instrumentation.size_of(image)):
+                image = stage(image)
+        return image
+    
+    def process_into(self, image, out):
+        """
+        Run all stages on one image and write the normalized result.
+        
+        Args:
+            image: Input image (PIL Image or numpy array)
+            out: float32 array of shape (height, width), e.g. one batch row
+        
+        Raises:
+            Exception: If any processing step fails
+        """
+        np.divide(self.process(image), 255.0, out=out, dtype=np.float32)
+    
+    def _buffer(self, name, shape):
+        """Reusable uint8 scratch buffer, least recently used ones dropped"""
+        key = (name, shape)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, np.uint8)
+            self._buffers[key] = buffer
+            while len(self._buffers) > self.max_buffers:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(key)
+        return buffer
+    
+    def _kernel(self, size):
+        """Structuring element of the given size, built once"""
+        kernel = self._kernels.get(size)
+        if kernel is None:
+            kernel = self._kernels[size] = np.ones(size, np.uint8)
+        return kernel
+    
+    def _to_grayscale(self, image):
+        code = cv2.COLOR_RGB2GRAY
+        if isinstance(image, Image.Image):
+            image = np.asarray(image)
+            if image.shape[-1] == 4:
+                code = cv2.COLOR_RGBA2GRAY
+        
+        if image.dtype != np.uint8:
+            if image.dtype == bool:
+                image = image.astype(np.uint8) * 255
+            else:
+                image = image.astype(np.uint8)
+        
+        if len(image.shape) == 3:
+            return cv2.cvtColor(image, code, dst=self._buffer('gray', image.shape[:2]))
+        # The stages never write into their input, so no copy is needed
+        return image
+    
+    def _downscale(self, gray):
+        gray, scale = downscale_oversized(gray, self.target_size, self.config)
+        self._params = scaled_config(scale, self.config)
+        return gray
+    
+    def _denoise(self, gray):
+        dst = self._buffer('a', gray.shape)
+        return cv2.bilateralFilter(gray, dst=dst, **self._params['bilateral_filter'])
+    
+    def _enhance_contrast(self, image):
+        return self._clahe.apply(image, self._buffer('b', image.shape))
+    
+    def _smooth(self, image):
+        dst = self._buffer('a', image.shape)
+        return cv2.GaussianBlur(image, dst=dst, **self._params['gaussian_blur'])
+    
+    def _binarize(self, image):
+        dst = self._buffer('b', image.shape)
+        return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)[1]
+    
+    def _clean_binary(self, binary):
+        kernels = self._params['morphology_kernels']
+        cleaned = cv2.morphologyEx(binary, cv2.MORPH_OPEN, self._kernel(tuple(kernels['small'])),
+                                   dst=self._buffer('a', binary.shape))
+        return cv2.morphologyEx(cleaned, cv2.MORPH_CLOSE, self._kernel(tuple(kernels['medium'])),
+                                dst=self._buffer('b', binary.shape))
+    
+    def _fix_polarity(self, binary):
+        white_pixels = cv2.countNonZero(binary)
+        if binary.size - white_pixels > white_pixels:
+            return cv2.bitwise_not(binary, dst=binary)
+        return binary
+    
+    def _crop_to_content(self, image):
+        # Non-zero exactly where the image is below 255
+        content = cv2.bitwise_not(image, dst=self._buffer('a', image.shape))
+        x, y, w, h = cv2.boundingRect(content)
+        if w == 0:
+            return image
+        
+        padding = self._params['crop_padding']
+        rows, cols = image.shape
+        y_min = max(0, y - padding)
+        x_min = max(0, x - padding)
+        y_max = min(rows, y + h - 1 + padding)
+        x_max = min(cols, x + w - 1 + padding)
+        return image[y_min:y_max, x_min:x_max]
+    
+    def _resize_with_padding(self, image):
+        h, w = image.shape
+        target_w, target_h = self.target_size
+        scale = min(target_w / w, target_h / h)
+        new_w = int(w * scale)
+        new_h = int(h * scale)
+        
+        result = self._output
+        result.fill(255)
+        y_offset = (target_h - new_h) // 2
+        x_offset = (target_w - new_w) // 2
+        resized = cv2.resize(image, (new_w, new_h), dst=self._buffer('resized', (new_h, new_w)),
+                             interpolation=cv2.INTER_AREA)
+        result[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+        return result
+    
+    def _thin_strokes(self, image):
+        char_pixels = image.size - cv2.countNonZero(image)
+        if char_pixels / image.size > self.config['thickness_threshold']:
+            return cv2.erode(image, self._thin_kernel, dst=self._thinned, iterations=1)
+        return image
+
+
+_local = threading.local()
+
+
+def get_pipeline(target_size=IMAGE_SIZE):
+    """
+    Get the calling thread's pipeline, compiling it on first use.
+    
+    Each thread (e.g. each concurrent Streamlit session's script thread)
+    gets its own buffers, so pipelines are never shared between threads.
+    
+    Args:
+        target_size: Target size for the processed image (width, height)
+    
+    Returns:
+        PreprocessingPipeline: Pipeline compiled from PROCESSING_CONFIG
+    """
+    pipelines = getattr(_local, 'pipelines', None)
+    if pipelines is None:
+        pipelines = _local.pipelines = {}
+    key = tuple(target_size)
+    pipeline = pipelines.get(key)
+    if pipeline is None:
+        pipeline = pipelines[key] = PreprocessingPipeline(target_size=key)
+    return pipeline
+
+
+def to_grayscale(image):
+    """
+    Convert an input image to a single-channel uint8 array.
+    
+    Args:
+        image: Input image (PIL Image or numpy array)
+    
+    Returns:
+        numpy.ndarray: Grayscale image
+    """
+    # Convert PIL Image to numpy array if needed
+    if isinstance(image, Image.Image):
+        image = np.array(image)
+        # Convert RGBA to RGB if needed
+        if image.shape[-1] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
+    
+    # Ensure image is in uint8 format
+    if image.dtype != np.uint8:
+        if image.dtype == bool:
+            image = image.astype(np.uint8) * 255
+        else:
+            image = image.astype(np.uint8)
+    
+    # Convert to grayscale if needed
+    if len(image.shape) == 3:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return image.copy()
+
+
+def downscale_oversized(gray, target_size=IMAGE_SIZE, config=PROCESSING_CONFIG):
+    """
+    Crop and shrink large inputs before the expensive filters run.
+    
+    Images whose longest side exceeds the working size (the larger
+    target_size dimension times PROCESSING_CONFIG['downscale']['working_scale'])
+    are first located with a cheap Otsu pass on a small thumbnail. The
+    character's bounding box, plus a margin, is cropped at full resolution
+    and area-downsampled to the working size. Smaller images are returned
+    unchanged, so the canvas and typical crops take exactly the original
+    path.
+    
+    Tolerance: the output approximates the full-resolution pipeline; it is
+    not bit-exact. On the assets/ examples at their own size and upscaled
+    4x and 8x, 51-92% of the 64x64 output pixels are identical; the others
+    are mostly gray levels along stroke edges. Thresholded at mid-gray,
+    92-100% of the pixels agree (over 96% except the noisy
+    bad_example_1.jpg at 4x), and the mean absolute difference of the
+    normalized output is at most 0.04 (0.10 for that image). For example,
+    bad_example_3.jpg at 1000x800 has 21% of its pixels differing, but
+    only 0.6% fall on the other side of mid-gray. tests/test_preprocessing.py
+    pins these limits. A 4000x3000 image is over 10x faster.
+    
+    Args:
+        gray: Grayscale uint8 image
+        target_size: Target size for the processed image (width, height)
+        config: Processing parameters at full resolution
+    
+    Returns:
+        tuple: (image, scale) where scale is the resize factor applied
+            (1.0 when the image was not resized)
+    """
+    params = config['downscale']
+    working_size = max(target_size) * params['working_scale']
+    h, w = gray.shape
+    if not params['enabled'] or max(h, w) <= working_size:
+        return gray, 1.0
+    
+    # Locate the ink on a strided thumbnail (no full-size pass over the pixels)
+    step = -(-max(h, w) // params['coarse_size'])
+    coarse_scale = 1.0 / step
+    coarse = cv2.GaussianBlur(np.ascontiguousarray(gray[::step, ::step]), (3, 3), 0)
+    binary = cv2.threshold(coarse, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    if cv2.countNonZero(binary) * 2 < binary.size:
+        # Ink is the minority class; make it the non-zero one
+        ink = binary
+    else:
+        ink = cv2.bitwise_not(binary)
+    
+    points = cv2.findNonZero(ink)
+    if points is not None:
+        x, y, bw, bh = cv2.boundingRect(points)
+        margin = params['crop_margin'] * max(bw, bh) + 2
+        x0 = max(0, int((x - margin) / coarse_scale))
+        y0 = max(0, int((y - margin) / coarse_scale))
+        x1 = min(w, int((x + bw + margin) / coarse_scale) + 1)
+        y1 = min(h, int((y + bh + margin) / coarse_scale) + 1)
+        gray = gray[y0:y1, x0:x1]
+        h, w = gray.shape
+    
+    scale = min(1.0, working_size / max(h, w))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def scaled_config(scale, config=PROCESSING_CONFIG):
+    """
+    Scale the spatial filter parameters to a downsampled image.
+    
+    Kernel sizes and spatial sigmas shrink with the image so that each
+    filter covers the same area of the character as at full resolution.
+    Kernels that would drop below one pixel become no-ops.
+    
+    Args:
+        scale: Resize factor from downscale_oversized
+        config: Processing parameters at full resolution
+    
+    Returns:
+        dict: Processing parameters for the downsampled image (config
+            itself when scale is 1)
+    """
+    if scale >= 1.0:
+        return config
+    
+    def odd(value):
+        return max(1, int(round(value)) | 1)
+    
+    bilateral = config['bilateral_filter']
+    blur = config['gaussian_blur']
+    scaled = dict(config)
+    scaled['bilateral_filter'] = dict(
+        bilateral,
+        d=odd(bilateral['d'] * scale),
+        sigmaSpace=max(1.0, bilateral['sigmaSpace'] * scale),
+    )
+    scaled['gaussian_blur'] = dict(blur, ksize=tuple(odd(k * scale) for k in blur['ksize']))
+    scaled['morphology_kernels'] = {
+        name: tuple(max(1, int(round(k * scale))) for k in size)
+        for name, size in config['morphology_kernels'].items()
+    }
+    scaled['crop_padding'] = max(1, int(round(config['crop_padding'] * scale)))
+    return scaled
+
+
+def denoise(gray, config=PROCESSING_CONFIG):
+    """Apply noise reduction with an edge-preserving bilateral filter."""
+    return cv2.bilateralFilter(gray, **config['bilateral_filter'])
+
+
+def enhance_contrast(image, config=PROCESSING_CONFIG):
+    """Enhance contrast with CLAHE."""
+    clahe = cv2.createCLAHE(**config['clahe'])
+    return clahe.apply(image)
+
+
+def smooth(image, config=PROCESSING_CONFIG):
+    """Apply Gaussian smoothing for stroke consistency."""
+    return cv2.GaussianBlur(image, **config['gaussian_blur'])
+
+
+def binarize(image):
+    """Threshold with Otsu's method."""
+    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def clean_binary(binary, config=PROCESSING_CONFIG):
+    """Remove specks with an opening, then close small gaps in strokes."""
+    kernel_small = np.ones(config['morphology_kernels']['small'], np.uint8)
+    cleaned = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel_small)
+    
+    kernel_medium = np.ones(config['morphology_kernels']['medium'], np.uint8)
+    return cv2.morphologyEx(cleaned, cv2.MORPH_CLOSE, kernel_medium)
+
+
+def fix_polarity(binary):
+    """Make the background white and the character black."""
+    black_pixels = np.sum(binary == 0)
+    white_pixels = np.sum(binary == 255)
+    
+    if black_pixels > white_pixels:
+        return cv2.bitwise_not(binary)
+    return binary
+
+
+def crop_to_content(image, padding=None):
+    """
+    Crop image to actual content with optional padding.
+    
+    Args:
+        image: Input binary image
+        padding: Padding around the content (default from config)
+    
+    Returns:
+        numpy.ndarray: Cropped image
+    """
+    if padding is None:
+        padding = PROCESSING_CONFIG['crop_padding']
+    
+    coords = np.column_stack(np.where(image < 255))
+    if len(coords) == 0:
+        return image
+    
+    y_min, x_min = coords.min(axis=0)
+    y_max, x_max = coords.max(axis=0)
+    
+    h, w = image.shape
+    y_min = max(0, y_min - padding)
+    x_min = max(0, x_min - padding)
+    y_max = min(h, y_max + padding)
+    x_max = min(w, x_max + padding)
+    
+    return image[y_min:y_max, x_min:x_max]
+
+
+def resize_with_padding(image, target_size):
+    """
+    Resize image while maintaining aspect ratio and adding padding.
+    
+    Args:
+        image: Input image
+        target_size: Target size (width, height)
+    
+    Returns:
+        numpy.ndarray: Resized image with padding
+    """
+    h, w = image.shape
+    target_w, target_h = target_size
+    
+    scale = min(target_w / w, target_h / h)
+    
+    new_w = int(w * scale)
+    new_h = int(h * scale)
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    
+    result = np.ones((target_h, target_w), dtype=np.uint8) * 255
+    
+    y_offset = (target_h - new_h) // 2
+    x_offset = (target_w - new_w) // 2
+    result[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+    
+    return result
+
+
+def thin_strokes(image):
+    """
+    Thin strokes if they are too thick.
+    
+    Args:
+        image: Input binary image
+    
+    Returns:
+        numpy.ndarray: Image with thinned strokes if needed
+    """
+    char_pixels = np.sum(image == 0)
+    total_pixels = image.shape[0] * image.shape[1]
+    
+    if char_pixels / total_pixels > PROCESSING_CONFIG['thickness_threshold']:
+        kernel = np.ones((2, 2), np.uint8)
+        return cv2.erode(image, kernel, iterations=1)
+    
+    return image
+
+
+def process_canvas_drawing(canvas_data):
+    """
+    Process drawing from canvas for classification.
+    
+    Args:
+        canvas_data: Canvas image data
+    
+    Returns:
+        numpy.ndarray: Processed image ready for classification
+    
+    Raises:
+        PreprocessingError: If the drawing cannot be processed
+    """
+    try:
+        drawn_image = cv2.cvtColor(np.array(canvas_data), cv2.COLOR_RGBA2GRAY)
+    except Exception as e:
+        raise PreprocessingError(str(e)) from e
+    _, drawn_image = cv2.threshold(drawn_image, 127, 255, cv2.THRESH_BINARY_INV)
+    return preprocess_image(drawn_image)
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Pre-flight quality checks for uploaded images.
+
+The checks run on a small downsampled copy, before preprocessing and the
+model call. They catch the inputs the upload guide warns about: blank or
+faint images, heavy blur, noisy or patterned backgrounds (including the
+checkerboard baked into "fake" transparent PNGs), strokes covering most of
+the image, and several separate characters. Each failed check becomes a
+QualityIssue with a code and a message the UI can show. Issues listed in
+QUALITY_CONFIG['reject'] stop the image before the expensive work; the
+others are warnings and the image is still classified.
+"""
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from baybayin import instrumentation
+from baybayin.exceptions import InputQualityError
+from baybayin.preprocessing import to_grayscale
+from config.settings import QUALITY_CONFIG
+
+_MESSAGES = {
+    'blank': "No character found: the image is almost uniform.",
+    'low_contrast': "The character is too faint against the background.",
+    'blurry': "The image is too blurry to make out the strokes.",
+    'noisy': "The background is noisy or patterned (e.g. the checkerboard of a fake transparent PNG).",
+    'too_much_ink': "Ink covers most of the image: the strokes are very thick or the crop is too tight.",
+    'multiple_marks': "The image has several separate marks and may contain more than one character.",
+}
+
+
+class QualityIssue(NamedTuple):
+    """One failed check."""
+
+    code: str
+    message: str
+    value: float
+    limit: float
+    reject: bool
+
+
+class QualityReport(NamedTuple):
+    """The measurements for one image and the checks it failed."""
+
+    metrics: dict
+    issues: tuple
+
+    @property
+    def accepted(self):
+        """True unless one of the issues rejects the image."""
+        return not any(issue.reject for issue in self.issues)
+
+    @property
+    def reasons(self):
+        """Messages of all issues, rejecting ones first."""
+        return [issue.message for issue in sorted(self.issues, key=lambda issue: not issue.reject)]
+
+
+def assess_quality(image, config=QUALITY_CONFIG):
+    """
+    Measure an image and compare it against the quality limits.
+
+    Metrics, all on a copy whose longest side is config['analysis_size']:
+    contrast (2nd to 98th percentile of gray levels), sharpness (mean
+    Laplacian magnitude along the stroke edges, relative to the contrast),
+    ink_ratio (share of pixels darker than the Otsu threshold), components
+    (ink blobs with at least 5% of the ink), specks (blobs of at most
+    3 pixels) and background_noise (share of background pixels that differ
+    from their background neighbourhood).
+
+    Args:
+        image: Input image (PIL Image or numpy array)
+        config: Limits and analysis size (see QUALITY_CONFIG)
+
+    Returns:
+        QualityReport: Metrics and failed checks
+    """
+    with instrumentation.span('quality_check', instrumentation.size_of(image)):
+        metrics = _measure(_analysis_copy(image, config['analysis_size']))
+    return QualityReport(metrics, tuple(_issues(metrics, config)))
+
+
+def check_quality(image, config=QUALITY_CONFIG):
+    """
+    Run the quality checks and stop hopeless images.
+
+    Args:
+        image: Input image (PIL Image or numpy array)
+        config: Limits and analysis size (see QUALITY_CONFIG)
+
+    Returns:
+        QualityReport or None: The report (possibly with warnings), or None
+            when the checks are disabled
+
+    Raises:
+        InputQualityError: If a rejecting check failed
+    """
+    if not config['enabled']:
+        return None
+    report = assess_quality(image, config)
+    if not report.accepted:
+        raise InputQualityError(report)
+    return report
+
+
+def _analysis_copy(image, size):
+    """Grayscale copy with its longest side at most size"""
+    if isinstance(image, Image.Image):
+        width, height = image.size
+    else:
+        height, width = image.shape[:2]
+    # Subsampling before the grayscale conversion keeps both it and the area
+    # averaging cheap on multi-megapixel inputs
+    step = int(max(height, width) / (size * 2))
+    if step > 1:
+        if isinstance(image, Image.Image):
+            image = image.resize((max(1, width // step), max(1, height // step)), Image.NEAREST)
+        else:
+            image = image[::step, ::step]
+
+    if isinstance(image, np.ndarray) and image.ndim == 2 and image.dtype == np.uint8:
+        gray = image
+    else:
+        gray = to_grayscale(image)
+
+    height, width = gray.shape
+    scale = size / max(height, width)
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _measure(gray):
+    """Compute the quality metrics of a small grayscale image"""
+    cumulative = np.cumsum(cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()) / gray.size
+    low, high = np.searchsorted(cumulative, [0.02, 0.98])
+    contrast = int(high - low)
+
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    ink_pixels = cv2.countNonZero(ink)
+    if contrast == 0 or ink_pixels == 0:
+        return {'contrast': contrast, 'sharpness': 0.0, 'ink_ratio': 0.0,
+                'components': 0, 'specks': 0, 'background_noise': 0.0}
+    if ink_pixels > gray.size // 2:
+        # Light strokes on a dark background
+        ink = cv2.bitwise_not(ink)
+        ink_pixels = gray.size - ink_pixels
+
+    kernel = np.ones((3, 3), np.uint8)
+    grown = cv2.dilate(ink, kernel)
+
+    # Edge sharpness: how steep the ink boundary is, independent of its length
+    edges = cv2.subtract(grown, cv2.erode(ink, kernel))
+    laplacian = np.abs(cv2.Laplacian(gray, cv2.CV_32F))
+    sharpness = float(cv2.mean(laplacian, mask=edges)[0]) / contrast
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    components = int(np.count_nonzero(areas >= 0.05 * ink_pixels))
+    specks = int(np.count_nonzero(areas <= 3))
+
+    # Background texture: deviation from the mean of the background around
+    # each pixel, so shading gradients and stroke edges do not count
+    background = (grown == 0).astype(np.float32)
+    background_count = cv2.countNonZero(background)
+    background_noise = 0.0
+    if background_count:
+        values = gray.astype(np.float32) * background
+        local = cv2.blur(values, (5, 5)) / np.maximum(cv2.blur(background, (5, 5)), 1e-3)
+        deviation = cv2.absdiff(gray.astype(np.float32), local) * background
+        background_noise = cv2.countNonZero((deviation > 6).astype(np.uint8)) / background_count
+
+    return {
+        'contrast': contrast,
+        'sharpness': round(sharpness, 3),
+        'ink_ratio': round(ink_pixels / gray.size, 4),
+        'components': components,
+        'specks': specks,
+        'background_noise': round(background_noise, 3),
+    }
+
+
+def _issues(metrics, config):
+    """Yield a QualityIssue for each failed check"""
+    min_ink, max_ink = config['ink_ratio']
+    checks = [
+        ('blank', metrics['ink_ratio'], min_ink, metrics['ink_ratio'] < min_ink),
+        ('low_contrast', metrics['contrast'], config['min_contrast'],
+         metrics['contrast'] < config['min_contrast']),
+        ('blurry', metrics['sharpness'], config['min_sharpness'],
+         metrics['sharpness'] < config['min_sharpness']),
+        ('noisy', metrics['background_noise'], config['max_background_noise'],
+         metrics['background_noise'] > config['max_background_noise']),
+        ('noisy', metrics['specks'], config['max_specks'], metrics['specks'] > config['max_specks']),
+        ('too_much_ink', metrics['ink_ratio'], max_ink, metrics['ink_ratio'] > max_ink),
+        ('multiple_marks', metrics['components'], config['max_components'],
+         metrics['components'] > config['max_components']),
+    ]
+    seen = set()
+    for code, value, limit, failed in checks:
+        if failed and code not in seen:
+            seen.add(code)
+            yield QualityIssue(code, _MESSAGES[code], value, limit, code in config['reject'])
+        if code == 'blank' and failed:
+            # Nothing else is meaningful without ink
+            return
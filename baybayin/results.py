@@ -0,0 +1,53 @@
+"""
+Decoding of classifier outputs into ranked labels.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from config.settings import BAYBAYIN_CATEGORIES
+
+_CATEGORY_LABELS = np.asarray(BAYBAYIN_CATEGORIES)
+
+
+class TopK(NamedTuple):
+    """Top-k predictions for a batch, each field shaped (N, k) and ranked best first."""
+
+    indices: np.ndarray
+    labels: np.ndarray
+    probabilities: np.ndarray
+
+
+def decode_top_k(probabilities, k=5, categories=None):
+    """
+    Decode a batch of probability vectors into the k most likely labels.
+
+    Uses argpartition, so only the k winners of each row are sorted.
+
+    Args:
+        probabilities: Model output of shape (N, num_classes) or (num_classes,)
+        k: Number of predictions per row (clamped to the number of classes)
+        categories: Labels for the class indices (default BAYBAYIN_CATEGORIES)
+
+    Returns:
+        TopK: Label ids, labels and probabilities, each of shape (N, k)
+    """
+    probabilities = np.asarray(probabilities)
+    if probabilities.ndim == 1:
+        probabilities = probabilities[np.newaxis]
+    labels = _CATEGORY_LABELS if categories is None else np.asarray(categories)
+
+    num_classes = probabilities.shape[1]
+    k = max(1, min(k, num_classes))
+
+    if k < num_classes:
+        candidates = np.argpartition(probabilities, num_classes - k, axis=1)[:, num_classes - k:]
+    else:
+        candidates = np.broadcast_to(np.arange(num_classes), probabilities.shape)
+    candidate_probs = np.take_along_axis(probabilities, candidates, axis=1)
+
+    order = np.argsort(-candidate_probs, axis=1, kind='stable')
+    indices = np.take_along_axis(candidates, order, axis=1)
+    top_probs = np.take_along_axis(candidate_probs, order, axis=1)
+
+    return TopK(indices=indices, labels=labels[indices], probabilities=top_probs)
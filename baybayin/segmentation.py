@@ -0,0 +1,330 @@
+"""
+Segmentation of handwritten words, lines and pages into single glyphs.
+
+The page is binarized with the same filter chain as preprocess_image. Its
+connected components are then grouped into glyphs: kudlit marks and broken
+stroke fragments are attached to the base glyph they sit above, below or
+across. Glyphs are put in reading order (lines top to bottom, left to right
+within a line), and each one is normalized with crop_to_content,
+resize_with_padding and thin_strokes into one batch. A whole page is then
+classified with a single model call.
+"""
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.exceptions import PreprocessingError
+from baybayin.preprocessing import (
+    binarize,
+    clean_binary,
+    crop_to_content,
+    denoise,
+    enhance_contrast,
+    fix_polarity,
+    resize_with_padding,
+    scaled_config,
+    smooth,
+    thin_strokes,
+    to_grayscale,
+)
+from baybayin.results import decode_top_k
+from config.settings import IMAGE_SIZE, SEGMENTATION_CONFIG
+
+
+class Glyph(NamedTuple):
+    """One segmented glyph, with its box in input-image pixels."""
+
+    x: int
+    y: int
+    width: int
+    height: int
+    line: int
+
+
+class PageGlyph(NamedTuple):
+    """A classified glyph: its position and its ranked predictions."""
+
+    glyph: Glyph
+    labels: list
+    probabilities: list
+
+
+def binarize_page(image):
+    """
+    Binarize a page with the preprocess_image filter chain.
+
+    Pages larger than SEGMENTATION_CONFIG['max_page_side'] are downsampled
+    first, with the filter kernels scaled to match.
+
+    Args:
+        image: Input page (PIL Image or numpy array)
+
+    Returns:
+        tuple: (binary, scale) where binary has black ink on white and scale
+            maps binary coordinates back to input pixels (input = binary / scale)
+    """
+    gray = to_grayscale(image)
+    h, w = gray.shape
+    scale = min(1.0, SEGMENTATION_CONFIG['max_page_side'] / max(h, w))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+    config = scaled_config(scale)
+
+    binary = binarize(smooth(enhance_contrast(denoise(gray, config), config), config))
+    return fix_polarity(clean_binary(binary, config)), scale
+
+
+def find_glyphs(binary):
+    """
+    Group the ink of a binarized page into glyphs in reading order.
+
+    Args:
+        binary: Binary image with black ink on white
+
+    Returns:
+        tuple: (glyphs, members, labels) where glyphs is a list of Glyph in
+            binary-image coordinates, members holds the connected-component
+            ids making up each glyph, and labels is the component label map
+    """
+    ink = cv2.bitwise_not(binary)
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    if count <= 1:
+        return [], [], labels
+
+    components = [
+        (i, stats[i, cv2.CC_STAT_LEFT], stats[i, cv2.CC_STAT_TOP],
+         stats[i, cv2.CC_STAT_WIDTH], stats[i, cv2.CC_STAT_HEIGHT], stats[i, cv2.CC_STAT_AREA])
+        for i in range(1, count)
+    ]
+    median_area = float(np.median([c[5] for c in components]))
+    components = [c for c in components if c[5] >= SEGMENTATION_CONFIG['min_area_ratio'] * median_area]
+    if not components:
+        return [], [], labels
+
+    # Glyph height is estimated from the larger components only, so that
+    # many small marks do not drag it down
+    heights = sorted(c[4] for c in components)
+    glyph_height = float(np.median(heights[len(heights) // 2:]))
+    mark_size = SEGMENTATION_CONFIG['mark_size_ratio'] * glyph_height
+
+    bases = [c for c in components if max(c[3], c[4]) > mark_size]
+    marks = [c for c in components if max(c[3], c[4]) <= mark_size]
+    if not bases:
+        bases, marks = marks, []
+
+    groups = [[c[0]] for c in bases]
+    boxes = [[c[1], c[2], c[1] + c[3], c[2] + c[4]] for c in bases]
+    _merge_fragments(groups, boxes)
+
+    for mark in marks:
+        target = _nearest_base(mark, boxes, glyph_height)
+        if target is None:
+            # A stray mark far from any glyph is most likely noise
+            continue
+        groups[target].append(mark[0])
+        box = boxes[target]
+        box[0] = min(box[0], mark[1])
+        box[1] = min(box[1], mark[2])
+        box[2] = max(box[2], mark[1] + mark[3])
+        box[3] = max(box[3], mark[2] + mark[4])
+
+    order = _reading_order(boxes)
+    glyphs = [
+        Glyph(int(boxes[i][0]), int(boxes[i][1]), int(boxes[i][2] - boxes[i][0]),
+              int(boxes[i][3] - boxes[i][1]), line)
+        for line, i in order
+    ]
+    members = [groups[i] for _, i in order]
+    return glyphs, members, labels
+
+
+def segment_glyphs(image, target_size=IMAGE_SIZE):
+    """
+    Segment a page into glyphs and normalize each into one model batch.
+
+    Args:
+        image: Input page (PIL Image or numpy array)
+        target_size: Target size for each glyph (width, height)
+
+    Returns:
+        tuple: (batch, glyphs) where batch has shape (N, height, width, 1)
+            and glyphs lists the matching Glyph boxes in input-image pixels
+
+    Raises:
+        PreprocessingError: If the page cannot be processed
+    """
+    try:
+        with instrumentation.span('binarize_page', instrumentation.size_of(image)):
+            binary, scale = binarize_page(image)
+        with instrumentation.span('find_glyphs', instrumentation.size_of(binary)):
+            glyphs, members, labels = find_glyphs(binary)
+        with instrumentation.span('normalize_glyphs', (len(glyphs),)):
+            batch = _normalize_glyphs(glyphs, members, labels, scaled_config(scale)['crop_padding'], target_size)
+    except Exception as e:
+        raise PreprocessingError(str(e)) from e
+
+    if scale < 1.0:
+        glyphs = [
+            Glyph(int(g.x / scale), int(g.y / scale), int(round(g.width / scale)),
+                  int(round(g.height / scale)), g.line)
+            for g in glyphs
+        ]
+    return batch, glyphs
+
+
+def classify_page(image, model, k=5):
+    """
+    Segment a page and classify all of its glyphs with one model call.
+
+    Args:
+        image: Input page (PIL Image or numpy array)
+        model: Object with a predict(batch) method
+        k: Number of predictions per glyph
+
+    Returns:
+        list: PageGlyph results in reading order
+
+    Raises:
+        PreprocessingError: If the page cannot be processed
+    """
+    batch, glyphs = segment_glyphs(image)
+    if not glyphs:
+        return []
+
+    with instrumentation.span('predict', batch.shape):
+        prediction = model.predict(batch)
+    top = decode_top_k(prediction, k=k)
+    labels, probabilities = top.labels.tolist(), top.probabilities.tolist()
+    return [PageGlyph(glyph, labels[i], probabilities[i]) for i, glyph in enumerate(glyphs)]
+
+
+def _normalize_glyphs(glyphs, members, labels, padding, target_size):
+    """Cut each glyph out of the label map and normalize it into one batch"""
+    target_w, target_h = target_size
+    batch = np.ones((len(glyphs), target_h, target_w, 1), dtype=np.float32)
+
+    for i, (glyph, ids) in enumerate(zip(glyphs, members)):
+        window = labels[glyph.y:glyph.y + glyph.height, glyph.x:glyph.x + glyph.width]
+        # Keep only this glyph's components, not neighbours reaching into its box
+        glyph_image = np.where(np.isin(window, ids), 0, 255).astype(np.uint8)
+        glyph_image = cv2.copyMakeBorder(glyph_image, padding, padding, padding, padding,
+                                         cv2.BORDER_CONSTANT, value=255)
+        final = thin_strokes(resize_with_padding(crop_to_content(glyph_image, padding), target_size))
+        row = batch[i, :, :, 0]
+        row[...] = final
+        row /= 255.0
+
+    return batch
+
+
+def _merge_fragments(groups, boxes):
+    """
+    Merge base components that overlap horizontally and nearly touch vertically (in place).
+
+    Each round sweeps the boxes sorted by their left edge, testing a box only
+    against the boxes still overlapping it horizontally, and joins linked
+    fragments with union-find. Merged boxes are larger and can link further,
+    so rounds repeat until one merges nothing; pages need one or two.
+    Merged groups keep the position of their first component.
+    """
+    while _merge_round(groups, boxes):
+        pass
+
+
+def _merge_round(groups, boxes):
+    """One sweep of _merge_fragments; returns whether anything merged"""
+    parent = list(range(len(boxes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    merges = 0
+    active = []
+    for i in sorted(range(len(boxes)), key=lambda i: boxes[i][0]):
+        a = boxes[i]
+        # Sorted by left edge, so a box ending left of this one overlaps nothing after it
+        active = [j for j in active if boxes[j][2] > a[0]]
+        for j in active:
+            if _same_glyph(a, boxes[j]):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+                    merges += 1
+        active.append(i)
+    if not merges:
+        return False
+
+    merged = {}
+    for i, (group, box) in enumerate(zip(groups, boxes)):
+        root = find(i)
+        if root not in merged:
+            # The root is the lowest index of its set, so it is seen first
+            merged[root] = (list(group), list(box))
+            continue
+        merged_group, merged_box = merged[root]
+        merged_group.extend(group)
+        merged_box[:] = [min(merged_box[0], box[0]), min(merged_box[1], box[1]),
+                         max(merged_box[2], box[2]), max(merged_box[3], box[3])]
+    groups[:] = [group for group, _ in merged.values()]
+    boxes[:] = [box for _, box in merged.values()]
+    return True
+
+
+def _same_glyph(a, b):
+    """Whether two base boxes are fragments of one glyph"""
+    overlap = min(a[2], b[2]) - max(a[0], b[0])
+    narrower = min(a[2] - a[0], b[2] - b[0])
+    gap = max(a[1], b[1]) - min(a[3], b[3])
+    height = min(a[3] - a[1], b[3] - b[1])
+    return (overlap > SEGMENTATION_CONFIG['fragment_overlap'] * narrower
+            and gap < SEGMENTATION_CONFIG['fragment_gap'] * height)
+
+
+def _nearest_base(mark, boxes, glyph_height):
+    """Index of the glyph a kudlit-sized mark belongs to, or None"""
+    _, x, y, w, h, _ = mark
+    center_x = x + w / 2
+    center_y = y + h / 2
+    best, best_distance = None, None
+    for i, (x0, y0, x1, y1) in enumerate(boxes):
+        # Horizontal distance from the mark's centre to the glyph's span
+        dx = max(x0 - center_x, 0, center_x - x1)
+        # Vertical distance from the mark's centre to the glyph's box
+        dy = max(y0 - center_y, 0, center_y - y1)
+        if dx > SEGMENTATION_CONFIG['mark_max_offset'] * (x1 - x0) / 2 + 1:
+            continue
+        if dy > SEGMENTATION_CONFIG['mark_max_gap'] * glyph_height:
+            continue
+        distance = dx * 2 + dy
+        if best_distance is None or distance < best_distance:
+            best, best_distance = i, distance
+    return best
+
+
+def _reading_order(boxes):
+    """Assign boxes to lines and order them; returns (line, index) pairs"""
+    lines = []
+    for i in sorted(range(len(boxes)), key=lambda i: (boxes[i][1] + boxes[i][3]) / 2):
+        top, bottom = boxes[i][1], boxes[i][3]
+        for line in lines:
+            overlap = min(bottom, line['bottom']) - max(top, line['top'])
+            if overlap > SEGMENTATION_CONFIG['line_overlap'] * min(bottom - top, line['bottom'] - line['top']):
+                line['members'].append(i)
+                line['top'] = min(line['top'], top)
+                line['bottom'] = max(line['bottom'], bottom)
+                break
+        else:
+            lines.append({'top': top, 'bottom': bottom, 'members': [i]})
+
+    lines.sort(key=lambda line: line['top'])
+    order = []
+    for number, line in enumerate(lines):
+        for i in sorted(line['members'], key=lambda i: boxes[i][0]):
+            order.append((number, i))
+    return order
@@ -0,0 +1,377 @@
+"""
+Asynchronous HTTP API over the core classification pipeline.
+
+Endpoints:
+    POST /classify        One image: the raw file as the request body, or a
+                          multipart form with an 'image' field
+    POST /classify/batch  Several images: a multipart form with one file part
+                          per image, or a NumPy .npy array
+                          (Content-Type: application/x-npy)
+    GET  /health          Model, load and batching status
+
+Both classify endpoints take an optional ``k`` query parameter (number of
+predictions, default from SERVER_CONFIG).
+
+Raw images, whether encoded files or .npy arrays, pass the quality gate
+(baybayin.quality) before preprocessing; rejected images get their issues
+instead of predictions. Arrays that are already preprocessed model input
+skip it.
+
+Decoding and preprocess_image run on a thread pool, so the event loop only
+parses requests and writes responses; OpenCV releases the GIL, so the pool
+scales across cores. Predictions go through a BatchScheduler, so concurrent
+requests share model calls. At most SERVER_CONFIG['max_in_flight'] requests
+are processed at once; further requests get 503 with Retry-After rather than
+queueing without bound, and each request is limited to
+SERVER_CONFIG['request_timeout'] seconds (504 when exceeded).
+
+Run with ``python -m baybayin serve``; needs aiohttp.
+"""
+import asyncio
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import web
+
+from baybayin.batching import BatchScheduler
+from baybayin.exceptions import InputQualityError, PreprocessingError
+from baybayin.image_io import open_image
+from baybayin.model import get_model
+from baybayin.preprocessing import preprocess_image
+from baybayin.quality import check_quality
+from baybayin.results import decode_top_k
+from config.settings import BAYBAYIN_CATEGORIES, IMAGE_SIZE, SERVER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+NPY_CONTENT_TYPES = ('application/x-npy', 'application/npy')
+
+
+class ClassificationService:
+    """
+    Request handlers sharing one model, thread pool and in-flight limit.
+    """
+
+    def __init__(self, model, max_in_flight=None, request_timeout=None, workers=None, top_k=None):
+        """
+        Args:
+            model: BatchScheduler (or any object with submit(batch) returning
+                a future) in front of the model
+            max_in_flight: Requests processed at once (default from SERVER_CONFIG)
+            request_timeout: Seconds allowed per request (default from SERVER_CONFIG)
+            workers: Preprocessing threads (default from SERVER_CONFIG)
+            top_k: Default number of predictions per image (default from SERVER_CONFIG)
+        """
+        self.model = model
+        self.max_in_flight = max_in_flight or SERVER_CONFIG['max_in_flight']
+        self.request_timeout = request_timeout or SERVER_CONFIG['request_timeout']
+        self.top_k = top_k or SERVER_CONFIG['top_k']
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or SERVER_CONFIG['workers'], thread_name_prefix='baybayin-preprocess'
+        )
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def classify(self, request):
+        """POST /classify: classify one image"""
+        return await self._guarded(request, self._classify_one)
+
+    async def classify_batch(self, request):
+        """POST /classify/batch: classify several images"""
+        return await self._guarded(request, self._classify_many)
+
+    async def health(self, request):
+        """GET /health: report model and load status"""
+        return web.json_response({
+            'status': 'ok',
+            'model_version': getattr(self.model, 'model_version', None),
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'batching': self.model.metrics() if hasattr(self.model, 'metrics') else None,
+            'cascade': _cascade_metrics(self.model),
+        })
+
+    async def _guarded(self, request, handler):
+        """Apply the in-flight limit, the timeout and error mapping to a handler"""
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            return _error(503, "Server is busy, retry shortly", headers={'Retry-After': '1'})
+
+        self.in_flight += 1
+        try:
+            k = _parse_top_k(request.query.get('k'), self.top_k)
+            return await asyncio.wait_for(handler(request, k), self.request_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return _error(504, f"Request took longer than {self.request_timeout:g}s")
+        except ValueError as e:
+            return _error(400, str(e))
+        except web.HTTPException:
+            raise
+        except Exception:
+            logger.exception("Classification failed")
+            return _error(500, "Classification failed")
+        finally:
+            self.in_flight -= 1
+
+    async def _classify_one(self, request, k):
+        if request.content_type.startswith('multipart/'):
+            reader = await request.multipart()
+            data = None
+            async for part in reader:
+                if part.name == 'image':
+                    data = await part.read()
+                    break
+            if data is None:
+                raise ValueError("Multipart request has no 'image' field")
+        else:
+            data = await request.read()
+        if not data:
+            raise ValueError("Request body is empty")
+
+        try:
+            batch = await self._run(_decode_and_preprocess, data)
+        except InputQualityError as e:
+            return web.json_response(_failure(e), status=422)
+        except PreprocessingError as e:
+            raise ValueError(f"Could not process image: {e}") from e
+
+        probabilities = await self._predict(batch)
+        return web.json_response({'predictions': _predictions(probabilities, k)[0]})
+
+    async def _classify_many(self, request, k):
+        if request.content_type in NPY_CONTENT_TYPES:
+            array = _load_npy(await request.read())
+            if array.ndim not in (3, 4):
+                raise ValueError("Arrays must have shape (N, height, width[, channels])")
+            if _is_model_ready(array):
+                batch, errors = _model_input(array), {}
+            else:
+                batch, errors = await self._preprocess_all(list(_raw_images(array)))
+        elif request.content_type.startswith('multipart/'):
+            reader = await request.multipart()
+            images = []
+            async for part in reader:
+                if part.filename is not None or part.name in ('image', 'images'):
+                    images.append(bytes(await part.read()))
+            batch, errors = await self._preprocess_all(images)
+        else:
+            raise ValueError("Send a multipart form or an application/x-npy array")
+
+        count = len(batch)
+        if count == 0:
+            raise ValueError("Request contains no images")
+        if count > SERVER_CONFIG['max_batch_images']:
+            raise ValueError(f"At most {SERVER_CONFIG['max_batch_images']} images per request")
+
+        ok = [i for i in range(count) if i not in errors]
+        predictions = {}
+        if ok:
+            probabilities = await self._predict(batch[ok])
+            predictions = dict(zip(ok, _predictions(probabilities, k)))
+
+        results = [
+            dict(_failure(errors[i]), index=i) if i in errors else {'index': i, 'predictions': predictions[i]}
+            for i in range(count)
+        ]
+        return web.json_response({'results': results})
+
+    async def _preprocess_all(self, images):
+        """Preprocess images concurrently on the pool; failures are returned by index"""
+        if len(images) > SERVER_CONFIG['max_batch_images']:
+            raise ValueError(f"At most {SERVER_CONFIG['max_batch_images']} images per request")
+
+        # Raw images pass the same quality gate whether they arrive encoded or as arrays
+        function = _decode_and_preprocess if images and isinstance(images[0], bytes) else _check_and_preprocess
+        outcomes = await asyncio.gather(
+            *(self._run(function, image) for image in images), return_exceptions=True
+        )
+        target_w, target_h = IMAGE_SIZE
+        batch = np.ones((len(images), target_h, target_w, 1), dtype=np.float32)
+        errors = {}
+        for i, outcome in enumerate(outcomes):
+            if isinstance(outcome, PreprocessingError):
+                errors[i] = outcome
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                batch[i] = outcome[0]
+        return batch, errors
+
+    async def _predict(self, batch):
+        """Submit a batch to the model and await its probabilities"""
+        # A request that times out stops waiting, but the shared scheduler's
+        # future is left to finish instead of being cancelled under it
+        return await asyncio.shield(asyncio.wrap_future(self.model.submit(batch)))
+
+    def _run(self, function, *args):
+        """Run a blocking function on the preprocessing pool"""
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+def create_app(model=None, **options):
+    """
+    Build the aiohttp application.
+
+    Args:
+        model: BatchScheduler or engine to serve; an engine is wrapped in a
+            BatchScheduler (default: the engine from baybayin.model.get_model)
+        **options: Passed to ClassificationService
+
+    Returns:
+        aiohttp.web.Application: Application with the routes registered
+
+    Raises:
+        ModelLoadError: If the default model cannot be loaded
+    """
+    if model is None:
+        model = get_model()
+    if not hasattr(model, 'submit'):
+        model = BatchScheduler(model)
+
+    service = ClassificationService(model, **options)
+    app = web.Application(client_max_size=SERVER_CONFIG['max_body_bytes'])
+    app['service'] = service
+    app.router.add_post('/classify', service.classify)
+    app.router.add_post('/classify/batch', service.classify_batch)
+    app.router.add_get('/health', service.health)
+
+    async def shutdown(app):
+        service.executor.shutdown(wait=False)
+
+    app.on_cleanup.append(shutdown)
+    return app
+
+
+def serve(host=None, port=None, model=None, **options):
+    """
+    Run the HTTP service until interrupted.
+
+    Args:
+        host: Interface to bind (default from SERVER_CONFIG)
+        port: Port to bind (default from SERVER_CONFIG)
+        model: Model to serve (see create_app)
+        **options: Passed to ClassificationService
+    """
+    app = create_app(model, **options)
+    web.run_app(app, host=host or SERVER_CONFIG['host'], port=port or SERVER_CONFIG['port'])
+
+
+def _decode_and_preprocess(data):
+    """Decode encoded image bytes, check and preprocess them; runs on the pool"""
+    try:
+        image = open_image(data)
+    except Exception as e:
+        raise PreprocessingError("not a readable image file") from e
+    return _check_and_preprocess(image)
+
+
+def _check_and_preprocess(image):
+    """Run the quality gate on a raw image, then preprocess it; runs on the pool"""
+    if isinstance(image, np.ndarray) and image.ndim == 3 and image.shape[-1] == 1:
+        image = image[..., 0]
+    try:
+        check_quality(image)
+    except InputQualityError:
+        raise
+    except Exception as e:
+        raise PreprocessingError(f"not a usable image: {e}") from e
+    return preprocess_image(image)
+
+
+def _load_npy(data):
+    """Parse a .npy payload without allowing pickled objects"""
+    try:
+        return np.load(io.BytesIO(data), allow_pickle=False)
+    except Exception as e:
+        raise ValueError(f"Invalid .npy payload: {e}") from e
+
+
+def _is_model_ready(array):
+    """Whether an array is already a preprocessed float batch"""
+    target_w, target_h = IMAGE_SIZE
+    return array.dtype.kind == 'f' and array.shape[1:] == (target_h, target_w, 1)
+
+
+def _model_input(array):
+    """Validate a preprocessed float batch before it reaches the model"""
+    batch = array.astype(np.float32, copy=False)
+    if batch.size and not (np.isfinite(batch).all() and batch.min() >= 0.0 and batch.max() <= 1.0):
+        raise ValueError("Preprocessed tensors must hold finite values in [0, 1]")
+    return batch
+
+
+def _raw_images(array):
+    """
+    Convert an array of raw images to uint8 for preprocessing.
+
+    Floats in [0, 1] are taken as normalized intensities and scaled to
+    0..255; other floats and integers must already be in 0..255. Values
+    are never wrapped or clipped silently.
+    """
+    if array.dtype.kind == 'f':
+        if array.size and not np.isfinite(array).all():
+            raise ValueError("Images must not contain NaN or infinite values")
+        if array.size and array.min() >= 0.0 and array.max() <= 1.0:
+            array = array * 255.0
+        if array.size and (array.min() < 0.0 or array.max() > 255.0):
+            raise ValueError("Float images must hold values in [0, 1] or [0, 255]")
+        return np.rint(array).astype(np.uint8)
+    if array.dtype.kind in 'iu' and array.dtype != np.uint8:
+        if array.size and (array.min() < 0 or array.max() > 255):
+            raise ValueError("Integer images must hold values in [0, 255]")
+        return array.astype(np.uint8)
+    return array
+
+
+def _parse_top_k(value, default):
+    """Parse and clamp the k query parameter"""
+    if value is None:
+        return default
+    try:
+        k = int(value)
+    except ValueError:
+        raise ValueError("k must be an integer") from None
+    return max(1, min(k, len(BAYBAYIN_CATEGORIES)))
+
+
+def _predictions(probabilities, k):
+    """JSON-ready top-k predictions for each row"""
+    top = decode_top_k(probabilities, k=k)
+    return [
+        [
+            {'label': label, 'confidence': round(confidence, 6)}
+            for label, confidence in zip(labels, confidences)
+        ]
+        for labels, confidences in zip(top.labels.tolist(), top.probabilities.tolist())
+    ]
+
+
+def _cascade_metrics(model):
+    """Escalation and latency metrics when the served engine is a cascade"""
+    engine = getattr(model, 'engine', model)
+    if getattr(engine, 'name', None) != 'cascade':
+        return None
+    return engine.metrics()
+
+
+def _failure(error):
+    """Response fields for an image that could not be classified"""
+    if isinstance(error, InputQualityError):
+        return {
+            'error': f"Image rejected: {error}",
+            'issues': [
+                {'code': issue.code, 'message': issue.message, 'reject': issue.reject}
+                for issue in error.report.issues
+            ],
+        }
+    return {'error': str(error)}
+
+
+def _error(status, message, headers=None):
+    return web.json_response({'error': message}, status=status, headers=headers)
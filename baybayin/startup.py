@@ -0,0 +1,138 @@
+"""
+Background model warm-up and cold-start timings.
+
+start_warmup() loads the model and runs one dummy prediction on a daemon
+thread, so the first request does not pay for the TensorFlow import, the
+model load or the first-call graph setup. The app calls it when the process
+starts and shows a warming-up notice until warmup_status() is 'ready'.
+
+Cold-start milestones (first paint, model loaded, model warm, first
+prediction) are recorded once per process with mark(), in seconds since
+this module was first imported, i.e. since the app process started
+running the script. Each is logged to 'baybayin.startup' and reported to
+the instrumentation sink as a 'startup_<name>' stage.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.model import get_model
+from config.settings import IMAGE_SIZE
+
+logger = logging.getLogger('baybayin.startup')
+
+_started = time.perf_counter()
+_marks = {}
+_marks_lock = threading.Lock()
+
+_status = 'idle'
+_error = None
+_ready = threading.Event()
+_warmup_lock = threading.Lock()
+
+
+def mark(name):
+    """
+    Record a cold-start milestone the first time it is reached.
+
+    Args:
+        name: Milestone name, e.g. 'first_paint' or 'first_prediction'
+
+    Returns:
+        float or None: Seconds since start, or None if already recorded
+    """
+    with _marks_lock:
+        if name in _marks:
+            return None
+        seconds = _marks[name] = time.perf_counter() - _started
+    logger.info("%s after %.3f s", name, seconds)
+    # Straight to the sink: these are not stages of the request being traced
+    sink = instrumentation.get_sink()
+    if sink is not None:
+        sink.record(f'startup_{name}', seconds, None)
+    return seconds
+
+
+def timings():
+    """
+    The milestones recorded so far.
+
+    Returns:
+        dict: Milestone name -> seconds since start
+    """
+    with _marks_lock:
+        return dict(_marks)
+
+
+def start_warmup(engine=None, model_path=None):
+    """
+    Load and warm up the model on a background thread (once per process).
+
+    Args:
+        engine: Engine name (default from INFERENCE_CONFIG)
+        model_path: Model file for the engine (default from INFERENCE_CONFIG)
+
+    Returns:
+        bool: True if this call started the warm-up
+    """
+    global _status
+    with _warmup_lock:
+        if _status != 'idle':
+            return False
+        _status = 'loading'
+
+    thread = threading.Thread(
+        target=_warm_up, args=(engine, model_path), name='baybayin-warmup', daemon=True
+    )
+    thread.start()
+    return True
+
+
+def warmup_status():
+    """
+    Progress of the background warm-up.
+
+    Returns:
+        str: 'idle' (not started), 'loading', 'ready' or 'failed'
+    """
+    return _status
+
+
+def warmup_error():
+    """The error message of a failed warm-up, or None."""
+    return _error
+
+
+def wait_until_ready(timeout=None):
+    """
+    Block until the warm-up has finished.
+
+    Args:
+        timeout: Seconds to wait (default: no limit)
+
+    Returns:
+        bool: True if the warm-up finished (successfully or not) in time
+    """
+    return _ready.wait(timeout)
+
+
+def _warm_up(engine, model_path):
+    """Load the model and run one dummy batch through it"""
+    global _status, _error
+    try:
+        model = get_model(engine, model_path)
+        mark('model_loaded')
+        target_w, target_h = IMAGE_SIZE
+        model.predict(np.ones((1, target_h, target_w, 1), dtype=np.float32))
+        mark('model_warm')
+        _status = 'ready'
+    except Exception as e:
+        # The pages report load errors themselves when they next ask for the model
+        logger.warning("Model warm-up failed: %s", e)
+        _error = str(e)
+        _status = 'failed'
+    finally:
+        _ready.set()
@@ -0,0 +1,447 @@
+"""
+On-disk store of preprocessed images for re-scoring datasets.
+
+Preprocessing depends only on the image and the processing configuration,
+so a dataset is preprocessed once and every later model version is scored
+from the stored tensors, paying only for inference
+(``python -m baybayin store build`` / ``store score``).
+
+A store is a directory with two files:
+
+    tensors.u8   The pipeline's uint8 output, one (height, width) row per
+                 image, memory-mapped; the float32 model input is exactly
+                 this divided by 255, so nothing is lost
+    index.jsonl  A header line with the configuration fingerprint, then
+                 one line per source: path, content hash, size, mtime and
+                 row (or the preprocessing error). Lines are only
+                 appended; a later line for a path replaces earlier ones
+
+Updates are incremental: files whose size and modification time are
+unchanged are skipped without reading them, files with new content are
+preprocessed into new rows, and deleted files are dropped. Rows of replaced
+and deleted files are never reused, so an index line cannot come to point
+at another image's pixels. When the processing configuration, the input
+size or the decode budget changes, the fingerprint no longer matches and
+the store starts over. One process should update a store at a time.
+"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from baybayin import instrumentation
+from baybayin.cache import config_fingerprint
+from baybayin.image_io import open_image
+from baybayin.preprocessing import get_pipeline
+from config.settings import IMAGE_IO_CONFIG, IMAGE_SIZE, PROCESSING_CONFIG, STORE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'baybayin-tensor-store'
+VERSION = 1
+TENSORS_FILE = 'tensors.u8'
+INDEX_FILE = 'index.jsonl'
+
+
+class StoreEntry(NamedTuple):
+    """One source image in the store."""
+
+    path: str
+    hash: str
+    size: int
+    mtime_ns: int
+    row: int
+    error: Optional[str]
+
+
+def store_fingerprint(config=PROCESSING_CONFIG, target_size=IMAGE_SIZE):
+    """
+    Hash of everything the stored tensors depend on besides the image.
+
+    Args:
+        config: Preprocessing configuration
+        target_size: Model input size (width, height)
+
+    Returns:
+        str: Hex digest
+    """
+    return config_fingerprint({
+        'processing': config,
+        'target_size': list(target_size),
+        'max_pixels': IMAGE_IO_CONFIG['max_pixels'],
+    })
+
+
+class TensorStore:
+    """A directory of memory-mapped preprocessed images and their index."""
+
+    def __init__(self, directory=None, readonly=False, target_size=IMAGE_SIZE, config=PROCESSING_CONFIG):
+        """
+        Open a store, creating it if needed.
+
+        Args:
+            directory: Store directory (default STORE_CONFIG['directory'])
+            readonly: Open for scoring only; the store must exist and match
+                the current configuration
+            target_size: Model input size (width, height)
+            config: Preprocessing configuration
+
+        Raises:
+            FileNotFoundError: If a read-only store does not exist
+            ValueError: If a read-only store was built with another
+                configuration
+        """
+        self.directory = directory or STORE_CONFIG['directory']
+        self.readonly = readonly
+        self.target_size = tuple(target_size)
+        self.config = config
+        self.fingerprint = store_fingerprint(config, target_size)
+        self.invalidated = False
+
+        target_w, target_h = self.target_size
+        self._row_shape = (target_h, target_w)
+        self._row_bytes = target_h * target_w
+        self._tensors_path = os.path.join(self.directory, TENSORS_FILE)
+        self._index_path = os.path.join(self.directory, INDEX_FILE)
+        self._entries = {}
+        self._hashes = {}
+        self._tensors = None
+        self._capacity = 0
+        self._next_row = 0
+        self._scratch = None
+
+        if readonly:
+            self._open_readonly()
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            self._open_writable()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self._entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def entries(self):
+        """
+        All current entries, in row order.
+
+        Returns:
+            list: StoreEntry for each stored image, failed images last
+        """
+        return sorted(self._entries.values(), key=lambda entry: (entry.row < 0, entry.row))
+
+    def failures(self):
+        """
+        Sources that could not be preprocessed.
+
+        Returns:
+            list: (path, error message) pairs
+        """
+        return [(entry.path, entry.error) for entry in self.entries() if entry.row < 0]
+
+    def tensor(self, path):
+        """
+        The stored uint8 image for a source path.
+
+        Args:
+            path: Source image path
+
+        Returns:
+            numpy.ndarray: View of the memory map, shape (height, width)
+
+        Raises:
+            KeyError: If the path is not stored or failed to preprocess
+        """
+        entry = self._entries[os.path.normpath(path)]
+        if entry.row < 0:
+            raise KeyError(f"{path} could not be preprocessed: {entry.error}")
+        return self._tensors[entry.row]
+
+    def update(self, paths, workers=None, chunk_size=None):
+        """
+        Add new and changed images, and drop deleted ones.
+
+        Args:
+            paths: Iterable of source image paths; consumed lazily
+            workers: Preprocessing threads (default STORE_CONFIG['workers'])
+            chunk_size: Images preprocessed between index writes (default
+                STORE_CONFIG['chunk_size'])
+
+        Returns:
+            dict: added, unchanged, failed and removed counts, and whether
+                the store was invalidated when it was opened
+        """
+        if self.readonly:
+            raise ValueError("Store is open read-only")
+        workers = workers or STORE_CONFIG['workers']
+        chunk_size = chunk_size or STORE_CONFIG['chunk_size']
+        summary = {'added': 0, 'unchanged': 0, 'failed': 0, 'removed': 0,
+                   'invalidated': self.invalidated}
+        seen = set()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='baybayin-store') as executor, \
+                open(self._index_path, 'a', encoding='utf-8') as index:
+            pending = []
+            for path in paths:
+                path = os.path.normpath(path)
+                if path in seen:
+                    continue
+                seen.add(path)
+                work = self._check(path, index, summary)
+                if work is not None:
+                    pending.append(work)
+                if len(pending) >= chunk_size:
+                    self._preprocess(pending, executor, index, summary)
+                    pending = []
+            if pending:
+                self._preprocess(pending, executor, index, summary)
+
+            for path in [path for path in self._entries if not os.path.exists(path)]:
+                self._forget(path)
+                index.write(json.dumps({'path': path, 'removed': True}) + '\n')
+                summary['removed'] += 1
+
+        self._flush()
+        return summary
+
+    def batches(self, batch_size=None, normalize=True):
+        """
+        Iterate over the stored images in row order, batch by batch.
+
+        Rows are read straight from the memory map: consecutive rows are
+        sliced without copying, and normalization writes into one float32
+        buffer reused for every batch.
+
+        Args:
+            batch_size: Images per batch (default STORE_CONFIG['batch_size'])
+            normalize: Yield float32 model input in [0, 1]; False yields the
+                stored uint8 pixels (a view of the memory map when the rows
+                are consecutive)
+
+        Yields:
+            tuple: (entries, batch) where batch has shape (N, height, width, 1)
+                and is overwritten by the next iteration
+        """
+        batch_size = batch_size or STORE_CONFIG['batch_size']
+        stored = [entry for entry in self.entries() if entry.row >= 0]
+        target_h, target_w = self._row_shape
+        output = np.empty((batch_size, target_h, target_w, 1), dtype=np.float32) if normalize else None
+
+        for start in range(0, len(stored), batch_size):
+            chunk = stored[start:start + batch_size]
+            pixels = self._rows([entry.row for entry in chunk])
+            if not normalize:
+                yield chunk, pixels[..., np.newaxis]
+                continue
+            batch = output[:len(chunk)]
+            # Same arithmetic as PreprocessingPipeline.process_into
+            np.divide(pixels, 255.0, out=batch[..., 0], dtype=np.float32)
+            yield chunk, batch
+
+    def close(self):
+        """Flush and unmap the tensor file."""
+        if not self.readonly:
+            self._flush()
+        self._tensors = None
+
+    def _rows(self, rows):
+        """uint8 rows of the memory map, without copying when consecutive"""
+        first, count = rows[0], len(rows)
+        if rows[-1] - first == count - 1 and all(b - a == 1 for a, b in zip(rows, rows[1:])):
+            return self._tensors[first:first + count]
+        if self._scratch is None or len(self._scratch) < count:
+            self._scratch = np.empty((count,) + self._row_shape, dtype=np.uint8)
+        return np.take(self._tensors, rows, axis=0, out=self._scratch[:count])
+
+    def _check(self, path, index, summary):
+        """Skip an unchanged source; returns (path, stat, hash) when it needs preprocessing"""
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            self._record(index, StoreEntry(path, '', 0, 0, -1, str(e)))
+            summary['failed'] += 1
+            return None
+
+        entry = self._entries.get(path)
+        if entry is not None and (entry.size, entry.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            summary['unchanged'] += 1
+            return None
+
+        digest = _file_hash(path)
+        if entry is not None and entry.hash == digest:
+            # Touched but not changed
+            self._record(index, entry._replace(size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+            summary['unchanged'] += 1
+            return None
+        same = self._same_content(digest)
+        if same is not None:
+            # Identical content stored under another path
+            self._record(index, StoreEntry(path, digest, stat.st_size, stat.st_mtime_ns, same.row, same.error))
+            summary['added' if same.row >= 0 else 'failed'] += 1
+            return None
+        return path, stat, digest
+
+    def _preprocess(self, pending, executor, index, summary):
+        """Preprocess a chunk into new rows, then index it"""
+        self._reserve(len(pending))
+        rows = range(self._next_row, self._next_row + len(pending))
+        errors = list(executor.map(self._process_one, [path for path, _, _ in pending], rows))
+        self._next_row += len(pending)
+        # Rows reach the file before the index lines that point at them
+        self._flush()
+
+        for (path, stat, digest), row, error in zip(pending, rows, errors):
+            entry = StoreEntry(path, digest, stat.st_size, stat.st_mtime_ns, -1 if error else row, error)
+            self._record(index, entry)
+            summary['failed' if error else 'added'] += 1
+        index.flush()
+
+    def _process_one(self, path, row):
+        """Decode and preprocess one image into its row; returns an error message or None"""
+        try:
+            with instrumentation.span('decode'):
+                image = open_image(path)
+            self._tensors[row] = get_pipeline(self.target_size).process(image)
+        except Exception as e:
+            return str(e) or type(e).__name__
+        return None
+
+    def _record(self, index, entry):
+        self._remember(entry)
+        index.write(json.dumps(entry._asdict()) + '\n')
+
+    def _remember(self, entry):
+        self._forget(entry.path)
+        self._entries[entry.path] = entry
+        if entry.hash:
+            self._hashes.setdefault(entry.hash, set()).add(entry.path)
+
+    def _forget(self, path):
+        """Drop a path's entry and its place in the content-hash lookup"""
+        entry = self._entries.pop(path, None)
+        if entry is None or not entry.hash:
+            return
+        paths = self._hashes.get(entry.hash)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                del self._hashes[entry.hash]
+
+    def _same_content(self, digest):
+        """A current entry with this content hash, or None"""
+        paths = self._hashes.get(digest)
+        return self._entries[next(iter(paths))] if paths else None
+
+    def _reserve(self, count):
+        """Grow the tensor file so count more rows fit"""
+        needed = self._next_row + count
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2, STORE_CONFIG['batch_size'])
+        self._flush()
+        self._tensors = None
+        with open(self._tensors_path, 'r+b' if os.path.exists(self._tensors_path) else 'w+b') as f:
+            f.truncate(capacity * self._row_bytes)
+        self._map(capacity, 'r+')
+
+    def _flush(self):
+        if isinstance(self._tensors, np.memmap):
+            self._tensors.flush()
+
+    def _map(self, capacity, mode):
+        self._capacity = capacity
+        if capacity:
+            self._tensors = np.memmap(self._tensors_path, dtype=np.uint8, mode=mode,
+                                      shape=(capacity,) + self._row_shape)
+        else:
+            self._tensors = np.empty((0,) + self._row_shape, dtype=np.uint8)
+
+    def _file_capacity(self):
+        try:
+            return os.path.getsize(self._tensors_path) // self._row_bytes
+        except OSError:
+            return 0
+
+    def _open_readonly(self):
+        header = self._load_index()
+        if header is None:
+            raise FileNotFoundError(f"No tensor store in {self.directory}")
+        if header.get('fingerprint') != self.fingerprint:
+            raise ValueError(
+                f"The tensor store in {self.directory} was built with a different preprocessing "
+                "configuration; build it again"
+            )
+        self._map(self._file_capacity(), 'r')
+
+    def _open_writable(self):
+        header = self._load_index()
+        if header is not None and header.get('fingerprint') != self.fingerprint:
+            logger.info("Preprocessing configuration changed; clearing the tensor store in %s",
+                        self.directory)
+            self._entries.clear()
+            self._hashes.clear()
+            self._next_row = 0
+            self.invalidated = True
+            header = None
+        if header is None:
+            with open(self._index_path, 'w', encoding='utf-8') as index:
+                index.write(json.dumps({
+                    'format': FORMAT,
+                    'version': VERSION,
+                    'fingerprint': self.fingerprint,
+                    'target_size': list(self.target_size),
+                }) + '\n')
+            if os.path.exists(self._tensors_path):
+                os.truncate(self._tensors_path, 0)
+        self._map(self._file_capacity(), 'r+')
+
+    def _load_index(self):
+        """Read the index into _entries; returns the header, or None without an index"""
+        try:
+            f = open(self._index_path, encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        with f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                return None
+            if header.get('format') != FORMAT or header.get('version') != VERSION:
+                return None
+            # Rows of removed and replaced entries are never reused, so the
+            # next free row is past every row the index ever pointed at
+            last_row = -1
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interrupted update
+                    continue
+                if record.get('removed'):
+                    self._forget(record['path'])
+                else:
+                    entry = StoreEntry(**record)
+                    self._remember(entry)
+                    last_row = max(last_row, entry.row)
+        self._next_row = last_row + 1
+        return header
+
+
+def _file_hash(path):
+    """Content hash of a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,161 @@
+"""
+Confidence-gated test-time augmentation (TTA).
+
+Predictions whose top-1 confidence falls below TTA_CONFIG['threshold'] are
+re-scored on slightly rotated, rescaled, thickened and thinned copies of the
+preprocessed image, and the probabilities are averaged. All variants of all
+uncertain images are generated together with vectorized numpy ops on the
+model-sized tensors and scored in one batched predict call. Confident
+predictions, the common case, cost nothing beyond a max over each row.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from baybayin import instrumentation
+from config.settings import TTA_CONFIG
+
+# Background value of preprocessed images (black ink on white)
+_BACKGROUND = 1.0
+
+
+class TTAResult(NamedTuple):
+    """Probabilities after TTA, with the rows that were augmented."""
+
+    probabilities: np.ndarray
+    augmented: np.ndarray
+    variants: int
+
+
+def predict_with_tta(model, batch, probabilities=None, config=TTA_CONFIG):
+    """
+    Predict a batch, re-scoring uncertain rows with augmented variants.
+
+    Args:
+        model: Object with a predict(batch) method returning (N, C) probabilities
+        batch: Preprocessed images of shape (N, height, width, 1)
+        probabilities: The plain predictions for batch, if already computed
+        config: TTA parameters (default TTA_CONFIG)
+
+    Returns:
+        TTAResult: Probabilities of shape (N, C), a boolean mask of the
+            augmented rows, and the number of variants scored per augmented row
+    """
+    if probabilities is None:
+        with instrumentation.span('predict', batch.shape):
+            probabilities = np.asarray(model.predict(batch))
+    probabilities = np.asarray(probabilities)
+
+    transforms = variant_transforms(config)
+    uncertain = probabilities.max(axis=1) < config['threshold']
+    if not config['enabled'] or not transforms or not uncertain.any():
+        return TTAResult(probabilities, np.zeros(len(probabilities), dtype=bool), 0)
+
+    with instrumentation.span('tta_augment', batch[uncertain].shape):
+        variants = augment(batch[uncertain], transforms)
+    with instrumentation.span('tta_predict', variants.shape):
+        scores = np.asarray(model.predict(variants))
+
+    # Rows of scores are grouped per image: (images, variants, classes)
+    scores = scores.reshape(int(uncertain.sum()), len(transforms), -1)
+    averaged = probabilities.copy()
+    averaged[uncertain] = (probabilities[uncertain] + scores.sum(axis=1)) / (len(transforms) + 1)
+    return TTAResult(averaged, uncertain, len(transforms))
+
+
+def variant_transforms(config=TTA_CONFIG):
+    """
+    The (angle, scale, stroke) transform of each variant, within the budget.
+
+    Single-parameter variants come first, in the order rotations, scales,
+    strokes. Combinations of rotation and scale fill any remaining budget.
+
+    Args:
+        config: TTA parameters (default TTA_CONFIG)
+
+    Returns:
+        list: (degrees, scale, stroke) tuples; stroke is +1 for thicker
+            and -1 for thinner strokes, 0 for unchanged
+    """
+    transforms = [(float(angle), 1.0, 0) for angle in config['rotations']]
+    transforms += [(0.0, float(scale), 0) for scale in config['scales']]
+    transforms += [(0.0, 1.0, int(stroke)) for stroke in config['strokes']]
+    transforms += [
+        (float(angle), float(scale), 0) for angle in config['rotations'] for scale in config['scales']
+    ]
+    return transforms[:config['max_variants']]
+
+
+def augment(batch, transforms):
+    """
+    Generate the variants of every image in a batch.
+
+    Args:
+        batch: Preprocessed images of shape (N, height, width, 1)
+        transforms: (degrees, scale, stroke) tuples from variant_transforms
+
+    Returns:
+        numpy.ndarray: float32 variants of shape (N * len(transforms), height,
+            width, 1), grouped by image
+    """
+    images = np.asarray(batch, dtype=np.float32)[..., 0]
+    angles, scales, strokes = (np.asarray(values) for values in zip(*transforms))
+
+    variants = _warp(images, np.deg2rad(angles), scales)
+    for stroke in (1, -1):
+        selected = strokes == stroke
+        if selected.any():
+            variants[:, selected] = _stroke_filter(variants[:, selected], stroke)
+
+    return variants.reshape(-1, *images.shape[1:], 1)
+
+
+def _warp(images, angles, scales):
+    """Rotate and scale all images about their centres, bilinearly (N, V, h, w)"""
+    height, width = images.shape[1:]
+    cy, cx = (height - 1) / 2.0, (width - 1) / 2.0
+    dy, dx = np.mgrid[0:height, 0:width].astype(np.float32)
+    dy -= cy
+    dx -= cx
+
+    # Inverse mapping: output pixel -> source position, per variant (V, h, w)
+    cos = (np.cos(angles) / scales)[:, None, None]
+    sin = (np.sin(angles) / scales)[:, None, None]
+    src_x = cos * dx + sin * dy + cx
+    src_y = -sin * dx + cos * dy + cy
+
+    x0 = np.floor(src_x).astype(np.intp)
+    y0 = np.floor(src_y).astype(np.intp)
+    fx = (src_x - x0).astype(np.float32)
+    fy = (src_y - y0).astype(np.float32)
+
+    # Pad with background so out-of-range taps read white
+    padded = np.pad(images, ((0, 0), (1, 1), (1, 1)), constant_values=_BACKGROUND)
+    x0 = np.clip(x0 + 1, 0, width)
+    y0 = np.clip(y0 + 1, 0, height)
+    x1, y1 = np.minimum(x0 + 1, width + 1), np.minimum(y0 + 1, height + 1)
+
+    top = padded[:, y0, x0] * (1 - fx) + padded[:, y0, x1] * fx
+    bottom = padded[:, y1, x0] * (1 - fx) + padded[:, y1, x1] * fx
+    return (top * (1 - fy) + bottom * fy).astype(np.float32)
+
+
+def _stroke_filter(images, stroke):
+    """Thicken (+1) or thin (-1) dark strokes with a 4-neighbour min/max filter"""
+    height, width = images.shape[-2:]
+    padded = np.pad(
+        images, [(0, 0)] * (images.ndim - 2) + [(1, 1), (1, 1)], constant_values=_BACKGROUND
+    )
+    neighbours = (
+        padded[..., 1:-1, 1:-1],
+        padded[..., :-2, 1:-1], padded[..., 2:, 1:-1],
+        padded[..., 1:-1, :-2], padded[..., 1:-1, 2:],
+    )
+    if stroke > 0:
+        return np.minimum.reduce(neighbours)
+
+    thinned = np.maximum.reduce(neighbours)
+    # Keep the original where thinning would erase the character entirely
+    empty = thinned.reshape(*thinned.shape[:-2], height * width).min(axis=-1) >= 0.5
+    thinned[empty] = images[empty]
+    return thinned
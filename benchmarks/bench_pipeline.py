@@ -0,0 +1,370 @@
+"""
+Benchmarks for the preprocessing pipeline and the inference path.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--repeats 20] [--json results.json]
+    python -m benchmarks.bench_pipeline --compare baseline.json --tolerance 0.25
+
+Preprocessing is timed stage by stage on synthetic characters at several
+input resolutions and on the sample images in assets/. Inference is timed
+across batch sizes on a randomly initialised stand-in CNN with the real
+model's input and output shapes, so no trained .h5 is needed. All random
+inputs are seeded, so runs are comparable across machines and commits.
+"""
+import argparse
+import collections
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from baybayin.preprocessing import PreprocessingPipeline, preprocess_batch
+from config.settings import BAYBAYIN_CATEGORIES, IMAGE_SIZE
+
+# Synthetic input resolutions as (name, width, height, channels)
+SYNTHETIC_INPUTS = [
+    ('phone_photo_4000x3000', 4000, 3000, 3),
+    ('photo_1600x1200', 1600, 1200, 3),
+    ('canvas_500x500', 500, 500, 4),
+    ('tiny_crop_48x48', 48, 48, 1),
+]
+
+SAMPLE_PATTERNS = ('assets/good_example_*', 'assets/bad_example_*')
+
+BATCH_SIZES = (1, 8, 32, 128)
+
+
+def make_synthetic_character(width, height, channels, seed=0):
+    """
+    Draw a random handwritten-looking glyph on a noisy light background.
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        channels: 1 (gray), 3 (RGB) or 4 (RGBA, like the drawing canvas)
+        seed: Random seed
+
+    Returns:
+        numpy.ndarray: uint8 image of shape (height, width[, channels])
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width), 235, dtype=np.uint8)
+    image = cv2.add(image, rng.normal(0, 8, image.shape).astype(np.int8), dtype=cv2.CV_8U)
+
+    size = min(width, height)
+    thickness = max(1, size // 40)
+    center = np.array([width / 2, height / 2])
+    for _ in range(3):
+        points = center + rng.uniform(-0.3, 0.3, (6, 2)) * size
+        cv2.polylines(image, [points.astype(np.int32)], False, 20, thickness, cv2.LINE_AA)
+    # Kudlit-like mark
+    mark = center + np.array([0, -0.35 * size])
+    cv2.circle(image, tuple(int(v) for v in mark), max(1, thickness), 20, -1)
+
+    if channels == 1:
+        return image
+    if channels == 3:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2RGBA)
+
+
+def load_input_sets():
+    """
+    Build the named input sets used by the preprocessing benchmark.
+
+    Returns:
+        dict: Input set name -> list of images
+    """
+    input_sets = {}
+    for name, width, height, channels in SYNTHETIC_INPUTS:
+        input_sets[name] = [make_synthetic_character(width, height, channels, seed) for seed in range(3)]
+
+    samples = []
+    for pattern in SAMPLE_PATTERNS:
+        for path in sorted(glob.glob(pattern)):
+            with Image.open(path) as image:
+                samples.append(np.array(image.convert('RGB')))
+    if samples:
+        input_sets['assets_samples'] = samples
+    return input_sets
+
+
+def bench_stages(images, repeats):
+    """
+    Time every preprocessing stage on each image.
+
+    Args:
+        images: Input images
+        repeats: Timed passes over the images (after one warm-up pass)
+
+    Returns:
+        dict: Per-stage latency percentiles in milliseconds, end-to-end
+            latency and images/sec
+    """
+    timings = collections.defaultdict(list)
+    totals = []
+
+    for repeat in range(repeats + 1):
+        for image in images:
+            started = time.perf_counter()
+            stage_timings = _run_stages(image)
+            if repeat:
+                totals.append(time.perf_counter() - started)
+                for name, seconds in stage_timings:
+                    timings[name].append(seconds)
+
+    totals = np.asarray(totals)
+    return {
+        'stages_ms': {name: _percentiles(values) for name, values in timings.items()},
+        'total_ms': _percentiles(totals),
+        'images_per_sec': float(len(totals) / totals.sum()),
+    }
+
+
+def _run_stages(image, pipeline=None):
+    """Run the pipeline on one image, returning (stage, seconds) pairs"""
+    pipeline = pipeline or _pipeline
+    timings = []
+    for name, stage in pipeline.stages:
+        started = time.perf_counter()
+        image = stage(image)
+        timings.append((name, time.perf_counter() - started))
+    return timings
+
+
+# Pipeline reused across runs, as the app reuses its per-thread pipeline
+_pipeline = PreprocessingPipeline(target_size=IMAGE_SIZE)
+
+
+def measure_peak_memory(images):
+    """
+    Peak Python-tracked memory while preprocessing a batch of images.
+
+    Args:
+        images: Input images
+
+    Returns:
+        float: Peak traced allocation in MiB (NumPy and OpenCV outputs;
+            OpenCV's internal scratch buffers are not visible to tracemalloc)
+    """
+    tracemalloc.start()
+    try:
+        preprocess_batch(images)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def build_stand_in_model():
+    """
+    Build a randomly initialised CNN with the real model's input and output shapes.
+
+    Returns:
+        tuple: (name, predict function) for a Keras CNN, or for a NumPy
+            dense layer when TensorFlow is not installed
+    """
+    width, height = IMAGE_SIZE
+    num_classes = len(BAYBAYIN_CATEGORIES)
+    try:
+        import tensorflow as tf
+    except ImportError:
+        rng = np.random.default_rng(0)
+        weights = rng.normal(0, 0.01, (width * height, num_classes)).astype(np.float32)
+
+        def predict(batch):
+            logits = batch.reshape(len(batch), -1) @ weights
+            logits -= logits.max(axis=1, keepdims=True)
+            scores = np.exp(logits)
+            return scores / scores.sum(axis=1, keepdims=True)
+        return 'numpy_dense_stand_in', predict
+
+    tf.keras.utils.set_random_seed(0)
+    layers = tf.keras.layers
+    model = tf.keras.Sequential([
+        tf.keras.Input((height, width, 1)),
+        layers.Conv2D(32, 3, activation='relu', padding='same'),
+        layers.MaxPooling2D(),
+        layers.Conv2D(64, 3, activation='relu', padding='same'),
+        layers.MaxPooling2D(),
+        layers.Conv2D(128, 3, activation='relu', padding='same'),
+        layers.MaxPooling2D(),
+        layers.Flatten(),
+        layers.Dense(256, activation='relu'),
+        layers.Dropout(0.5),
+        layers.Dense(num_classes, activation='softmax'),
+    ])
+    return 'keras_cnn_stand_in', model.predict_on_batch
+
+
+def bench_inference(predict, repeats, batch_sizes=BATCH_SIZES):
+    """
+    Time model calls across batch sizes.
+
+    Args:
+        predict: Function mapping an (N, height, width, 1) batch to probabilities
+        repeats: Timed calls per batch size (after one warm-up call)
+        batch_sizes: Batch sizes to measure
+
+    Returns:
+        dict: Batch size -> latency percentiles per call and images/sec
+    """
+    width, height = IMAGE_SIZE
+    rng = np.random.default_rng(0)
+    results = {}
+    for batch_size in batch_sizes:
+        batch = rng.random((batch_size, height, width, 1), dtype=np.float32)
+        predict(batch)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            predict(batch)
+            timings.append(time.perf_counter() - started)
+        timings = np.asarray(timings)
+        results[str(batch_size)] = {
+            'latency_ms': _percentiles(timings),
+            'images_per_sec': float(batch_size * len(timings) / timings.sum()),
+        }
+    return results
+
+
+def run(repeats, inference_repeats, skip_inference=False):
+    """
+    Run the full benchmark suite.
+
+    Args:
+        repeats: Timed passes per preprocessing input set
+        inference_repeats: Timed calls per inference batch size
+        skip_inference: Only benchmark preprocessing
+
+    Returns:
+        dict: Environment description and all measurements
+    """
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+        },
+        'preprocessing': {},
+    }
+
+    for name, images in load_input_sets().items():
+        print(f"Preprocessing: {name} ({len(images)} images)", file=sys.stderr)
+        result = bench_stages(images, repeats)
+        result['peak_memory_mib'] = measure_peak_memory(images)
+        results['preprocessing'][name] = result
+
+    if not skip_inference:
+        model_name, predict = build_stand_in_model()
+        print(f"Inference: {model_name}", file=sys.stderr)
+        results['inference'] = {'model': model_name, 'batches': bench_inference(predict, inference_repeats)}
+
+    results['max_rss_mib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Find measurements that got slower than a baseline run.
+
+    Only p50 latencies are compared; they are the most stable across runs.
+
+    Args:
+        results: Results of this run
+        baseline: Results of an earlier run
+        tolerance: Allowed relative slowdown (0.25 = 25%)
+
+    Returns:
+        list: Human-readable regression descriptions
+    """
+    regressions = []
+
+    def check(label, current, previous):
+        if previous > 0 and current > previous * (1 + tolerance):
+            regressions.append(f"{label}: {previous:.3f} ms -> {current:.3f} ms (+{current / previous - 1:.0%})")
+
+    for name, result in results['preprocessing'].items():
+        previous = baseline.get('preprocessing', {}).get(name)
+        if previous is None:
+            continue
+        check(f"{name} total", result['total_ms']['p50'], previous['total_ms']['p50'])
+        for stage, stats in result['stages_ms'].items():
+            if stage in previous['stages_ms']:
+                check(f"{name} {stage}", stats['p50'], previous['stages_ms'][stage]['p50'])
+
+    previous_batches = baseline.get('inference', {}).get('batches', {})
+    for batch_size, stats in results.get('inference', {}).get('batches', {}).items():
+        if batch_size in previous_batches:
+            check(f"inference batch {batch_size}", stats['latency_ms']['p50'],
+                  previous_batches[batch_size]['latency_ms']['p50'])
+    return regressions
+
+
+def format_report(results):
+    """Render results as a plain-text report"""
+    lines = []
+    for name, result in results['preprocessing'].items():
+        lines.append(f"\n== {name}: {result['images_per_sec']:.1f} images/sec, "
+                     f"peak {result['peak_memory_mib']:.1f} MiB")
+        lines.append(f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, stats in list(result['stages_ms'].items()) + [('TOTAL', result['total_ms'])]:
+            lines.append(f"{stage:<22}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}")
+
+    if 'inference' in results:
+        lines.append(f"\n== inference ({results['inference']['model']})")
+        lines.append(f"{'batch':<8}{'p50 ms':>10}{'p95 ms':>10}{'images/sec':>14}")
+        for batch_size, stats in results['inference']['batches'].items():
+            latency = stats['latency_ms']
+            lines.append(f"{batch_size:<8}{latency['p50']:>10.3f}{latency['p95']:>10.3f}"
+                         f"{stats['images_per_sec']:>14.1f}")
+
+    lines.append(f"\nmax RSS: {results['max_rss_mib']:.1f} MiB")
+    return "\n".join(lines)
+
+
+def _percentiles(seconds):
+    """p50/p95/p99 of a list of durations in seconds, in milliseconds"""
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000.0, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=10, help="Timed passes per preprocessing input set")
+    parser.add_argument("--inference-repeats", type=int, default=20, help="Timed calls per batch size")
+    parser.add_argument("--skip-inference", action="store_true", help="Only benchmark preprocessing")
+    parser.add_argument("--json", help="Write raw results to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative p50 slowdown")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeats, args.inference_repeats, args.skip_inference)
+    print(format_report(results))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:", *regressions, sep="\n  ")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
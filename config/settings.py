@@ -4,7 +4,8 @@
 NAV_OPTIONS = [
     ("🏠", "Home", "home"),
     ("🖼️", "Image Upload", "image_upload"), 
-    ("✏️", "Drawing Canvas", "drawing_canvas")
+    ("✏️", "Drawing Canvas", "drawing_canvas"),
+    ("🗂️", "Batch Upload", "batch_upload")
 ]
 
 SOCIAL_LINKS = {
@@ -25,6 +26,78 @@ PAGE_CONFIG = {
 MODEL_PATH = 'models/baybayin_classifier.h5'
 IMAGE_SIZE = (64, 64)
 
+# Inference engine configuration
+# 'keras' runs the .h5 with TensorFlow; 'tflite' and 'onnx' run a model
+# converted once with `python -m baybayin convert`
+INFERENCE_CONFIG = {
+    'engine': 'keras',
+    'model_paths': {
+        'keras': MODEL_PATH,
+        'tflite': 'models/baybayin_classifier.tflite',
+        'onnx': 'models/baybayin_classifier.onnx'
+    },
+    'num_threads': None,
+    # Load the model and run a dummy prediction in the background when the
+    # app starts, instead of on the first classification
+    'warmup_on_start': True
+}
+
+# Two-stage cascade: a small fast model answers confident inputs, the rest
+# go to the full model (baybayin.cascade; train it with `python -m baybayin distill`)
+CASCADE_CONFIG = {
+    'enabled': False,
+    'fast_engine': 'keras',
+    'fast_model_path': 'models/baybayin_classifier_small.h5',
+    'threshold': 0.9,           # top-1 confidence the fast model needs to answer
+    'student_width': 16         # filters in the first layer of a distilled model
+}
+
+# Micro-batching of predictions across concurrent sessions
+BATCHING_CONFIG = {
+    'enabled': True,
+    'max_batch_size': 32,
+    'max_wait_ms': 5
+}
+
+# Shared model server for several app processes on one host (baybayin.model_server)
+MODEL_SERVER_CONFIG = {
+    # get_model() sends predictions to the server started with
+    # `python -m baybayin model-server`, running the model in-process
+    # while the server is unavailable
+    'enabled': False,
+    'socket_path': '/tmp/baybayin-model.sock',
+    'pool_size': 4,                          # idle connections kept per process
+    'timeout': 30.0,                         # seconds per request
+    'retry_interval': 5.0,                   # seconds before retrying an unavailable server
+    'max_request_bytes': 64 * 1024 * 1024    # largest batch payload the server accepts
+}
+
+# Test-time augmentation for low-confidence predictions (baybayin.tta)
+TTA_CONFIG = {
+    'enabled': False,
+    'threshold': 0.6,           # re-score predictions whose top-1 confidence is below this
+    'rotations': (-8, 8),       # degrees
+    'scales': (0.9, 1.1),
+    'strokes': (1, -1),         # thicker and thinner strokes (1 px)
+    'max_variants': 6           # variants scored per uncertain image
+}
+
+# Cache of preprocessing and prediction results, shared by all sessions
+CACHE_CONFIG = {
+    'max_entries': 1024,
+    'max_bytes': 64 * 1024 * 1024,
+    'ttl_seconds': 3600
+}
+
+# Per-stage timing of preprocessing and inference
+# 'sink' is one of 'logging', 'histogram' or 'prometheus'; 'debug_panel'
+# shows the timings of each classification on the pages (and enables tracing)
+INSTRUMENTATION_CONFIG = {
+    'enabled': False,
+    'sink': 'histogram',
+    'debug_panel': False
+}
+
 # Baybayin character categories
 BAYBAYIN_CATEGORIES = [
     'a', 'b', 'ba', 'be_bi', 'bo_bu', 'd', 'da_ra', 'de_di', 'do_du', 'e_i',
@@ -45,7 +118,107 @@ PROCESSING_CONFIG = {
         'medium': (3, 3)
     },
     'crop_padding': 5,
-    'thickness_threshold': 0.3
+    'thickness_threshold': 0.3,
+    # Inputs larger than max(IMAGE_SIZE) * working_scale are cropped to the
+    # character and downsampled before filtering (see downscale_oversized)
+    'downscale': {
+        'enabled': True,
+        'working_scale': 8,
+        'coarse_size': 256,
+        'crop_margin': 0.15
+    }
+}
+
+# Decoding of uploaded and batch image files (baybayin.image_io)
+IMAGE_IO_CONFIG = {
+    'max_pixels': 2048 * 2048,       # larger images are downsampled while decoding
+    'max_page_pixels': 4096 * 4096,  # budget for whole pages read by segmentation
+    'preview_size': 350              # longest side of the preview kept per upload
+}
+
+# Pre-flight quality checks for uploaded images (baybayin.quality)
+QUALITY_CONFIG = {
+    'enabled': True,
+    'analysis_size': 128,          # longest side of the copy the checks run on
+    'min_contrast': 32,            # gray levels between background and ink
+    'min_sharpness': 0.08,         # edge Laplacian relative to the contrast
+    'ink_ratio': (0.002, 0.3),     # share of the image covered by ink
+    'max_background_noise': 0.2,   # share of textured background pixels
+    'max_specks': 4,               # ink blobs of at most 3 pixels
+    'max_components': 2,           # ink blobs holding at least 5% of the ink
+    # Issues that stop an image before preprocessing; the others only warn
+    'reject': ('blank', 'low_contrast', 'blurry', 'noisy', 'too_much_ink'),
+}
+
+# Page segmentation into glyphs (ratios are relative to the typical glyph)
+SEGMENTATION_CONFIG = {
+    'max_page_side': 2048,      # larger pages are downsampled before binarization
+    'min_area_ratio': 0.05,     # components smaller than this x median area are noise
+    'mark_size_ratio': 0.4,     # components smaller than this x glyph height are marks (kudlit)
+    'mark_max_gap': 0.8,        # max vertical distance from a mark to its glyph, x glyph height
+    'mark_max_offset': 1.0,     # max horizontal offset of a mark outside its glyph, x half width
+    'fragment_overlap': 0.5,    # stroke fragments overlapping this much horizontally merge...
+    'fragment_gap': 0.25,       # ...when the vertical gap is below this x the shorter height
+    'line_overlap': 0.5         # vertical overlap needed to join a text line
+}
+
+# Drawing canvas vector path: strokes from the canvas JSON are rasterized
+# straight into a working raster of max(IMAGE_SIZE) * working_scale pixels
+CANVAS_CONFIG = {
+    'vector_strokes': True,
+    'working_scale': 4,
+    'curve_steps': 4            # line segments per Bezier curve segment
+}
+
+# Process-pool preprocessing for large batch jobs (baybayin.parallel)
+PARALLEL_CONFIG = {
+    'workers': None,            # worker processes (None: one per CPU)
+    'chunk_size': 16,           # images per task sent to a worker
+    'retries': 1,               # extra attempts on I/O errors and crashed workers
+    'start_method': 'spawn'     # fresh interpreters; safe with TensorFlow loaded in the parent
+}
+
+# Live as-you-draw classification on the drawing canvas
+LIVE_CONFIG = {
+    'debounce_ms': 250,         # quiet time after the last stroke change
+    'max_delay_ms': 1000,       # longest a continuously changing drawing waits
+    'workers': 4,               # preprocessing threads shared by all sessions
+    'poll_interval': 0.5        # seconds between result refreshes on the page
+}
+
+# Batch upload page: many files classified in one go (baybayin.bulk)
+BULK_CONFIG = {
+    'batch_size': 32,           # files per model call
+    'workers': 4,               # decoding and preprocessing threads shared by all sessions
+    'page_size': 25             # result rows per table page
+}
+
+# HTTP API (python -m baybayin serve)
+SERVER_CONFIG = {
+    'host': '0.0.0.0',
+    'port': 8080,
+    'max_in_flight': 64,        # requests processed at once; more get 503
+    'request_timeout': 10.0,    # seconds per request; slower ones get 504
+    'workers': None,            # preprocessing threads (None: Python's default)
+    'max_batch_images': 256,    # images per /classify/batch request
+    'max_body_bytes': 64 * 1024 * 1024,
+    'top_k': 5
+}
+
+# Display-sized copies of the static images (baybayin.assets)
+ASSET_CONFIG = {
+    'max_width': 1460,          # Streamlit's widest image; it downsizes wider ones on every rerun
+    'jpeg_quality': 85,
+    'png_colors': 256,          # palette size for PNG copies (None: keep full colour)
+    'prerender_on_start': True  # render all page images in the background at startup
+}
+
+# Preprocessed-tensor store for re-scoring datasets (python -m baybayin store)
+STORE_CONFIG = {
+    'directory': 'data/tensor_store',
+    'batch_size': 256,          # images per model call when scoring
+    'chunk_size': 512,          # images preprocessed between index writes
+    'workers': 4                # decoding and preprocessing threads
 }
 
 # UI Configuration
@@ -53,7 +226,9 @@ UI_CONFIG = {
     'upload_image_width': 350,
     'processed_image_width': 350,
     'canvas_size': {'width': 500, 'height': 500},
-    'drawing_canvas_image_width': 310
+    'drawing_canvas_image_width': 310,
+    'sidebar_logo_width': 336,
+    'reference_chart_width': 480
 }
 
 # Asset paths
@@ -64,6 +239,20 @@ ASSET_PATHS = {
     'reference': 'assets/reference.png'
 }
 
+# Example images on the upload page: (path, caption, display width)
+EXAMPLE_IMAGES = {
+    'good': [
+        ('assets/good_example_1.jpg', "Clear, centered, white background", 256),
+        ('assets/good_example_2.png', "High contrast, single character", 256),
+        ('assets/good_example_3.jpg', "Properly cropped, no noise", 256),
+    ],
+    'bad': [
+        ('assets/bad_example_1.jpg', "Noisy/blurred image", 256),
+        ('assets/bad_example_2.png', "Fake PNG (checkerboard bg)", 256),
+        ('assets/bad_example_3.jpg', "Uniquely written Baybayin characters", 190),
+    ]
+}
+
 # External links
 EXTERNAL_LINKS = {
     'thesis_paper': 'https://papers.ssrn.com/sol3/papers.cfm?abstract_id=4004853'
@@ -1,10 +1,18 @@
+import importlib
 import streamlit as st
-from page import home, image_upload, drawing_canvas
-from config.settings import NAV_OPTIONS, PAGE_CONFIG
+from baybayin import startup
+from utils.assets import show_asset, start_prerender
+from config.settings import ASSET_CONFIG, ASSET_PATHS, INFERENCE_CONFIG, NAV_OPTIONS, PAGE_CONFIG, UI_CONFIG
 
 # Configure the page
 st.set_page_config(**PAGE_CONFIG)
 
+# Load the model in the background while the first page renders
+if INFERENCE_CONFIG['warmup_on_start']:
+    startup.start_warmup()
+if ASSET_CONFIG['prerender_on_start']:
+    start_prerender()
+
 def main():
     # Initialize query params and session state
     query_params = st.query_params
@@ -22,7 +30,7 @@ def main():
             st.session_state.current_page = query_params.page
     
     # Sidebar navigation
-    st.sidebar.image("assets/mainLogo.png", use_container_width=True)
+    show_asset(ASSET_PATHS['logo'], max_width=UI_CONFIG['sidebar_logo_width'], container=st.sidebar)
     st.sidebar.title("Navigation")
     
     # Navigation buttons
@@ -37,13 +45,12 @@ def main():
     
     st.sidebar.divider()
     
-    # Route to appropriate page
-    if st.session_state.current_page == "home":
-        home.show()
-    elif st.session_state.current_page == "image_upload":
-        image_upload.show()
-    elif st.session_state.current_page == "drawing_canvas":
-        drawing_canvas.show()
+    # Route to appropriate page; pages are imported on first visit so the
+    # home page does not wait for the classification pages' dependencies
+    page_keys = [page_key for _, _, page_key in NAV_OPTIONS]
+    if st.session_state.current_page in page_keys:
+        importlib.import_module(f"page.{st.session_state.current_page}").show()
+    startup.mark('first_paint')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,35 +1,103 @@
 import streamlit as st
-import tensorflow as tf
-from tensorflow.keras.optimizers.schedules import CosineDecay
-from config.settings import MODEL_PATH
+from baybayin import startup
+from baybayin.batching import get_scheduler
+from baybayin.exceptions import ModelLoadError
+from baybayin.model import get_cascade, get_model as get_core_model
+from config.settings import BATCHING_CONFIG, CASCADE_CONFIG, MODEL_SERVER_CONFIG
 
-@st.cache_resource
 def load_baybayin_model():
     """
     Load the trained Baybayin classifier model.
-    Uses Streamlit's cache_resource decorator for efficient loading.
+    The model is cached process-wide by the core package, so this is cheap
+    after the first call. With CASCADE_CONFIG enabled this is the cascade
+    of the small first-stage model and the full model.
     
     Returns:
-        tensorflow.keras.Model: Loaded Baybayin classifier model
+        baybayin.engines.InferenceEngine or baybayin.cascade.CascadeEngine:
+            Loaded Baybayin classifier engine
     """
     try:
-        # Register the CosineDecay schedule as a custom object
-        model = tf.keras.models.load_model(
-            MODEL_PATH,
-            custom_objects={'CosineDecay': CosineDecay}
-        )
-        return model
-    except Exception as e:
-        st.error(f"Error loading model: {str(e)}")
-        st.error(f"Make sure the model file exists at: {MODEL_PATH}")
+        return get_core_model()
+    except ModelLoadError as e:
+        st.error(f"Error loading model: {e.reason}")
+        st.error(f"Make sure the model file exists at: {e.model_path}")
         st.error("If using custom learning rate schedules, they must be registered.")
         return None
 
+def wait_for_model():
+    """
+    Check whether the background warm-up has finished, without blocking.
+    While the model is still loading, shows a warming-up notice that
+    reruns the page once the model is ready.
+    
+    Returns:
+        bool: True if the model can be requested (loaded, or failed to load
+            so that get_model reports the error), False while warming up
+    """
+    startup.start_warmup()
+    if startup.warmup_status() != 'loading':
+        return True
+    
+    st.info("⏳ The model is warming up. This page will update as soon as it is ready.")
+    _rerun_when_warm()
+    return False
+
+@st.fragment(run_every=1.0)
+def _rerun_when_warm():
+    """Poll the warm-up and rerun the whole page when it finishes"""
+    if startup.warmup_status() != 'loading':
+        st.rerun()
+
 def get_model():
     """
     Get the loaded model instance.
+    When micro-batching is enabled, predictions from all sessions go through
+    the shared scheduler, which has the same predict method as the model.
+    
+    Returns:
+        baybayin.engines.InferenceEngine, baybayin.batching.BatchScheduler or None:
+            The model to predict with, or None if loading failed
+    """
+    model = load_baybayin_model()
+    if model is None or not BATCHING_CONFIG['enabled']:
+        return model
+    return get_scheduler()
+
+def get_cascade_metrics():
+    """
+    Escalation rate and latency split of the model cascade.
+    
+    Returns:
+        dict or None: CascadeEngine.metrics(), or None when the cascade is
+            disabled or could not be loaded
+    """
+    if not CASCADE_CONFIG['enabled']:
+        return None
+    try:
+        if MODEL_SERVER_CONFIG['enabled']:
+            # The cascade runs in the model server
+            info = get_core_model().server_info()
+            return info['cascade'] if info else None
+        return get_cascade().metrics()
+    except ModelLoadError:
+        return None
+
+def get_batching_metrics():
+    """
+    Batch sizes and queue waits of the micro-batching scheduler.
     
     Returns:
-        tensorflow.keras.Model or None: The loaded model or None if loading failed
+        dict or None: BatchScheduler.metrics() of the scheduler that batches
+            predictions (the model server's when it is enabled), or None
+            when batching is disabled or the model could not be loaded
     """
-    return load_baybayin_model()
\ No newline at end of file
+    try:
+        if MODEL_SERVER_CONFIG['enabled']:
+            # Requests from all worker processes are batched in the server
+            info = get_core_model().server_info()
+            return info['batching'] if info else None
+        if not BATCHING_CONFIG['enabled']:
+            return None
+        return get_scheduler().metrics()
+    except ModelLoadError:
+        return None
@@ -0,0 +1,131 @@
+import csv
+import io
+import streamlit as st
+from models.model_loader import get_model, wait_for_model
+from baybayin import instrumentation
+from baybayin.bulk import classify_files
+from utils.debug_panel import show_timings
+from config.settings import BULK_CONFIG
+
+TOP_K = 5
+
+
+def show():
+    """Display the batch upload page"""
+    st.header("Batch Classification")
+    st.caption("Upload many images of Baybayin characters (e.g. crops from a worksheet), "
+               "then click 'Classify' to classify them all and download the results.")
+    model_ready = wait_for_model()
+
+    uploaded_files = st.sidebar.file_uploader(
+        "Choose images...",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        key="batch_uploader"
+    )
+
+    if not uploaded_files:
+        st.info("Upload one or more images in the sidebar to get started.")
+        return
+
+    # Results belong to one set of uploaded files
+    signature = tuple(uploaded_file.file_id for uploaded_file in uploaded_files)
+    results = st.session_state.get('batch_results')
+    if results is not None and results['signature'] != signature:
+        results = st.session_state['batch_results'] = None
+
+    if st.sidebar.button(f"Classify {len(uploaded_files)} images", disabled=not model_ready):
+        results = _classify_files(uploaded_files, signature)
+
+    if results is None:
+        st.write(f"{len(uploaded_files)} images ready to classify.")
+        return
+
+    _show_results(results['rows'])
+
+
+def _classify_files(uploaded_files, signature):
+    """Classify the files batch by batch, streaming rows into the table"""
+    model = get_model()
+    if model is None:
+        st.error("Model not available. Please check the model file.")
+        return None
+
+    total = len(uploaded_files)
+    progress = st.progress(0.0, text=f"Classifying {total} images...")
+    table = st.empty()
+    rows = []
+
+    # getvalue() returns the uploaded bytes; each file is decoded once, on the pool
+    files = ((uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files)
+    with instrumentation.trace() as timings:
+        for batch in classify_files(files, model, top_k=TOP_K):
+            rows.extend(_to_row(result) for result in batch)
+            progress.progress(len(rows) / total, text=f"Classified {len(rows)} of {total} images")
+            table.dataframe(rows[-BULK_CONFIG['page_size']:], use_container_width=True, hide_index=True)
+
+    failed = sum(1 for row in rows if row['Error'])
+    progress.progress(1.0, text=f"Classified {total - failed} images ({failed} failed)")
+    table.empty()
+    show_timings(timings)
+
+    results = {'signature': signature, 'rows': rows}
+    st.session_state['batch_results'] = results
+    st.session_state.pop('batch_page', None)
+    return results
+
+
+def _to_row(result):
+    """Flatten one result into a table row"""
+    if result.error is not None:
+        return {'File': result.name, 'Prediction': '', 'Confidence': None,
+                'Other predictions': '', 'Error': result.error}
+    return {
+        'File': result.name,
+        'Prediction': result.labels[0],
+        'Confidence': round(result.probabilities[0] * 100, 2),
+        'Other predictions': ", ".join(
+            f"{label} ({confidence * 100:.1f}%)"
+            for label, confidence in zip(result.labels[1:], result.probabilities[1:])
+        ),
+        'Error': '',
+    }
+
+
+def _show_results(rows):
+    """Display one page of results and the CSV download"""
+    page_size = BULK_CONFIG['page_size']
+    pages = max(1, -(-len(rows) // page_size))
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.subheader(f"Results ({len(rows)} images)")
+    with col2:
+        st.download_button(
+            "⬇️ Download CSV",
+            data=_to_csv(rows),
+            file_name="baybayin_predictions.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1,
+                           key="batch_page") if pages > 1 else 1
+    start = (page - 1) * page_size
+    st.dataframe(
+        rows[start:start + page_size],
+        use_container_width=True,
+        hide_index=True,
+        column_config={'Confidence': st.column_config.NumberColumn("Confidence (%)", format="%.2f")}
+    )
+    if pages > 1:
+        st.caption(f"Page {page} of {pages}")
+
+
+def _to_csv(rows):
+    """Encode the result rows as CSV"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0].keys()) if rows else ['File'])
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
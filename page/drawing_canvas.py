@@ -1,15 +1,25 @@
 import streamlit as st
 import numpy as np
 from streamlit_drawable_canvas import st_canvas
-from models.model_loader import get_model
-from utils.image_processing import process_canvas_drawing
-from config.settings import BAYBAYIN_CATEGORIES, UI_CONFIG, ASSET_PATHS
+from models.model_loader import get_model, wait_for_model
+from utils.debug_panel import show_timings
+from utils.image_processing import process_canvas_drawing, process_canvas_strokes
+from baybayin import instrumentation, startup
+from baybayin.cache import get_prediction_cache, make_cache_key
+from baybayin.canvas import StrokeRasterizer, process_canvas
+from baybayin.live import LiveClassifier
+from baybayin.results import decode_top_k
+from baybayin.tta import predict_with_tta
+from utils.assets import show_asset
+from config.settings import UI_CONFIG, ASSET_PATHS, CANVAS_CONFIG, LIVE_CONFIG
 
 
 def show():
     """Display the drawing canvas page"""
     st.header("Draw Baybayin Character")
-    st.caption("Draw a Baybayin character in the canvas below and click 'Classify' to predict the character.")
+    st.caption("Draw a Baybayin character in the canvas below and click 'Classify' to predict the character, "
+               "or turn on live classification in the sidebar.")
+    model_ready = wait_for_model()
 
     # Configure canvas settings in sidebar
     canvas_config = _setup_canvas_sidebar()
@@ -20,10 +30,13 @@ def show():
     # Display canvas and handle drawing
     with canvas_col:
         canvas_result = _display_canvas(canvas_config)
-        predict_btn = st.button('Classify Drawing')
+        predict_btn = False if canvas_config['live'] else st.button('Classify Drawing', disabled=not model_ready)
     
-    # Handle prediction
-    _handle_prediction(predict_btn, canvas_result, processed_col, results_col)
+    # Handle prediction once the model has warmed up
+    if model_ready and canvas_config['live']:
+        _handle_live_prediction(canvas_result, canvas_config, processed_col, results_col)
+    elif model_ready:
+        _handle_prediction(predict_btn, canvas_result, canvas_config, processed_col, results_col)
     
     # Show reference chart
     _show_reference_chart()
@@ -47,12 +60,16 @@ def _setup_canvas_sidebar():
     stroke_color = col1.color_picker("Stroke color", "#000000")
     bg_color = col2.color_picker("Background color", "#F9F9F9")
     
+    live = st.sidebar.toggle("Live classification", value=False,
+                             help="Classify in the background while you draw")
+    
     return {
         'drawing_mode': drawing_mode,
         'stroke_width': stroke_width,
         'point_display_radius': point_display_radius,
         'stroke_color': stroke_color,
-        'bg_color': bg_color
+        'bg_color': bg_color,
+        'live': live
     }
 
 
@@ -78,7 +95,7 @@ def _display_canvas(config):
     return canvas_result
 
 
-def _handle_prediction(predict_btn, canvas_result, processed_col, results_col):
+def _handle_prediction(predict_btn, canvas_result, canvas_config, processed_col, results_col):
     """Handle the prediction process"""
     # Initialize session state
     if 'predict_btn' not in st.session_state:
@@ -88,67 +105,174 @@ def _handle_prediction(predict_btn, canvas_result, processed_col, results_col):
         st.session_state['predict_btn'] = True
 
     if st.session_state['predict_btn'] and canvas_result.image_data is not None:
-        _classify_drawing(canvas_result.image_data, processed_col, results_col)
+        _classify_drawing(canvas_result, canvas_config, processed_col, results_col)
+
+
+def _rasterize_strokes(canvas_result, canvas_config):
+    """Processed drawing from the stroke paths, or None to use the raster"""
+    if not CANVAS_CONFIG['vector_strokes'] or canvas_result.json_data is None:
+        return None
+    
+    # One rasterizer per session, so appended strokes are drawn incrementally
+    if 'canvas_rasterizer' not in st.session_state:
+        canvas_size = (UI_CONFIG['canvas_size']['width'], UI_CONFIG['canvas_size']['height'])
+        st.session_state['canvas_rasterizer'] = StrokeRasterizer(canvas_size=canvas_size)
+    
+    return process_canvas_strokes(
+        canvas_result.json_data,
+        st.session_state['canvas_rasterizer'],
+        canvas_config['bg_color'],
+    )
 
 
-def _classify_drawing(image_data, processed_col, results_col):
-    """Classify the drawn image"""
+def _classify_drawing(canvas_result, canvas_config, processed_col, results_col):
+    """Classify the drawn image, reusing cached results for an unchanged canvas"""
     model = get_model()
     if model is None:
         st.error("Model not available. Please check the model file.")
         return
     
-    with st.spinner('Processing drawing...'):
-        processed_img = process_canvas_drawing(image_data)
-
-        if processed_img is not None:
-            _display_processed_drawing(processed_img, processed_col)
-            _display_drawing_predictions(model, processed_img, results_col)
+    cache = get_prediction_cache()
+    
+    with instrumentation.trace() as timings:
+        # Strokes are rasterized in about a millisecond, so the cache is
+        # keyed on their processed image; only raster drawings key on pixels
+        strokes_img = _rasterize_strokes(canvas_result, canvas_config)
+        if strokes_img is not None:
+            key = make_cache_key(strokes_img, model.model_version, namespace='canvas-strokes')
         else:
-            st.error("Failed to preprocess the image.")
+            key = make_cache_key(canvas_result.image_data, model.model_version, namespace='canvas')
+        result = cache.get(key)
+        
+        if result is None:
+            with st.spinner('Processing drawing...'):
+                if strokes_img is not None:
+                    processed_img = strokes_img
+                else:
+                    processed_img = process_canvas_drawing(canvas_result.image_data)
 
+                if processed_img is None:
+                    st.error("Failed to preprocess the image.")
+                    return
+                
+                with instrumentation.span('predict', processed_img.shape):
+                    prediction = model.predict(processed_img)
+                startup.mark('first_prediction')
+                # Re-scores low-confidence predictions when TTA_CONFIG is enabled
+                prediction = predict_with_tta(model, processed_img, prediction).probabilities
+                result = cache.put(key, processed_img, prediction)
+    
+    with processed_col:
+        _display_processed_drawing(result.processed)
+    with results_col:
+        _display_drawing_predictions(result.probabilities)
+    show_timings(timings)
 
-def _display_processed_drawing(processed_img, processed_col):
-    """Display the processed drawing"""
-    processed_display = (processed_img[0, :, :, 0] * 255).astype(np.uint8)
 
+def _handle_live_prediction(canvas_result, canvas_config, processed_col, results_col):
+    """Queue changed drawings for background classification and show the latest result"""
+    live = _get_live_classifier()
+    if live is None:
+        st.error("Model not available. Please check the model file.")
+        return
+    
+    # Reruns also come from other widgets; only changed drawings are queued
+    json_data = canvas_result.json_data
+    objects = json_data.get('objects') if json_data is not None else None
+    drawing = (canvas_config['bg_color'], objects)
+    if json_data is None or drawing != st.session_state.get('live_drawing'):
+        st.session_state['live_drawing'] = drawing
+        if objects == []:
+            live.clear()
+        elif canvas_result.image_data is not None:
+            live.submit((json_data, canvas_result.image_data, canvas_config['bg_color']))
+    
     with processed_col:
-        st.subheader("Processed Drawing")
-        st.write("\n")
-        st.write("\n")
-        st.write("\n")
+        _live_processed_drawing()
+    with results_col:
+        _live_drawing_predictions()
+
+
+def _get_live_classifier():
+    """The session's live classifier, created on first use"""
+    if 'live_classifier' not in st.session_state:
+        model = get_model()
+        if model is None:
+            return None
         
-        # Center the processed image
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            st.image(
-                processed_display, 
-                width=UI_CONFIG['drawing_canvas_image_width'], 
-                use_container_width=False
-            )
+        # Runs on a worker thread, so it uses the Streamlit-free functions
+        rasterizer = StrokeRasterizer(canvas_size=(UI_CONFIG['canvas_size']['width'],
+                                                   UI_CONFIG['canvas_size']['height']))
+        
+        def preprocess(payload):
+            json_data, image_data, bg_color = payload
+            return process_canvas(json_data, image_data, rasterizer, bg_color)
+        
+        st.session_state['live_classifier'] = LiveClassifier(preprocess, model, get_prediction_cache())
+    return st.session_state['live_classifier']
 
 
-def _display_drawing_predictions(model, processed_img, results_col):
-    """Display predictions for the drawing"""
-    with results_col:
+@st.fragment(run_every=LIVE_CONFIG['poll_interval'])
+def _live_processed_drawing():
+    """Refresh the processed drawing from the latest live result"""
+    result = st.session_state['live_classifier'].latest()
+    if result is not None and result.processed is not None:
+        _display_processed_drawing(result.processed)
+
+
+@st.fragment(run_every=LIVE_CONFIG['poll_interval'])
+def _live_drawing_predictions():
+    """Refresh the predictions from the latest live result"""
+    live = st.session_state['live_classifier']
+    result = live.latest()
+    
+    if result is None:
         st.subheader("Top 5 Predictions:")
-        prediction = model.predict(processed_img)
-        top5_idx = np.argsort(prediction[0])[::-1][:5]
+        st.caption("Classifying..." if live.pending() else "Start drawing to see predictions.")
+        return
+    if result.error is not None:
+        st.error(f"Error during image processing: {result.error}")
+        return
+    
+    _display_drawing_predictions(result.probabilities)
+    startup.mark('first_prediction')
+    if live.pending():
+        st.caption("Updating...")
 
-        # Highlight top-1 prediction
-        top_idx = top5_idx[0]
-        top_character = BAYBAYIN_CATEGORIES[top_idx]
-        top_confidence = prediction[0][top_idx]
-        
-        st.success(f"Predicted Character: **{top_character}**")
-        st.info(f"Confidence: {top_confidence * 100:.2f}%")
 
-        # List remaining predictions
-        st.markdown("**Other Predictions:**")
-        for i, idx in enumerate(top5_idx[1:], start=2):
-            character = BAYBAYIN_CATEGORIES[idx]
-            confidence = prediction[0][idx] * 100
-            st.write(f"{i}. {character} - {confidence:.2f}%")
+def _display_processed_drawing(processed_img):
+    """Display the processed drawing"""
+    processed_display = (processed_img[0, :, :, 0] * 255).astype(np.uint8)
+
+    st.subheader("Processed Drawing")
+    st.write("\n")
+    st.write("\n")
+    st.write("\n")
+    
+    # Center the processed image
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col2:
+        st.image(
+            processed_display, 
+            width=UI_CONFIG['drawing_canvas_image_width'], 
+            use_container_width=False
+        )
+
+
+def _display_drawing_predictions(prediction):
+    """Display predictions for the drawing"""
+    st.subheader("Top 5 Predictions:")
+    top5 = decode_top_k(prediction, k=5)
+    labels, probabilities = top5.labels[0], top5.probabilities[0]
+
+    # Highlight top-1 prediction
+    st.success(f"Predicted Character: **{labels[0]}**")
+    st.info(f"Confidence: {probabilities[0] * 100:.2f}%")
+
+    # List remaining predictions
+    st.markdown("**Other Predictions:**")
+    for i, (character, confidence) in enumerate(zip(labels[1:], probabilities[1:]), start=2):
+        st.write(f"{i}. {character} - {confidence * 100:.2f}%")
 
 
 def _show_reference_chart():
@@ -156,4 +280,4 @@ def _show_reference_chart():
     with st.expander("Use this baybayin chart as reference", expanded=False):
         col1, col2, col3 = st.columns([1, 1, 1])
         with col2:
-            st.image(ASSET_PATHS['reference'])
\ No newline at end of file
+            show_asset(ASSET_PATHS['reference'], max_width=UI_CONFIG['reference_chart_width'])
\ No newline at end of file
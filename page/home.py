@@ -1,4 +1,5 @@
 import streamlit as st
+from utils.assets import show_asset
 from config.settings import SOCIAL_LINKS, EXTERNAL_LINKS, ASSET_PATHS
 
 
@@ -10,7 +11,7 @@ def show():
     # Center the image using columns
     col1, col2, col3 = st.columns([1, 5, 1])
     with col2:
-        st.image(ASSET_PATHS['ss1'], use_container_width=True)
+        show_asset(ASSET_PATHS['ss1'])
     
     _setup_home_sidebar()  # Call sidebar setup
     
@@ -82,6 +83,7 @@ def _show_usage_guide():
         
     1. **Image Upload** - Upload an image of a Baybayin character for classification
     2. **Drawing Canvas** - Draw a Baybayin character and get real-time classification
+    3. **Batch Upload** - Classify many character images at once and download the results as CSV
         
     ### 🧭 Navigation Guide:
     - Use the sidebar to switch between different pages
@@ -110,4 +112,4 @@ def _show_technology_section():
 def _show_reference_chart():
     """Display the collapsible reference chart"""
     with st.expander("📖 Baybayin Character Reference Chart", expanded=False):
-        st.image(ASSET_PATHS['preprocessing'], use_container_width=True)
\ No newline at end of file
+        show_asset(ASSET_PATHS['preprocessing'])
\ No newline at end of file
@@ -1,15 +1,27 @@
+import cv2
 import streamlit as st
 import numpy as np
-from PIL import Image
-from models.model_loader import get_model
+from PIL import UnidentifiedImageError
+from models.model_loader import get_model, wait_for_model
+from utils.debug_panel import show_timings
 from utils.image_processing import preprocess_image
-from config.settings import BAYBAYIN_CATEGORIES, UI_CONFIG, ASSET_PATHS
+from baybayin import instrumentation, startup
+from baybayin.cache import get_prediction_cache, make_cache_key
+from baybayin.exceptions import PreprocessingError
+from baybayin.image_io import decode_upload
+from baybayin.quality import assess_quality
+from baybayin.results import decode_top_k
+from baybayin.segmentation import classify_page
+from baybayin.tta import predict_with_tta
+from utils.assets import show_asset
+from config.settings import UI_CONFIG, ASSET_PATHS, EXAMPLE_IMAGES, QUALITY_CONFIG
 
 
 def show():
     """Display the image upload page"""
     st.header("Upload Baybayin Character")
     st.caption("Upload an image of a Baybayin character then click 'Classify Image' to predict the character.")
+    model_ready = wait_for_model()
     
     # File uploader in sidebar
     uploaded_file = st.sidebar.file_uploader(
@@ -19,45 +31,175 @@ def show():
     )
     
     if uploaded_file is not None:
-        _handle_uploaded_file(uploaded_file)
+        _handle_uploaded_file(uploaded_file, model_ready)
     
     _show_reference_chart()
 
 
-def _handle_uploaded_file(uploaded_file):
+def _handle_uploaded_file(uploaded_file, model_ready=True):
     """Handle the uploaded file and display results"""
     # Create three columns for layout
     upload_col, processed_col, results_col = st.columns([1, 1, 1], border=True)
     
-    # Load and display uploaded image
-    image = Image.open(uploaded_file)
-    image_np = np.array(image)
+    decoded = _decode_upload(uploaded_file)
+    if decoded is None:
+        return
     
     with upload_col:
         st.subheader("Uploaded Image")
         st.write("\n")
-        _center_image(image, UI_CONFIG['upload_image_width'])
+        _center_image(decoded.preview, UI_CONFIG['upload_image_width'])
+    
+    # "Classify anyway" on a rejected image reruns the page with this flag set
+    forced = st.session_state.pop('upload_classify_anyway', None) == uploaded_file.file_id
+    several = st.sidebar.checkbox(
+        "Several characters",
+        key="upload_several",
+        help="Read a word, line or page: each character is found and classified separately."
+    )
     
     # Classification button in sidebar
-    if st.sidebar.button('Classify Image'):
-        _classify_image(image_np, processed_col, results_col)
+    if st.sidebar.button('Classify Image', disabled=not model_ready) or forced:
+        if several and not forced:
+            _read_characters(decoded.working, processed_col, results_col)
+        else:
+            _classify_image(uploaded_file, decoded.working, processed_col, results_col, forced)
+
+
+def _decode_upload(uploaded_file):
+    """Decode the upload once; reruns reuse its preview and working array"""
+    cached = st.session_state.get('upload_decoded')
+    if cached is not None and cached[0] == uploaded_file.file_id:
+        return cached[1]
+    
+    # Drop the previous upload's arrays before decoding the new one
+    st.session_state.pop('upload_decoded', None)
+    try:
+        with instrumentation.span('decode'):
+            decoded = decode_upload(uploaded_file)
+    except (UnidentifiedImageError, OSError):
+        st.error("Could not read the uploaded file as an image.")
+        return None
+    st.session_state['upload_decoded'] = (uploaded_file.file_id, decoded)
+    return decoded
 
 
-def _classify_image(image_np, processed_col, results_col):
-    """Classify the uploaded image"""
+def _classify_image(uploaded_file, image_np, processed_col, results_col, forced=False):
+    """Classify the uploaded image, reusing cached results for repeat uploads"""
     model = get_model()
     if model is None:
         st.error("Model not available. Please check the model file.")
         return
     
-    with st.spinner('Processing image...'):
-        processed_img = preprocess_image(image_np)
+    cache = get_prediction_cache()
+    key = make_cache_key(uploaded_file.getvalue(), model.model_version, namespace='upload')
+    
+    with instrumentation.trace() as timings:
+        # Hopeless images stop here, before preprocessing and the model call
+        report = assess_quality(image_np) if QUALITY_CONFIG['enabled'] else None
+        if report is not None and report.issues:
+            _display_quality_issues(report, results_col, uploaded_file.file_id, forced)
+        if report is not None and not report.accepted and not forced:
+            show_timings(timings)
+            return
         
-        if processed_img is not None:
-            _display_processed_image(processed_img, processed_col)
-            _display_predictions(model, processed_img, results_col)
+        result = cache.get(key)
+        
+        if result is None:
+            with st.spinner('Processing image...'):
+                processed_img = preprocess_image(image_np)
+                
+                if processed_img is None:
+                    st.error("Failed to preprocess the image.")
+                    return
+                
+                with instrumentation.span('predict', processed_img.shape):
+                    prediction = model.predict(processed_img)
+                startup.mark('first_prediction')
+                # Re-scores low-confidence predictions when TTA_CONFIG is enabled
+                prediction = predict_with_tta(model, processed_img, prediction).probabilities
+                result = cache.put(key, processed_img, prediction)
+    
+    _display_processed_image(result.processed, processed_col)
+    _display_predictions(result.probabilities, results_col)
+    show_timings(timings)
+
+
+def _read_characters(image_np, processed_col, results_col):
+    """Segment an image with several characters and classify each of them"""
+    model = get_model()
+    if model is None:
+        st.error("Model not available. Please check the model file.")
+        return
+    
+    # The quality gate is meant for single characters, so it is skipped here
+    with instrumentation.trace() as timings:
+        with st.spinner('Finding characters...'):
+            try:
+                results = classify_page(image_np, model)
+            except PreprocessingError as e:
+                st.error(f"Failed to process the image: {e}")
+                return
+    
+    _display_glyph_boxes(image_np, results, processed_col)
+    _display_lines(results, results_col)
+    show_timings(timings)
+
+
+def _display_glyph_boxes(image_np, results, processed_col):
+    """Display the image with a numbered box around each character found"""
+    boxes = cv2.cvtColor(image_np, cv2.COLOR_GRAY2RGB)
+    thickness = max(1, max(image_np.shape) // 300)
+    for i, result in enumerate(results, start=1):
+        glyph = result.glyph
+        corner = (glyph.x + glyph.width, glyph.y + glyph.height)
+        cv2.rectangle(boxes, (glyph.x, glyph.y), corner, (220, 40, 40), thickness)
+        cv2.putText(boxes, str(i), (glyph.x, max(0, glyph.y - 2 * thickness)), cv2.FONT_HERSHEY_SIMPLEX,
+                    thickness / 2, (220, 40, 40), thickness)
+    
+    with processed_col:
+        st.subheader("Characters Found")
+        st.write("\n")
+        _center_image(boxes, UI_CONFIG['upload_image_width'])
+
+
+def _display_lines(results, results_col):
+    """Display the characters read, line by line, with each one's top predictions"""
+    with results_col:
+        st.subheader("Characters Read:")
+        if not results:
+            st.warning("No characters found in the image.")
+            return
+        
+        lines = {}
+        for result in results:
+            lines.setdefault(result.glyph.line, []).append(result.labels[0])
+        for line, labels in sorted(lines.items()):
+            st.success(f"Line {line + 1}: **{' '.join(labels)}**")
+        
+        st.markdown("**Predictions per Character:**")
+        for i, result in enumerate(results, start=1):
+            others = ", ".join(f"{label} ({confidence * 100:.1f}%)"
+                               for label, confidence in zip(result.labels[1:3], result.probabilities[1:3]))
+            st.write(f"{i}. {result.labels[0]} - {result.probabilities[0] * 100:.2f}% (also: {others})")
+
+
+def _display_quality_issues(report, results_col, file_id, forced=False):
+    """Explain why an image was rejected, or what may make its result unreliable"""
+    reasons = "\n".join(f"- {reason}" for reason in report.reasons)
+    with results_col:
+        if report.accepted or forced:
+            st.warning(f"**The result may be unreliable:**\n{reasons}")
         else:
-            st.error("Failed to preprocess the image.")
+            st.subheader("Image Not Classified")
+            st.warning(f"**This image is unlikely to be classified correctly:**\n{reasons}\n\n"
+                       "See the guide below for what makes a good input image.")
+            st.button("Classify anyway", on_click=_classify_anyway, args=(file_id,))
+
+
+def _classify_anyway(file_id):
+    """Let the next run classify a rejected upload without the quality gate"""
+    st.session_state['upload_classify_anyway'] = file_id
 
 
 def _display_processed_image(processed_img, processed_col):
@@ -70,27 +212,21 @@ def _display_processed_image(processed_img, processed_col):
         _center_image(processed_display, UI_CONFIG['processed_image_width'])
 
 
-def _display_predictions(model, processed_img, results_col):
+def _display_predictions(prediction, results_col):
     """Display the top 5 predictions"""
     with results_col:
         st.subheader("Top 5 Predictions:")
-        prediction = model.predict(processed_img)
-        top5_idx = np.argsort(prediction[0])[::-1][:5]
+        top5 = decode_top_k(prediction, k=5)
+        labels, probabilities = top5.labels[0], top5.probabilities[0]
 
         # Highlight top-1 prediction
-        top_idx = top5_idx[0]
-        top_character = BAYBAYIN_CATEGORIES[top_idx]
-        top_confidence = prediction[0][top_idx]
-        
-        st.success(f"Predicted Character: **{top_character}**")
-        st.info(f"Confidence: {top_confidence * 100:.2f}%")
+        st.success(f"Predicted Character: **{labels[0]}**")
+        st.info(f"Confidence: {probabilities[0] * 100:.2f}%")
 
         # List remaining predictions
         st.markdown("**Other Predictions:**")
-        for i, idx in enumerate(top5_idx[1:], start=2):
-            character = BAYBAYIN_CATEGORIES[idx]
-            confidence = prediction[0][idx] * 100
-            st.write(f"{i}. {character} - {confidence:.2f}%")
+        for i, (character, confidence) in enumerate(zip(labels[1:], probabilities[1:]), start=2):
+            st.write(f"{i}. {character} - {confidence * 100:.2f}%")
 
 
 def _center_image(image, width):
@@ -110,30 +246,25 @@ def _show_reference_chart():
             - Use images with clear, Baybayin characters.
             - Prefer white or light backgrounds with high contrast.
             - Avoid noisy, blurry, or low-resolution images.
-            - Avoid images with multiple characters or excessive artifacts.
+            - Avoid excessive artifacts. For a word or line with several characters, tick 'Several characters' in the sidebar to read them one by one.
 
-            *You can still try uploading 'bad' images to see how the model performs!*
+            *Images like the 'bad' examples below are stopped by a quality check before classification. Click 'Classify anyway' to see how the model performs on them.*
             """
         )
         st.markdown("#### ✅ Good Example Images")
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.image("assets/good_example_1.jpg", caption="Clear, centered, white background", width=256)
-        with col2:
-            st.image("assets/good_example_2.png", caption="High contrast, single character", width=256)
-        with col3:
-            st.image("assets/good_example_3.jpg", caption="Properly cropped, no noise", width=256)
+        _show_examples(EXAMPLE_IMAGES['good'])
 
         st.markdown("#### ❌ Bad Example Images")
-        col4, col5, col6 = st.columns(3)
-        with col4:
-            st.image("assets/bad_example_1.jpg", caption="Noisy/blurred image", width=256)
-        with col5:
-            st.image("assets/bad_example_2.png", caption="Fake PNG (checkerboard bg)", width=256)
-        with col6:
-            st.image("assets/bad_example_3.jpg", caption="Uniquely written Baybayin characters", width=190)
+        _show_examples(EXAMPLE_IMAGES['bad'])
 
     with st.expander("📖 Baybayin Character Reference Chart", expanded=False):
         col1, col2, col3 = st.columns([1, 1, 1])
         with col2:
-            st.image(ASSET_PATHS['reference'])
\ No newline at end of file
+            show_asset(ASSET_PATHS['reference'], max_width=UI_CONFIG['reference_chart_width'])
+
+
+def _show_examples(examples):
+    """Display example images side by side"""
+    for col, (path, caption, width) in zip(st.columns(len(examples)), examples):
+        with col:
+            show_asset(path, width=width, caption=caption)
\ No newline at end of file
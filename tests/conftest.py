@@ -0,0 +1,8 @@
+"""
+Pytest configuration: puts the repository root on sys.path, so the tests
+import baybayin and config from any working directory.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+
+from baybayin.batching import BatchScheduler
+
+
+class GatedEngine:
+    """Engine that blocks each predict call until the gate opens"""
+
+    model_version = 'test'
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Event()
+
+    def predict(self, batch):
+        self.started.set()
+        self.gate.wait(5)
+        return np.tile(batch.reshape(len(batch), -1)[:, :1], (1, 3))
+
+
+def _images(value, n=1):
+    return np.full((n, 4, 4, 1), value, dtype=np.float32)
+
+
+def test_cancelled_request_does_not_stop_the_worker():
+    engine = GatedEngine()
+    scheduler = BatchScheduler(engine, max_batch_size=1, max_wait_ms=0, input_shape=(4, 4, 1))
+    try:
+        running = scheduler.submit(_images(0.1))
+        assert engine.started.wait(5)
+        queued = scheduler.submit(_images(0.2))
+        assert queued.cancel()
+        engine.gate.set()
+
+        assert running.result(timeout=5)[0, 0] == np.float32(0.1)
+        later = scheduler.predict(_images(0.3), timeout=5)
+        assert later[0, 0] == np.float32(0.3)
+    finally:
+        engine.gate.set()
+        scheduler.close()
+
+
+def test_running_request_cannot_be_cancelled():
+    engine = GatedEngine()
+    scheduler = BatchScheduler(engine, max_batch_size=4, max_wait_ms=0, input_shape=(4, 4, 1))
+    try:
+        future = scheduler.submit(_images(0.5, n=2))
+        assert engine.started.wait(5)
+        assert not future.cancel()
+        engine.gate.set()
+        assert future.result(timeout=5).shape == (2, 3)
+        assert scheduler.predict(_images(0.7), timeout=5)[0, 0] == np.float32(0.7)
+    finally:
+        engine.gate.set()
+        scheduler.close()
+
+
+def test_engine_errors_reach_callers_and_the_worker_keeps_running():
+    class FailingOnce:
+        calls = 0
+
+        def predict(self, batch):
+            self.calls += 1
+            if self.calls == 1:
+                raise RuntimeError("boom")
+            return np.zeros((len(batch), 3), dtype=np.float32)
+
+    scheduler = BatchScheduler(FailingOnce(), max_batch_size=1, max_wait_ms=0, input_shape=(4, 4, 1))
+    try:
+        failed = scheduler.submit(_images(0.1))
+        try:
+            failed.result(timeout=5)
+        except RuntimeError as e:
+            assert str(e) == "boom"
+        else:
+            raise AssertionError("expected the engine error")
+        assert scheduler.predict(_images(0.2), timeout=5).shape == (1, 3)
+    finally:
+        scheduler.close()
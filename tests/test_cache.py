@@ -0,0 +1,70 @@
+import numpy as np
+
+from baybayin import cache
+from baybayin.cache import PredictionCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _put(store, key, rows=1):
+    # 64x64 float32 image plus 10 float32 probabilities per row
+    return store.put(key, np.zeros((rows, 64, 64, 1), np.float32), np.zeros((rows, 10), np.float32))
+
+
+ENTRY_BYTES = 64 * 64 * 4 + 10 * 4
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    store = PredictionCache(max_entries=10, max_bytes=10 * ENTRY_BYTES, ttl_seconds=60)
+    _put(store, 'a')
+
+    clock.now += 59
+    assert store.get('a') is not None
+    clock.now += 2
+    assert store.get('a') is None
+    assert store.stats() == {'entries': 0, 'bytes': 0, 'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_byte_budget_evicts_least_recently_used_first():
+    store = PredictionCache(max_entries=100, max_bytes=3 * ENTRY_BYTES, ttl_seconds=60)
+    for key in 'abc':
+        _put(store, key)
+    assert store.get('a') is not None  # 'b' is now the least recently used
+
+    _put(store, 'd')
+    assert store.get('b') is None
+    assert all(store.get(key) is not None for key in 'acd')
+
+    # An entry needing two slots pushes out the two oldest
+    _put(store, 'e', rows=2)
+    assert store.get('a') is None and store.get('c') is None
+    assert store.get('d') is not None and store.get('e') is not None
+    assert store.stats()['bytes'] == 3 * ENTRY_BYTES
+    assert store.stats()['evictions'] == 3
+
+
+def test_entries_over_the_byte_budget_are_not_stored():
+    store = PredictionCache(max_entries=10, max_bytes=ENTRY_BYTES, ttl_seconds=60)
+    entry = _put(store, 'big', rows=2)
+    assert entry.probabilities.shape == (2, 10)
+    assert store.get('big') is None
+
+
+def test_keys_change_with_model_version_namespace_and_config():
+    pixels = np.arange(16, dtype=np.uint8).reshape(4, 4)
+    key = make_cache_key(pixels, 'v1', 'upload')
+
+    assert make_cache_key(pixels.copy(), 'v1', 'upload') == key
+    assert make_cache_key(pixels.tobytes(), 'v1', 'upload') != key
+    assert make_cache_key(pixels, 'v2', 'upload') != key
+    assert make_cache_key(pixels, 'v1', 'canvas') != key
+    assert make_cache_key(pixels, 'v1', 'upload', config={'clahe': {}}) != key
+    assert make_cache_key(pixels.reshape(2, 8), 'v1', 'upload') != key
@@ -0,0 +1,51 @@
+import numpy as np
+
+from baybayin.cascade import CascadeEngine
+
+
+class StubEngine:
+    """Engine whose first-class probability is the image's pixel value"""
+
+    def __init__(self, model_version, flip=False):
+        self.model_version = model_version
+        self.flip = flip
+        self.batches = []
+
+    def predict(self, batch):
+        values = batch[:, 0, 0, 0].copy()
+        self.batches.append(values)
+        if self.flip:
+            values = 1 - values
+        return np.stack([values, 1 - values], axis=1).astype(np.float32)
+
+
+def _batch(values):
+    return np.asarray(values, np.float32)[:, None, None, None] * np.ones((1, 4, 4, 1), np.float32)
+
+
+def test_only_low_confidence_rows_are_escalated_in_order():
+    fast, full = StubEngine('fast-v1'), StubEngine('full-v1', flip=True)
+    cascade = CascadeEngine(fast, full, threshold=0.9)
+    values = [0.95, 0.3, 0.99, 0.5, 0.08]
+
+    output = cascade.predict(_batch(values))
+
+    # 0.08 is confident for the second class; 0.3 and 0.5 are not
+    np.testing.assert_allclose(full.batches[0], [0.3, 0.5])
+    assert len(full.batches) == 1
+    np.testing.assert_allclose(output[:, 0], [0.95, 0.7, 0.99, 0.5, 0.08], rtol=1e-6)
+    metrics = cascade.metrics()
+    assert (metrics['batches'], metrics['rows'], metrics['escalated']) == (1, 5, 2)
+    assert cascade.model_version == 'cascade:fast-v1|full-v1|0.9'
+
+
+def test_confident_batches_never_reach_the_full_model():
+    fast, full = StubEngine('fast-v1'), StubEngine('full-v1')
+    cascade = CascadeEngine(fast, full, threshold=0.9)
+
+    output = cascade.predict(_batch([0.95, 0.02]))
+
+    assert full.batches == []
+    np.testing.assert_allclose(output[:, 0], [0.95, 0.02])
+    assert cascade.metrics()['escalation_rate'] == 0.0
+    assert cascade.metrics()['full_ms']['max'] == 0.0
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from baybayin.convert import _calibration_batch
+
+
+def _character():
+    image = np.full((80, 80), 255, dtype=np.uint8)
+    image[15:65, 35:45] = 0
+    return image
+
+
+def test_failed_calibration_images_are_left_out():
+    batch = _calibration_batch([_character(), None, _character()])
+    assert batch.shape[0] == 2
+    # No blank rows from the failed image
+    assert (batch.reshape(2, -1).min(axis=1) < 1.0).all()
+
+
+def test_calibration_fails_when_no_image_is_usable():
+    with pytest.raises(ValueError):
+        _calibration_batch([None, None])
@@ -0,0 +1,49 @@
+import io
+
+import numpy as np
+from PIL import Image, JpegImagePlugin
+
+from baybayin.image_io import open_image
+
+
+def _jpeg(mode, size):
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], len(mode)), dtype=np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels, mode).save(out, format='JPEG')
+    return out.getvalue()
+
+
+def test_large_cmyk_jpeg_uses_the_reduced_decode(monkeypatch):
+    drafted = []
+    original = JpegImagePlugin.JpegImageFile.draft
+
+    def draft(self, mode, size):
+        drafted.append((self.mode, size))
+        return original(self, mode, size)
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, 'draft', draft)
+    image = open_image(_jpeg('CMYK', (1200, 800)), max_pixels=300 * 200)
+    assert drafted and drafted[0][0] == 'CMYK'
+    assert image.mode == 'RGB'
+    assert image.size[0] * image.size[1] <= 300 * 200
+
+
+def test_jpeg_just_over_the_budget_uses_the_reduced_decode(monkeypatch):
+    drafted = []
+    original = JpegImagePlugin.JpegImageFile.draft
+
+    def draft(self, mode, size):
+        result = original(self, mode, size)
+        drafted.append(self.size)
+        return result
+
+    # 12 megapixels against the default 4 megapixel budget
+    x = np.linspace(0, 255, 4000, dtype=np.float32)
+    y = np.linspace(0, 255, 3000, dtype=np.float32)[:, None]
+    out = io.BytesIO()
+    Image.fromarray(((x + y) / 2).astype(np.uint8), 'L').convert('RGB').save(out, format='JPEG')
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, 'draft', draft)
+    image = open_image(out.getvalue())
+    assert drafted == [(2000, 1500)]
+    assert image.size == (2000, 1500)
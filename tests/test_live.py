@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from baybayin.live import LiveClassifier
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _preprocess(value):
+    return np.full((1, 2, 2, 1), value, np.float32)
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, batch):
+        self.calls.append(float(batch[0, 0, 0, 0]))
+        return batch.reshape(len(batch), -1)[:, :1]
+
+
+class ManualModel:
+    """Model whose predictions are resolved by the test"""
+
+    def __init__(self):
+        self.futures = []
+        self.lock = threading.Lock()
+
+    def submit(self, batch):
+        future = Future()
+        with self.lock:
+            self.futures.append((float(batch[0, 0, 0, 0]), future))
+        return future
+
+
+def test_a_burst_of_strokes_is_classified_once():
+    preprocessed = []
+    model = CountingModel()
+
+    def preprocess(value):
+        preprocessed.append(value)
+        return _preprocess(value)
+
+    live = LiveClassifier(preprocess, model, debounce_ms=100, max_delay_ms=5000)
+    for stroke in range(1, 21):
+        generation = live.submit(stroke)
+        time.sleep(0.005)
+    _wait_for(lambda: live.latest() is not None and not live.pending())
+    time.sleep(0.2)
+
+    assert preprocessed == [20]
+    assert model.calls == [20.0]
+    assert live.latest().generation == generation
+    assert live.latest().probabilities[0, 0] == 20
+
+
+def test_an_old_result_never_replaces_a_newer_one():
+    model = ManualModel()
+    live = LiveClassifier(_preprocess, model, debounce_ms=10, max_delay_ms=50)
+
+    first = live.submit(1)
+    _wait_for(lambda: len(model.futures) == 1)
+    second = live.submit(2)
+    time.sleep(0.1)
+    # The newer drawing waits for the prediction under way
+    assert len(model.futures) == 1
+
+    model.futures[0][1].set_result(np.array([[1.0]], np.float32))
+    assert live.latest().generation == first
+    _wait_for(lambda: len(model.futures) == 2)
+    assert model.futures[1][0] == 2.0
+    model.futures[1][1].set_result(np.array([[2.0]], np.float32))
+    assert live.latest().generation == second
+
+    # A prediction landing after the canvas was cleared is not shown
+    live.submit(3)
+    _wait_for(lambda: len(model.futures) == 3)
+    live.clear()
+    model.futures[2][1].set_result(np.array([[3.0]], np.float32))
+    assert live.latest() is None
+    assert not live.pending()
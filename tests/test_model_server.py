@@ -0,0 +1,162 @@
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from baybayin.batching import BatchScheduler
+from baybayin.exceptions import ModelLoadError
+from baybayin.model_server import ModelServer, ModelServerError, RemoteModel
+from config.settings import IMAGE_SIZE
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason="needs Unix domain sockets")
+
+TARGET_W, TARGET_H = IMAGE_SIZE
+
+
+class MeanEngine:
+    """Engine whose two outputs are each image's mean and its complement"""
+
+    model_version = 'mean-v1'
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(len(batch))
+        means = batch.reshape(len(batch), -1).mean(axis=1)
+        return np.stack([means, 1 - means], axis=1).astype(np.float32)
+
+
+class StalledEngine(MeanEngine):
+    """Engine that does not answer until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def predict(self, batch):
+        self.release.wait(5)
+        return super().predict(batch)
+
+
+class LocalModel(MeanEngine):
+    model_version = 'local-v0'
+
+
+def _start(socket_path, engine):
+    scheduler = BatchScheduler(engine, max_wait_ms=20)
+    server = ModelServer(socket_path, scheduler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _stop(server):
+    server.shutdown()
+    server.server_close()
+    server.model.close()
+
+
+@pytest.fixture
+def server(tmp_path):
+    engine = MeanEngine()
+    server = _start(str(tmp_path / 'model.sock'), engine)
+    yield server, engine
+    _stop(server)
+
+
+def _images(n, value, height=TARGET_H, width=TARGET_W):
+    return np.full((n, height, width, 1), value, dtype=np.float32)
+
+
+def test_predict_and_info_round_trip(server):
+    model = RemoteModel(server[0].server_address, timeout=5)
+    try:
+        assert model.model_version == 'mean-v1'
+        output = model.predict(np.concatenate([_images(1, 0.25), _images(1, 0.75)]))
+        np.testing.assert_allclose(output, [[0.25, 0.75], [0.75, 0.25]], rtol=1e-6)
+        assert model.server_info()['pid'] > 0
+        assert model.metrics()['remote_calls'] == 1
+    finally:
+        model.close()
+
+
+def test_bad_shape_is_rejected_without_failing_other_clients(server):
+    model = RemoteModel(server[0].server_address, timeout=5)
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            good = [pool.submit(model.predict, _images(2, i / 10)) for i in range(6)]
+            bad = pool.submit(model.predict, _images(1, 0.5, height=32, width=32))
+            empty = pool.submit(model.predict, np.empty((0, TARGET_H, TARGET_W, 1), np.float32))
+            for i, future in enumerate(good):
+                np.testing.assert_allclose(future.result(timeout=5)[:, 0], [i / 10] * 2, rtol=1e-6)
+            for future in (bad, empty):
+                with pytest.raises(ModelServerError, match="Expected a non-empty batch"):
+                    future.result(timeout=5)
+
+        # The rejected payloads were drained, so the pooled connections still work
+        assert model.predict(_images(1, 0.5))[0, 0] == pytest.approx(0.5)
+        assert model.metrics()['fallback_calls'] == 0
+    finally:
+        model.close()
+
+
+def test_scheduler_rejects_bad_shapes():
+    scheduler = BatchScheduler(MeanEngine(), max_wait_ms=0)
+    try:
+        with pytest.raises(ValueError):
+            scheduler.submit(_images(1, 0.5, height=32, width=32))
+        with pytest.raises(ValueError):
+            scheduler.submit(np.empty((0, TARGET_H, TARGET_W, 1), np.float32))
+        assert scheduler.predict(_images(1, 0.5), timeout=5)[0, 0] == pytest.approx(0.5)
+    finally:
+        scheduler.close()
+
+
+def test_timeout_raises_instead_of_loading_the_model(tmp_path):
+    engine = StalledEngine()
+    server = _start(str(tmp_path / 'model.sock'), engine)
+    fallbacks = []
+    model = RemoteModel(server.server_address, fallback=lambda: fallbacks.append(1) or LocalModel(),
+                        timeout=0.2)
+    try:
+        with pytest.raises(ModelServerError, match="did not answer"):
+            model.predict(_images(1, 0.5))
+        engine.release.set()
+        assert model.predict(_images(1, 0.5))[0, 0] == pytest.approx(0.5)
+        assert fallbacks == []
+        assert model.metrics()['fallback_calls'] == 0
+    finally:
+        engine.release.set()
+        model.close()
+        _stop(server)
+
+
+def test_construction_timeout_is_a_load_error(tmp_path, monkeypatch):
+    def timed_out(self, op, batch=None):
+        raise TimeoutError("timed out")
+
+    fallbacks = []
+    monkeypatch.setattr(RemoteModel, '_request', timed_out)
+    with pytest.raises(ModelLoadError, match="did not answer"):
+        RemoteModel(str(tmp_path / 'model.sock'), fallback=lambda: fallbacks.append(1) or LocalModel(),
+                    timeout=0.2)
+    assert fallbacks == []
+
+
+def test_model_version_is_refreshed_when_the_server_comes_back(tmp_path):
+    socket_path = str(tmp_path / 'model.sock')
+    model = RemoteModel(socket_path, fallback=LocalModel, timeout=5, retry_interval=0)
+    assert model.model_version == 'local-v0'
+    assert model.predict(_images(1, 0.5))[0, 0] == pytest.approx(0.5)
+    assert model.metrics()['fallback_calls'] == 1
+
+    server = _start(socket_path, MeanEngine())
+    try:
+        model.predict(_images(1, 0.5))
+        assert model.metrics()['remote_calls'] == 1
+        assert model.model_version == 'mean-v1'
+    finally:
+        model.close()
+        _stop(server)
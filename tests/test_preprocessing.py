@@ -0,0 +1,45 @@
+import copy
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from baybayin.image_io import open_image
+from baybayin.preprocessing import PreprocessingPipeline, downscale_oversized, to_grayscale
+from config.settings import PROCESSING_CONFIG
+
+ASSETS = Path(__file__).resolve().parent.parent / 'assets'
+
+
+def _full_resolution_config():
+    config = copy.deepcopy(PROCESSING_CONFIG)
+    config['downscale']['enabled'] = False
+    return config
+
+
+@pytest.mark.parametrize('name, factor', [
+    ('bad_example_3.jpg', 1),
+    ('bad_example_2.png', 1),
+    ('good_example_1.jpg', 4),
+    ('good_example_2.png', 8),
+    ('good_example_3.jpg', 4),
+])
+def test_oversized_inputs_agree_with_the_full_resolution_pipeline(name, factor):
+    gray = to_grayscale(open_image(ASSETS / name))
+    if factor > 1:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+    assert downscale_oversized(gray)[1] < 1
+
+    fast = PreprocessingPipeline().process(gray).astype(np.float32) / 255
+    full = PreprocessingPipeline(_full_resolution_config()).process(gray).astype(np.float32) / 255
+
+    assert np.mean((fast < 0.5) != (full < 0.5)) <= 0.04
+    assert np.mean(np.abs(fast - full)) <= 0.04
+
+
+def test_small_inputs_are_not_downscaled():
+    gray = to_grayscale(open_image(ASSETS / 'good_example_1.jpg'))
+    image, scale = downscale_oversized(gray)
+    assert scale == 1.0
+    assert image is gray
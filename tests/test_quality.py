@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from baybayin import quality
+from baybayin.image_io import open_image
+
+ASSETS = Path(__file__).resolve().parent.parent / 'assets'
+
+
+@pytest.mark.parametrize('name', ['good_example_1.jpg', 'good_example_2.png', 'good_example_3.jpg'])
+def test_good_examples_are_accepted(name):
+    report = quality.assess_quality(open_image(ASSETS / name))
+    assert report.accepted, report.reasons
+
+
+@pytest.mark.parametrize('name, code', [
+    ('bad_example_1.jpg', 'noisy'),
+    ('bad_example_1.png', 'noisy'),
+    ('bad_example_2.png', 'noisy'),
+    ('bad_example_3.jpg', 'too_much_ink'),
+])
+def test_bad_examples_are_rejected(name, code):
+    report = quality.assess_quality(open_image(ASSETS / name))
+    assert not report.accepted
+    assert code in [issue.code for issue in report.issues]
+
+
+def test_large_images_are_reduced_before_the_grayscale_conversion(monkeypatch):
+    converted = []
+    original = quality.to_grayscale
+
+    def to_grayscale(image):
+        converted.append(np.asarray(image).shape[:2])
+        return original(image)
+
+    monkeypatch.setattr(quality, 'to_grayscale', to_grayscale)
+    pixels = np.random.default_rng(0).integers(0, 256, (3000, 4000, 3), dtype=np.uint8)
+    from_pil = quality._analysis_copy(Image.fromarray(pixels), 128)
+    from_array = quality._analysis_copy(pixels, 128)
+
+    assert from_pil.shape == from_array.shape == (96, 128)
+    assert all(max(shape) <= 4 * 128 for shape in converted)
@@ -0,0 +1,27 @@
+import time
+
+from baybayin.segmentation import _merge_fragments
+
+
+def test_stacked_fragments_merge_into_one_glyph():
+    # Three stroke pieces of one glyph, stacked with small gaps, and a separate glyph
+    boxes = [[10, 10, 40, 30], [12, 32, 38, 52], [11, 54, 39, 74], [80, 10, 110, 74]]
+    groups = [[1], [2], [3], [4]]
+    _merge_fragments(groups, boxes)
+    assert groups == [[1, 2, 3], [4]]
+    assert boxes == [[10, 10, 40, 74], [80, 10, 110, 74]]
+
+
+def test_page_with_many_fragments_merges_quickly():
+    # 25 lines of 40 glyphs, each broken into three stacked fragments
+    boxes = []
+    for line in range(25):
+        for column in range(40):
+            x, y = column * 50, line * 100
+            boxes += [[x, y, x + 30, y + 20], [x + 2, y + 22, x + 28, y + 42], [x + 1, y + 44, x + 29, y + 64]]
+    groups = [[i] for i in range(len(boxes))]
+    started = time.perf_counter()
+    _merge_fragments(groups, boxes)
+    assert time.perf_counter() - started < 5
+    assert len(groups) == 1000
+    assert all(len(group) == 3 for group in groups)
@@ -0,0 +1,158 @@
+import asyncio
+import io
+import os
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip('aiohttp')
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+from baybayin.batching import BatchScheduler  # noqa: E402
+from baybayin.server import create_app  # noqa: E402
+from config.settings import BAYBAYIN_CATEGORIES, IMAGE_SIZE  # noqa: E402
+
+ASSETS = os.path.join(os.path.dirname(__file__), '..', 'assets')
+
+
+class SlowEngine:
+    """Engine whose first call is held until released"""
+
+    model_version = 'test'
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def predict(self, batch):
+        self.calls += 1
+        if self.calls == 1:
+            self.release.wait(5)
+        probabilities = np.zeros((len(batch), len(BAYBAYIN_CATEGORIES)), dtype=np.float32)
+        probabilities[:, 0] = 1.0
+        return probabilities
+
+
+def _npy(array):
+    out = io.BytesIO()
+    np.save(out, array)
+    return out.getvalue()
+
+
+def _tensors(n=1, value=0.5):
+    target_w, target_h = IMAGE_SIZE
+    return np.full((n, target_h, target_w, 1), value, dtype=np.float32)
+
+
+def _run(scenario, engine, **options):
+    async def main():
+        scheduler = BatchScheduler(engine, max_wait_ms=0)
+        app = create_app(scheduler, **options)
+        async with TestClient(TestServer(app)) as client:
+            try:
+                return await scenario(client)
+            finally:
+                engine.release.set()
+                scheduler.close()
+    return asyncio.run(main())
+
+
+def test_timeout_does_not_break_later_requests():
+    engine = SlowEngine()
+
+    async def scenario(client):
+        headers = {'Content-Type': 'application/x-npy'}
+        slow = await client.post('/classify/batch', data=_npy(_tensors()), headers=headers)
+        assert slow.status == 504
+        engine.release.set()
+
+        response = await client.post('/classify/batch', data=_npy(_tensors(2)), headers=headers)
+        assert response.status == 200
+        results = (await response.json())['results']
+        assert [result['predictions'][0]['label'] for result in results] == [BAYBAYIN_CATEGORIES[0]] * 2
+
+    _run(scenario, engine, request_timeout=0.2)
+
+
+def test_timeout_leaves_the_model_future_alone():
+    from concurrent.futures import Future
+
+    class PendingModel:
+        """Model whose futures stay pending (and cancellable) until resolved"""
+
+        model_version = 'test'
+
+        def __init__(self):
+            self.futures = []
+
+        def submit(self, batch):
+            future = Future()
+            self.futures.append(future)
+            return future
+
+    model = PendingModel()
+
+    async def scenario(client):
+        response = await client.post('/classify/batch', data=_npy(_tensors()),
+                                     headers={'Content-Type': 'application/x-npy'})
+        assert response.status == 504
+        assert len(model.futures) == 1
+        assert not model.futures[0].cancelled()
+
+    async def main():
+        async with TestClient(TestServer(create_app(model, request_timeout=0.2))) as client:
+            await scenario(client)
+
+    asyncio.run(main())
+
+
+def test_quality_gate_applies_to_raw_arrays():
+    from PIL import Image
+
+    engine = SlowEngine()
+    engine.release.set()
+    good = np.asarray(Image.open(os.path.join(ASSETS, 'good_example_1.jpg')).convert('L').resize((200, 200)))
+    blank = np.full_like(good, 255)
+
+    async def scenario(client):
+        response = await client.post('/classify/batch', data=_npy(np.stack([good, blank])),
+                                     headers={'Content-Type': 'application/x-npy'})
+        assert response.status == 200
+        good_result, blank_result = (await response.json())['results']
+        assert good_result['predictions']
+        assert blank_result['error'].startswith('Image rejected')
+        assert [issue['code'] for issue in blank_result['issues']] == ['blank']
+
+    _run(scenario, engine)
+
+
+def test_npy_values_are_validated_and_scaled():
+    from PIL import Image
+
+    class RecordingEngine(SlowEngine):
+        def __init__(self):
+            super().__init__()
+            self.release.set()
+            self.batches = []
+
+        def predict(self, batch):
+            self.batches.append(batch.copy())
+            return super().predict(batch)
+
+    engine = RecordingEngine()
+    image = np.asarray(Image.open(os.path.join(ASSETS, 'good_example_1.jpg')).convert('L').resize((200, 200)))
+    headers = {'Content-Type': 'application/x-npy'}
+
+    async def scenario(client):
+        for bad in (_tensors(value=2.0), _tensors(value=-0.5), np.full((1, 20, 20), 300.0)):
+            response = await client.post('/classify/batch', data=_npy(bad), headers=headers)
+            assert response.status == 400
+
+        for payload in (image[np.newaxis], (image / 255.0)[np.newaxis], image[np.newaxis].astype(np.int64)):
+            response = await client.post('/classify/batch', data=_npy(payload), headers=headers)
+            assert response.status == 200
+        assert len(engine.batches) == 3
+        assert all(np.array_equal(engine.batches[0], batch) for batch in engine.batches[1:])
+
+    _run(scenario, engine)
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from baybayin.image_io import open_image
+from baybayin.preprocessing import get_pipeline, preprocess_batch
+from baybayin.tensor_store import TensorStore
+from config.settings import PROCESSING_CONFIG
+
+
+def _write_character(path, seed):
+    rng = np.random.default_rng(seed)
+    image = np.full((90, 90), 255, dtype=np.uint8)
+    top, left = rng.integers(5, 30, size=2)
+    image[top:top + rng.integers(30, 55), left:left + rng.integers(8, 20)] = 0
+    image[top:top + 10, left:left + rng.integers(25, 50)] = 0
+    Image.fromarray(image).save(path)
+    return str(path)
+
+
+def _expected(path):
+    # process() reuses its output buffer
+    return get_pipeline().process(open_image(path)).copy()
+
+
+def test_store_matches_preprocessing_and_skips_unchanged_files(tmp_path):
+    paths = [_write_character(tmp_path / f"{i}.png", i) for i in range(5)]
+    with TensorStore(str(tmp_path / 'store')) as store:
+        assert store.update(paths)['added'] == 5
+        assert store.update(paths)['unchanged'] == 5
+
+    store = TensorStore(str(tmp_path / 'store'), readonly=True)
+    entries, batch = next(store.batches(batch_size=10))
+    expected, failures = preprocess_batch([open_image(entry.path) for entry in entries])
+    assert not failures
+    assert np.array_equal(batch, expected)
+    store.close()
+
+
+def test_rows_of_deleted_files_are_not_reused(tmp_path):
+    a = _write_character(tmp_path / 'a.png', 1)
+    b = _write_character(tmp_path / 'b.png', 2)
+    with TensorStore(str(tmp_path / 'store')) as store:
+        store.update([a, b])
+    b_pixels = _expected(b)
+    b_bytes = open(b, 'rb').read()
+    os.remove(b)
+
+    with TensorStore(str(tmp_path / 'store')) as store:
+        assert store.update([a])['removed'] == 1
+
+    # Reopening rebuilds the next free row from the index, past b's row
+    c = _write_character(tmp_path / 'c.png', 3)
+    with TensorStore(str(tmp_path / 'store')) as store:
+        assert store.update([a, c])['added'] == 1
+
+    # Same content as the deleted file
+    d = str(tmp_path / 'd.png')
+    with open(d, 'wb') as f:
+        f.write(b_bytes)
+    with TensorStore(str(tmp_path / 'store')) as store:
+        store.update([a, c, d])
+        assert np.array_equal(store.tensor(a), _expected(a))
+        assert np.array_equal(store.tensor(c), _expected(c))
+        assert np.array_equal(store.tensor(d), b_pixels)
+
+
+def test_replaced_content_is_not_used_for_deduplication(tmp_path):
+    a = _write_character(tmp_path / 'a.png', 1)
+    with TensorStore(str(tmp_path / 'store')) as store:
+        store.update([a])
+    old_bytes = open(a, 'rb').read()
+    _write_character(a, 7)
+    os.utime(a, ns=(1, 1))
+    b = str(tmp_path / 'b.png')
+    with TensorStore(str(tmp_path / 'store')) as store:
+        store.update([a])
+        with open(b, 'wb') as f:
+            f.write(old_bytes)
+        store.update([a, b])
+        assert np.array_equal(store.tensor(a), _expected(a))
+        assert np.array_equal(store.tensor(b), _expected(b))
+
+
+def test_configuration_change_invalidates_the_store(tmp_path):
+    paths = [_write_character(tmp_path / f"{i}.png", i) for i in range(2)]
+    with TensorStore(str(tmp_path / 'store')) as store:
+        store.update(paths)
+
+    changed = dict(PROCESSING_CONFIG, gaussian_blur={'ksize': (5, 5), 'sigmaX': 0})
+    with pytest.raises(ValueError):
+        TensorStore(str(tmp_path / 'store'), readonly=True, config=changed)
+    with TensorStore(str(tmp_path / 'store'), config=changed) as store:
+        assert store.invalidated
+        assert len(store) == 0
@@ -0,0 +1,61 @@
+import numpy as np
+
+from baybayin.tta import augment, predict_with_tta, variant_transforms
+from config.settings import TTA_CONFIG
+
+CONFIG = dict(TTA_CONFIG, enabled=True, threshold=0.6)
+
+
+class MeanModel:
+    """Two-class model scoring each image by its mean darkness"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, batch):
+        self.calls.append(len(batch))
+        ink = 1 - batch.reshape(len(batch), -1).mean(axis=1)
+        return np.stack([ink, 1 - ink], axis=1).astype(np.float32)
+
+
+def _batch(n=4, size=16):
+    batch = np.ones((n, size, size, 1), np.float32)
+    for i in range(n):
+        batch[i, 4:12, 6:6 + i + 2, 0] = 0
+    return batch
+
+
+def test_only_uncertain_rows_are_augmented_and_averaged():
+    model = MeanModel()
+    batch = _batch()
+    probabilities = np.array([[0.95, 0.05], [0.5, 0.5], [0.99, 0.01], [0.55, 0.45]], np.float32)
+
+    result = predict_with_tta(model, batch, probabilities, CONFIG)
+
+    transforms = variant_transforms(CONFIG)
+    assert len(transforms) == CONFIG['max_variants'] == result.variants
+    assert model.calls == [2 * len(transforms)]
+    np.testing.assert_array_equal(result.augmented, [False, True, False, True])
+    np.testing.assert_array_equal(result.probabilities[[0, 2]], probabilities[[0, 2]])
+
+    scores = MeanModel().predict(augment(batch[[1, 3]], transforms)).reshape(2, len(transforms), 2)
+    expected = (probabilities[[1, 3]] + scores.sum(axis=1)) / (len(transforms) + 1)
+    np.testing.assert_allclose(result.probabilities[[1, 3]], expected, rtol=1e-6)
+
+
+def test_confident_or_disabled_predictions_skip_the_model():
+    model = MeanModel()
+    batch = _batch()
+    confident = np.tile(np.array([[0.9, 0.1]], np.float32), (4, 1))
+    uncertain = np.full((4, 2), 0.5, np.float32)
+
+    assert not predict_with_tta(model, batch, confident, CONFIG).augmented.any()
+    result = predict_with_tta(model, batch, uncertain, dict(CONFIG, enabled=False))
+    assert not result.augmented.any() and result.variants == 0
+    assert model.calls == []
+
+
+def test_identity_transform_keeps_the_image():
+    batch = _batch()
+    np.testing.assert_array_equal(augment(batch, [(0.0, 1.0, 0)]), batch)
+    assert augment(batch, variant_transforms(CONFIG)).shape == (4 * CONFIG['max_variants'], 16, 16, 1)
@@ -0,0 +1,57 @@
+"""
+Streamlit adapter over the asset derivatives in baybayin.assets.
+"""
+import streamlit as st
+from baybayin import assets
+from config.settings import ASSET_PATHS, EXAMPLE_IMAGES, UI_CONFIG
+
+
+def show_asset(path, width=None, caption=None, max_width=None, container=st):
+    """
+    Display a static image from its cached, display-sized derivative.
+
+    Args:
+        path: Image file path
+        width: Display width in pixels; None stretches to the container
+        caption: Image caption
+        max_width: Widest the container can get, for stretched images
+            (default ASSET_CONFIG['max_width'])
+        container: Where to draw the image (e.g. st.sidebar)
+    """
+    try:
+        derivative = assets.get_derivative(path, width or max_width)
+    except OSError:
+        # Let Streamlit report the file the usual way
+        container.image(path, caption=caption, width=width, use_container_width=width is None)
+        return
+
+    container.image(
+        derivative.data,
+        caption=caption,
+        width=width,
+        use_container_width=width is None,
+        output_format=derivative.format,
+    )
+
+
+def page_assets():
+    """
+    The static images the pages show, with the widths they are shown at.
+
+    Returns:
+        list: (path, width) pairs for baybayin.assets.prerender
+    """
+    images = [
+        (ASSET_PATHS['logo'], UI_CONFIG['sidebar_logo_width']),
+        (ASSET_PATHS['ss1'], None),
+        (ASSET_PATHS['preprocessing'], None),
+        (ASSET_PATHS['reference'], UI_CONFIG['reference_chart_width']),
+    ]
+    for examples in EXAMPLE_IMAGES.values():
+        images.extend((path, width) for path, _, width in examples)
+    return images
+
+
+def start_prerender():
+    """Render all page images in the background, once per process."""
+    return assets.start_prerender(page_assets())
@@ -0,0 +1,59 @@
+import streamlit as st
+from baybayin import instrumentation, startup
+from models.model_loader import get_batching_metrics, get_cascade_metrics
+from config.settings import INSTRUMENTATION_CONFIG
+
+
+def show_timings(records):
+    """
+    Display the stage timings of one classification, if the debug panel is enabled.
+    
+    Args:
+        records: (stage, seconds, size) tuples collected by instrumentation.trace()
+    """
+    if not INSTRUMENTATION_CONFIG['debug_panel']:
+        return
+    
+    with st.expander("⏱️ Debug: Stage Timings", expanded=False):
+        if records:
+            st.table([
+                {'Stage': stage, 'Time (ms)': f"{seconds * 1000:.3f}", 'Input size': str(size)}
+                for stage, seconds, size in records
+            ])
+            st.caption(f"Total: {sum(seconds for _, seconds, _ in records) * 1000:.1f} ms")
+        else:
+            st.caption("No stages ran for this request (served from cache).")
+        
+        cascade = get_cascade_metrics()
+        if cascade is not None and cascade['rows']:
+            st.caption(
+                f"Cascade: {cascade['escalated']} of {cascade['rows']} images escalated to the full model "
+                f"({cascade['escalation_rate']:.1%}); fast stage p50 {cascade['fast_ms']['p50']:.1f} ms, "
+                f"full stage p50 {cascade['full_ms']['p50']:.1f} ms per batch"
+            )
+        
+        batching = get_batching_metrics()
+        if batching is not None and batching['batches']:
+            st.caption(
+                f"Batching: {batching['requests']} requests in {batching['batches']} model calls "
+                f"(mean batch {batching['mean_batch_size']:.1f} of at most {batching['max_batch_size']} images); "
+                f"queue wait p50 {batching['wait_ms']['p50']:.1f} ms, p95 {batching['wait_ms']['p95']:.1f} ms; "
+                f"{batching['queue_depth']} waiting now"
+            )
+        
+        cold_start = startup.timings()
+        if cold_start:
+            st.caption("Cold start: " + ", ".join(
+                f"{name.replace('_', ' ')} after {seconds:.2f} s" for name, seconds in cold_start.items()
+            ))
+        
+        sink = instrumentation.get_sink()
+        if isinstance(sink, instrumentation.HistogramSink):
+            st.markdown("**All requests in this process:**")
+            st.table([
+                {'Stage': stage, 'Count': stats['count'], 'p50 (ms)': f"{stats['p50_ms']:.3f}",
+                 'p95 (ms)': f"{stats['p95_ms']:.3f}", 'Max (ms)': f"{stats['max_ms']:.3f}"}
+                for stage, stats in sink.snapshot().items()
+            ])
+        elif isinstance(sink, instrumentation.PrometheusSink):
+            st.code(sink.render(), language="text")